@@ -0,0 +1,118 @@
+from typing import Iterable, NamedTuple, Optional
+
+import numpy as np
+from django.core.exceptions import ObjectDoesNotExist
+from numpy.typing import ArrayLike
+
+from .underwriting import ACQUISITION_INPUTS, LeveredReturns, acquisition_inputs, calculate_levered_returns
+
+
+class AbsorptionCurve(NamedTuple):
+    """Monthly occupancy of one or many lease-up scenarios.
+
+    Attributes:
+        occupancy (np.ndarray): The occupancy of each month as a percentage, with months on the last axis.
+        stabilization_month (np.ndarray): The first month at stabilized occupancy, or inf if it is never reached.
+    """
+    occupancy: np.ndarray
+    stabilization_month: np.ndarray
+
+
+class AbsorptionScenarios(NamedTuple):
+    """Lease-up scenarios of many acquisitions, one row per acquisition and one column per lease-up speed.
+
+    Attributes:
+        lease_up_rates (np.ndarray): The units leased per month of each scenario.
+        curve (AbsorptionCurve): The occupancy curve of each scenario.
+        returns (LeveredReturns): The levered returns of each scenario.
+    """
+    lease_up_rates: np.ndarray
+    curve: AbsorptionCurve
+    returns: LeveredReturns
+
+
+def absorption_curve(
+    units: ArrayLike,
+    occupancy_rate: ArrayLike,
+    lease_up_rate_per_month: ArrayLike,
+    stabilization_vacancy_rate: ArrayLike,
+    months: int
+) -> AbsorptionCurve:
+    """Leases vacant units up at a steady pace until the property reaches stabilized occupancy.
+
+    Month 0 is the acquisition, at ``occupancy_rate``. Each later month adds
+    ``lease_up_rate_per_month`` units until occupancy reaches ``100 - stabilization_vacancy_rate``,
+    where it stays; a property bought above that level falls back to it, as the stabilized
+    vacancy allows for turnover. Every argument but ``months`` is broadcast, so many
+    acquisitions and lease-up speeds are evaluated in one pass.
+
+    Args:
+        units (ArrayLike): The number of units in each property.
+        occupancy_rate (ArrayLike): The occupancy at acquisition as a percentage.
+        lease_up_rate_per_month (ArrayLike): The units leased per month.
+        stabilization_vacancy_rate (ArrayLike): The vacancy rate upon stabilization as a percentage.
+        months (int): The number of months in each curve.
+
+    Returns:
+        AbsorptionCurve: The monthly occupancy and the stabilization month of each scenario.
+    """
+    units, occupancy_rate, lease_up_rate_per_month, stabilization_vacancy_rate = np.broadcast_arrays(
+        *(np.asarray(value, dtype=float) for value in (units, occupancy_rate, lease_up_rate_per_month, stabilization_vacancy_rate))
+    )
+    stabilized = 100 - stabilization_vacancy_rate
+    # Percentage points leased per month; a property without units is stabilized from the start
+    pace = np.divide(100 * lease_up_rate_per_month, units, out=np.full(units.shape, np.inf), where=units > 0)
+    shortfall = np.clip(stabilized - occupancy_rate, 0, None)
+
+    steps = np.arange(months)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        leased = np.where(steps > 0, pace[..., None] * steps, 0.0)
+        stabilization_month = np.where(shortfall > 0, np.maximum(np.ceil(shortfall / pace), 1), 0.0)
+    occupancy = np.minimum(occupancy_rate[..., None] + leased, stabilized[..., None])
+    return AbsorptionCurve(occupancy, stabilization_month)
+
+
+def compare_absorption(
+    property_acquisitions: Iterable,
+    lease_up_rates: Optional[ArrayLike] = None,
+    **overrides
+) -> AbsorptionScenarios:
+    """Underwrites many acquisitions under many lease-up speeds in one batched call.
+
+    Each acquisition's inputs come from acquisition_inputs. Its occupancy curve starts at
+    its occupancy rate, leases up at each speed to its LeasingStrategy stabilization vacancy,
+    and replaces the flat occupancy less vacancy in the operating cash flows.
+
+    Args:
+        property_acquisitions (Iterable[PropertyAcquisition]): The acquisitions to compare.
+        lease_up_rates (Optional[ArrayLike]): The units leased per month to compare across all
+            acquisitions, or None for each acquisition's own LeasingStrategy rate.
+        **overrides: Inputs passed to acquisition_inputs, such as in_place_rent and operating_expenses.
+
+    Returns:
+        AbsorptionScenarios: Curves and returns shaped acquisitions x lease-up speeds.
+
+    Raises:
+        ValueError: If an input is missing, or no rates are given and an acquisition has no leasing strategy.
+    """
+    property_acquisitions = list(property_acquisitions)
+    inputs = [acquisition_inputs(property_acquisition, **overrides) for property_acquisition in property_acquisitions]
+    columns = {name: np.array([row[name] for row in inputs], dtype=float)[:, None] for name in ACQUISITION_INPUTS}
+
+    if lease_up_rates is None:
+        rates = []
+        for property_acquisition in property_acquisitions:
+            try:
+                rates.append(property_acquisition.leasing_strategy.lease_up_rate_per_month)
+            except ObjectDoesNotExist:
+                raise ValueError(f'{property_acquisition} has no leasing strategy; pass lease_up_rates') from None
+        lease_up_rates = np.array(rates, dtype=float)[:, None]
+    else:
+        lease_up_rates = np.atleast_1d(np.asarray(lease_up_rates, dtype=float))[None, :]
+
+    curve = absorption_curve(
+        columns['units'], columns['occupancy_rate'], lease_up_rates, columns['vacancy_rate'],
+        int(columns['holding_period_years'].max(initial=0)) * 12
+    )
+    returns = calculate_levered_returns(**columns, occupancy_curve=curve.occupancy)
+    return AbsorptionScenarios(np.broadcast_to(lease_up_rates, curve.stabilization_month.shape), curve, returns)
@@ -0,0 +1,163 @@
+from datetime import date
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+from django.db.models import QuerySet, Sum
+
+from .models import Account, AccountClosure, OperatingExpense
+
+REBUILD_BATCH_SIZE = 5000
+
+
+def creates_cycle(account: Account) -> bool:
+    """Checks whether an account's parent is the account itself or one of its descendants."""
+    if account.parent_account_id is None or account.pk is None:
+        return False
+    return account.parent_account_id == account.pk or AccountClosure.objects.filter(
+        ancestor_id=account.pk, descendant_id=account.parent_account_id
+    ).exists()
+
+
+def _attach(subtree, parent_id: int):
+    """Links every account of a subtree, given as (descendant, depth) pairs, to the parent and its ancestors."""
+    ancestors = list(AccountClosure.objects.filter(descendant_id=parent_id).values_list('ancestor_id', 'depth'))
+    AccountClosure.objects.bulk_create([
+        AccountClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=ancestor_depth + depth + 1)
+        for ancestor_id, ancestor_depth in ancestors
+        for descendant_id, depth in subtree
+    ], batch_size=REBUILD_BATCH_SIZE)
+
+
+def insert_account(account: Account):
+    """Adds the closure rows of a new account: itself and every ancestor of its parent."""
+    AccountClosure.objects.create(ancestor_id=account.pk, descendant_id=account.pk, depth=0)
+    if account.parent_account_id is not None:
+        _attach([(account.pk, 0)], account.parent_account_id)
+
+
+def move_account(account: Account):
+    """Relinks an account's whole subtree after its parent changed.
+
+    Raises:
+        ValueError: If the new parent lies inside the account's own subtree.
+    """
+    if creates_cycle(account):
+        raise ValueError('An account cannot be moved under one of its own descendants.')
+    subtree = list(AccountClosure.objects.filter(ancestor_id=account.pk).values_list('descendant_id', 'depth'))
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+    # Dropping the links from the old ancestors, which all lie outside the subtree
+    AccountClosure.objects.filter(descendant_id__in=subtree_ids).exclude(ancestor_id__in=subtree_ids).delete()
+    if account.parent_account_id is not None:
+        _attach(subtree, account.parent_account_id)
+
+
+def detach_children(account: Account):
+    """Turns an account's children into roots before it is deleted, as its SET_NULL foreign key does."""
+    subtree_ids = list(AccountClosure.objects.filter(ancestor_id=account.pk).exclude(descendant_id=account.pk).values_list('descendant_id', flat=True))
+    ancestor_ids = list(AccountClosure.objects.filter(descendant_id=account.pk).values_list('ancestor_id', flat=True))
+    AccountClosure.objects.filter(descendant_id__in=subtree_ids, ancestor_id__in=ancestor_ids).delete()
+
+
+def _expenses(start_date: Optional[date], end_date: Optional[date], real_estate_property_id: Optional[int]):
+    expenses = OperatingExpense.objects.between(start_date, end_date).order_by()
+    if real_estate_property_id is not None:
+        expenses = expenses.filter(real_estate_property_id=real_estate_property_id)
+    return expenses
+
+
+def subtree_total(
+    account: Account,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    real_estate_property_id: Optional[int] = None
+) -> float:
+    """Sums the operating expenses booked to an account and all of its descendants in one query.
+
+    Args:
+        account (Account): The root of the subtree.
+        start_date (Optional[date]): The first expense date, or None for no lower bound.
+        end_date (Optional[date]): The last expense date, or None for no upper bound.
+        real_estate_property_id (Optional[int]): Only the expenses of this property.
+
+    Returns:
+        float: The total expense amount.
+    """
+    expenses = _expenses(start_date, end_date, real_estate_property_id)
+    return expenses.filter(account__ancestor_links__ancestor_id=account.pk).aggregate(total=Sum('amount'))['total'] or 0.0
+
+
+def subtree_totals(
+    accounts: Iterable[Account],
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    real_estate_property_id: Optional[int] = None
+) -> Dict[int, float]:
+    """Sums the subtree expenses of many accounts at once, grouped in one query.
+
+    Args:
+        accounts (Iterable[Account]): The subtree roots, such as every account of a chart.
+        start_date (Optional[date]): The first expense date, or None for no lower bound.
+        end_date (Optional[date]): The last expense date, or None for no upper bound.
+        real_estate_property_id (Optional[int]): Only the expenses of this property.
+
+    Returns:
+        Dict[int, float]: The total of each account, zero for accounts without expenses.
+    """
+    account_ids = accounts.values('pk') if isinstance(accounts, QuerySet) else [account.pk for account in accounts]
+    totals = _expenses(start_date, end_date, real_estate_property_id).filter(
+        account__ancestor_links__ancestor_id__in=account_ids
+    ).values_list('account__ancestor_links__ancestor_id').annotate(total=Sum('amount'))
+    result = dict.fromkeys(accounts.values_list('pk', flat=True) if isinstance(accounts, QuerySet) else account_ids, 0.0)
+    result.update(totals)
+    return result
+
+
+def rebuild_closure(accounts: QuerySet) -> int:
+    """Recomputes the closure rows of a set of accounts from their parent links.
+
+    The tree is climbed one level per pass with array lookups, so the cost grows with the
+    tree's depth rather than with one query per account.
+
+    Args:
+        accounts (QuerySet): The accounts to rebuild, normally every account of one or more charts.
+
+    Returns:
+        int: The number of closure rows written.
+
+    Raises:
+        ValueError: If the parent links form a cycle.
+    """
+    rows = list(accounts.order_by('pk').values_list('pk', 'parent_account_id'))
+    if not rows:
+        AccountClosure.objects.filter(descendant__in=accounts.values('pk')).delete()
+        return 0
+    ids = np.array([pk for pk, _ in rows])
+    # Parents outside the rebuilt set are treated as roots
+    parent_ids = np.array([-1 if parent_id is None else parent_id for _, parent_id in rows])
+    parent_positions = np.searchsorted(ids, parent_ids)
+    known = (parent_ids >= 0) & (parent_positions < ids.size) & (ids[np.minimum(parent_positions, ids.size - 1)] == parent_ids)
+    parent_positions = np.where(known, parent_positions, -1)
+
+    # Every account starts as its own ancestor, then climbs one level per pass
+    descendants = np.arange(ids.size)
+    ancestors = descendants.copy()
+    pairs = [(ancestors, descendants, np.zeros(ids.size, dtype=int))]
+    for depth in range(1, ids.size + 1):
+        ancestors = parent_positions[ancestors]
+        climbing = ancestors >= 0
+        ancestors, descendants = ancestors[climbing], descendants[climbing]
+        if not ancestors.size:
+            break
+        pairs.append((ancestors, descendants, np.full(ancestors.size, depth)))
+    else:
+        raise ValueError('The account parent links form a cycle.')
+
+    ancestor_ids = ids[np.concatenate([pair[0] for pair in pairs])].tolist()
+    descendant_ids = ids[np.concatenate([pair[1] for pair in pairs])].tolist()
+    depths = np.concatenate([pair[2] for pair in pairs]).tolist()
+    AccountClosure.objects.filter(descendant__in=accounts.values('pk')).delete()
+    AccountClosure.objects.bulk_create([
+        AccountClosure(ancestor_id=ancestor_id, descendant_id=descendant_id, depth=depth)
+        for ancestor_id, descendant_id, depth in zip(ancestor_ids, descendant_ids, depths)
+    ], batch_size=REBUILD_BATCH_SIZE)
+    return len(depths)
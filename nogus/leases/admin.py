@@ -1,4 +1,13 @@
+from datetime import date
+
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Case, Count, F, FloatField, Max, Min, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
 from .models import (
     PropertyValuation,
     PropertyImprovement,
@@ -18,6 +27,152 @@ from .models import (
     LeaseDetail,
 )
 
+# Below this many rows an exact COUNT(*) is cheap enough to run
+EXACT_COUNT_THRESHOLD = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that reads the planner's row estimate for unfiltered changelists on PostgreSQL
+    instead of running COUNT(*) over the whole table. Filtered lists and other databases count exactly.
+    """
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is not None and not query.where:
+            connection = connections[self.object_list.db]
+            if connection.vendor == 'postgresql':
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [self.object_list.model._meta.db_table])
+                    row = cursor.fetchone()
+                if row and row[0] > EXACT_COUNT_THRESHOLD:
+                    return int(row[0])
+        return super().count
+
+
+class ExpirationYearFilter(admin.SimpleListFilter):
+    title = 'expiration year'
+    parameter_name = 'expiration_year'
+
+    def lookups(self, request, model_admin):
+        # Both bounds come from the lease_end_date index
+        bounds = model_admin.model.objects.aggregate(first=Min('lease_end_date'), last=Max('lease_end_date'))
+        if bounds['first'] is None:
+            return []
+        return [(str(year), str(year)) for year in range(bounds['first'].year, bounds['last'].year + 1)]
+
+    def queryset(self, request, queryset):
+        if self.value():
+            # A range on the indexed column rather than a per-row year extraction
+            year = int(self.value())
+            return queryset.filter(lease_end_date__range=(date(year, 1, 1), date(year, 12, 31)))
+        return queryset
+
+
+class PropertyIdFilter(admin.SimpleListFilter):
+    """Filters on a property id typed into the sidebar, since a link per property would list them all."""
+    title = 'property'
+    parameter_name = 'property_id'
+    template = 'admin/leases/property_id_filter.html'
+
+    def lookups(self, request, model_admin):
+        # Only the selected property is listed, with one primary key lookup
+        value = self.value()
+        if value and value.isdigit():
+            return list(RealEstateProperty.objects.filter(pk=value).values_list('pk', 'name'))
+        return []
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        choices = list(super().choices(changelist))
+        # The id form keeps the other filters and the search
+        choices[0].update(
+            parameter_name=self.parameter_name,
+            value=self.value() or '',
+            hidden_params=[(name, value) for name, value in changelist.params.items() if name != self.parameter_name],
+        )
+        return choices
+
+    def queryset(self, request, queryset):
+        if self.value():
+            if not self.value().isdigit():
+                raise IncorrectLookupParameters(f'Invalid property id: {self.value()}')
+            # The lease table's index on real_estate_property serves the filter
+            return queryset.filter(real_estate_property_id=int(self.value()))
+        return queryset
+
+
+class HighVolumeAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(RealEstateProperty)
+class RealEstatePropertyAdmin(HighVolumeAdmin):
+    list_display = ('name', 'city', 'total_area', 'leased_area', 'lease_count')
+    list_select_related = ('location_details',)
+    search_fields = ('name',)
+    raw_id_fields = ('location_details', 'area_measures', 'debt_financing', 'property_sale')
+
+    def get_queryset(self, request):
+        # A correlated subquery is evaluated for the displayed page only, unlike a grouped join
+        lease_count = Lease.objects.filter(real_estate_property=OuterRef('pk')).values('real_estate_property').annotate(
+            count=Count('pk')
+        ).values('count')
+        return super().get_queryset(request).annotate(lease_count=Coalesce(Subquery(lease_count), 0))
+
+    @admin.display(ordering='location_details__city')
+    def city(self, obj):
+        return obj.location_details.city if obj.location_details else None
+
+    @admin.display(ordering='lease_count')
+    def lease_count(self, obj):
+        return obj.lease_count
+
+
+@admin.register(Lease)
+class LeaseAdmin(HighVolumeAdmin):
+    list_display = ('tenant_name', 'real_estate_property', 'property_type', 'lease_start_date', 'lease_end_date', 'leased_area', 'annual_rent')
+    list_select_related = ('real_estate_property',)
+    list_filter = (PropertyIdFilter, 'property_type', ExpirationYearFilter)
+    search_fields = ('tenant_name', '=external_id', '=entity_id')
+    autocomplete_fields = ('real_estate_property',)
+    raw_id_fields = (
+        'financial_details',
+        'escalation_method',
+        'market_leasing_profile',
+        'property_valuation',
+        'property_improvement',
+        'property_management',
+    )
+
+    def get_queryset(self, request):
+        # Mirrors LeaseFinancialDetail.calculate_initial_rent in SQL so the column costs no extra queries
+        monthly_rent = Case(
+            When(
+                financial_details__initial_rent_method='per_sqft',
+                then=Coalesce(F('financial_details__initial_rent_per_sqft'), Value(0.0)) * F('leased_area')
+            ),
+            default=Coalesce(F('financial_details__initial_rent_fixed_amount'), Value(0.0)),
+            output_field=FloatField()
+        )
+        return super().get_queryset(request).annotate(annual_rent=monthly_rent * 12)
+
+    @admin.display(ordering='annual_rent')
+    def annual_rent(self, obj):
+        return round(obj.annual_rent, 2)
+
+
+@admin.register(LeaseDetail)
+class LeaseDetailAdmin(HighVolumeAdmin):
+    list_display = ('lease', 'date', 'rent')
+    list_select_related = ('lease',)
+    raw_id_fields = ('lease',)
+
+
 admin.site.register(PropertyValuation)
 admin.site.register(PropertyImprovement)
 admin.site.register(PropertyManagement)
@@ -31,6 +186,3 @@ admin.site.register(BuildingAreaEntry)
 admin.site.register(LeaseFinancialDetail)
 admin.site.register(LeaseEscalationMethod)
 admin.site.register(rental_unit)
-admin.site.register(RealEstateProperty)
-admin.site.register(Lease)
-admin.site.register(LeaseDetail)
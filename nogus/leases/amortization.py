@@ -0,0 +1,144 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from .financial_calculations import calculate_loan_balance
+
+
+class AmortizationSchedule(NamedTuple):
+    """The month-by-month schedule of many loans, one row per loan.
+
+    Months after a loan's term are zero in every array; the balance left at the end of
+    the term is repaid through ``balloon_balance``.
+
+    Attributes:
+        payment (np.ndarray): The scheduled payment of each loan and month.
+        interest (np.ndarray): The interest part of each payment.
+        principal (np.ndarray): The principal part of each payment.
+        balance (np.ndarray): The outstanding balance after each payment.
+        balloon_balance (np.ndarray): The balance due at the end of each loan's term.
+    """
+    payment: np.ndarray
+    interest: np.ndarray
+    principal: np.ndarray
+    balance: np.ndarray
+    balloon_balance: np.ndarray
+
+
+def amortization_schedule(
+    principal: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    term_years: ArrayLike
+) -> AmortizationSchedule:
+    """Builds the full amortization schedule of many loans in one vectorized pass.
+
+    Args:
+        principal (ArrayLike): The principal amount of each loan.
+        interest_rate (ArrayLike): The annual interest rate as a percentage.
+        amortization_period_years (ArrayLike): The amortization period in years.
+        term_years (ArrayLike): The loan term in years, after which the balloon balance is due.
+
+    Returns:
+        AmortizationSchedule: Loans x months arrays of payments, interest, principal and balance.
+    """
+    principal, interest_rate, amortization_period_years, term_years = (
+        array[:, None] for array in np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(value, dtype=float)) for value in (principal, interest_rate, amortization_period_years, term_years))
+        )
+    )
+    term_months = (term_years * 12).astype(int)
+    months = np.arange(1, term_months.max(initial=0) + 1)
+
+    # The closed-form balance after every payment gives the whole schedule without a running loop
+    balance = np.maximum(calculate_loan_balance(principal, interest_rate, amortization_period_years, months), 0.0)
+    opening_balance = np.concatenate((principal, balance[:, :-1]), axis=1)
+    interest = opening_balance * interest_rate / 100 / 12
+    principal_paid = opening_balance - balance
+    payment = interest + principal_paid
+
+    # Zeroing the months after each loan's term
+    outside_term = months > term_months
+    for array in (payment, interest, principal_paid, balance):
+        array[outside_term] = 0.0
+
+    balloon = np.maximum(calculate_loan_balance(principal, interest_rate, amortization_period_years, term_months), 0.0)
+    return AmortizationSchedule(payment, interest, principal_paid, balance, balloon[:, 0])
+
+
+def balloon_balance(
+    principal: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    term_years: ArrayLike
+) -> np.ndarray:
+    """Calculates the balance due at the end of each loan's term.
+
+    Args:
+        principal (ArrayLike): The principal amount of each loan.
+        interest_rate (ArrayLike): The annual interest rate as a percentage.
+        amortization_period_years (ArrayLike): The amortization period in years.
+        term_years (ArrayLike): The loan term in years.
+
+    Returns:
+        np.ndarray: The balloon balance of each loan.
+    """
+    term_months = np.asarray(term_years) * 12
+    return np.maximum(calculate_loan_balance(principal, interest_rate, amortization_period_years, term_months), 0.0)
+
+
+def prepayment_penalty_percentage(
+    month: ArrayLike,
+    prepayment_penalty_period_years: ArrayLike,
+    flat_percentage: Optional[ArrayLike] = None
+) -> np.ndarray:
+    """Calculates the prepayment penalty, as a percentage of the balance, for a payoff at a given month.
+
+    By default the penalty steps down one point a year to zero at the end of the penalty
+    period, e.g. 4-3-2-1 for a four-year period.
+
+    Args:
+        month (ArrayLike): The number of payments made before the payoff.
+        prepayment_penalty_period_years (ArrayLike): The prepayment penalty period in years.
+        flat_percentage (Optional[ArrayLike]): A constant penalty within the period instead of the step-down.
+
+    Returns:
+        np.ndarray: The penalty percentage of each payoff.
+    """
+    month = np.asarray(month)
+    period_years = np.asarray(prepayment_penalty_period_years)
+    within_period = month < period_years * 12
+    if flat_percentage is None:
+        penalty = period_years - month // 12
+    else:
+        penalty = np.asarray(flat_percentage, dtype=float)
+    return np.where(within_period, penalty, 0.0).astype(float)
+
+
+def payoff_amount(
+    principal: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    month: ArrayLike,
+    prepayment_penalty_period_years: ArrayLike = 0,
+    flat_penalty_percentage: Optional[ArrayLike] = None
+) -> np.ndarray:
+    """Calculates the amount needed to repay loans at a given month, including any prepayment penalty.
+
+    This is the loan payoff deducted from sale or refinancing proceeds.
+
+    Args:
+        principal (ArrayLike): The principal amount of each loan.
+        interest_rate (ArrayLike): The annual interest rate as a percentage.
+        amortization_period_years (ArrayLike): The amortization period in years.
+        month (ArrayLike): The number of payments made before the payoff.
+        prepayment_penalty_period_years (ArrayLike): The prepayment penalty period in years.
+        flat_penalty_percentage (Optional[ArrayLike]): A constant penalty within the period instead of the step-down.
+
+    Returns:
+        np.ndarray: The outstanding balance plus prepayment penalty of each loan.
+    """
+    balance = np.maximum(calculate_loan_balance(principal, interest_rate, amortization_period_years, month), 0.0)
+    penalty = prepayment_penalty_percentage(month, prepayment_penalty_period_years, flat_penalty_percentage)
+    return balance * (1 + penalty / 100)
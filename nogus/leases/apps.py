@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class LeasesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'leases'
+
+    def ready(self):
+        # Connecting the projection cache invalidation handlers
+        from . import signals  # noqa: F401
@@ -0,0 +1,93 @@
+from datetime import date
+from typing import Iterator, NamedTuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+DEFAULT_CHUNK_MONTHS = 120
+
+
+class CashFlowSeries(NamedTuple):
+    """A monthly cash-flow series on a calendar-month grid.
+
+    Attributes:
+        months (np.ndarray): The calendar month of each period as ``datetime64[M]``.
+        cashflows (np.ndarray): The cash flow of each period, with months on the last axis.
+    """
+    months: np.ndarray
+    cashflows: np.ndarray
+
+
+def to_month(value) -> np.datetime64:
+    """Truncates a date to its calendar month."""
+    return np.datetime64(value, 'M')
+
+
+def month_grid(start_date: date, end_date: date) -> np.ndarray:
+    """Builds the calendar months from the month of ``start_date`` to the month of ``end_date`` inclusive.
+
+    Args:
+        start_date (date): A date in the first month.
+        end_date (date): A date in the last month.
+
+    Returns:
+        np.ndarray: The months as ``datetime64[M]``, empty when ``end_date`` is before ``start_date``.
+    """
+    return np.arange(to_month(start_date), to_month(end_date) + 1, dtype='datetime64[M]')
+
+
+def iter_month_grid(start_date: date, end_date: date, chunk_months: int = DEFAULT_CHUNK_MONTHS) -> Iterator[np.ndarray]:
+    """Yields the month grid between two dates in chunks of at most ``chunk_months`` months.
+
+    Args:
+        start_date (date): A date in the first month.
+        end_date (date): A date in the last month.
+        chunk_months (int): The maximum number of months per chunk.
+
+    Yields:
+        np.ndarray: Consecutive chunks of ``datetime64[M]`` months.
+    """
+    first, last = to_month(start_date), to_month(end_date)
+    while first <= last:
+        chunk_end = min(first + chunk_months, last + 1)
+        yield np.arange(first, chunk_end, dtype='datetime64[M]')
+        first = chunk_end
+
+
+def months_since(start_date: ArrayLike, months: ArrayLike) -> np.ndarray:
+    """Counts whole calendar months from the month of ``start_date`` to each month.
+
+    Args:
+        start_date (ArrayLike): The reference date or dates.
+        months (ArrayLike): The calendar months to measure, broadcast against ``start_date``.
+
+    Returns:
+        np.ndarray: The integer month offsets, negative before the reference month.
+    """
+    start_month = np.asarray(start_date, dtype='datetime64[M]')
+    return (np.asarray(months, dtype='datetime64[M]') - start_month).astype(int)
+
+
+def initial_rents(
+    leased_area: ArrayLike,
+    initial_rent_method: ArrayLike,
+    initial_rent_fixed_amount: ArrayLike,
+    initial_rent_per_sqft: ArrayLike
+) -> np.ndarray:
+    """Calculates the initial monthly rent of many leases, mirroring LeaseFinancialDetail.calculate_initial_rent.
+
+    Args:
+        leased_area (ArrayLike): The leased area of each lease.
+        initial_rent_method (ArrayLike): The initial rent method of each lease.
+        initial_rent_fixed_amount (ArrayLike): The fixed initial rent of each lease.
+        initial_rent_per_sqft (ArrayLike): The initial rent per square foot of each lease.
+
+    Returns:
+        np.ndarray: The initial rent of each lease.
+    """
+    return np.where(
+        np.asarray(initial_rent_method, dtype=object) == 'per_sqft',
+        np.asarray(initial_rent_per_sqft, dtype=float) * np.asarray(leased_area, dtype=float),
+        np.asarray(initial_rent_fixed_amount, dtype=float)
+    )
+
@@ -0,0 +1,208 @@
+import threading
+from datetime import date
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+from numpy.typing import ArrayLike
+
+from .escalation import EscalationTerms, escalated_rents
+from .models import PriceIndex, PriceIndexValue
+
+_cache_lock = threading.Lock()
+_cache: Dict[int, Tuple[object, 'IndexSeries']] = {}
+
+
+class IndexSeries(NamedTuple):
+    """A price index as one contiguous monthly array.
+
+    Attributes:
+        first_month (np.datetime64): The month of the first value.
+        values (np.ndarray): The read-only level of every month from ``first_month``, with gaps carried forward.
+    """
+    first_month: np.datetime64
+    values: np.ndarray
+
+
+def _build_series(rows: np.ndarray) -> IndexSeries:
+    """Lays dated index values out month by month, keeping the last value of each month."""
+    months = rows['date'].astype('datetime64[M]')
+    first_month = months[0]
+    positions = (months - first_month).astype(int)
+    values = np.full(positions[-1] + 1, np.nan)
+    values[positions] = rows['value']
+    # Carrying the last published level over months without a value
+    filled = np.where(np.isnan(values), 0, np.arange(values.size))
+    values = values[np.maximum.accumulate(filled)]
+    values.flags.writeable = False
+    return IndexSeries(first_month, values)
+
+
+def load_indexes(index_ids: Iterable[int]) -> Dict[int, IndexSeries]:
+    """Returns the series of some price indexes, loading each from the database only when it changed.
+
+    The cache is checked against ``values_modified_at`` with one small query, so every process
+    sees new values; only changed indexes are reloaded, with one query for all of them.
+
+    Args:
+        index_ids (Iterable[int]): The primary keys of the PriceIndex rows.
+
+    Returns:
+        Dict[int, IndexSeries]: The series of each index that has values.
+    """
+    versions = dict(PriceIndex.objects.filter(pk__in=set(index_ids)).values_list('pk', 'values_modified_at'))
+    with _cache_lock:
+        cached = {pk: _cache.get(pk) for pk in versions}
+    stale = [pk for pk, entry in cached.items() if entry is None or entry[0] != versions[pk]]
+
+    if stale:
+        rows = PriceIndexValue.objects.between(keys=stale).as_arrays('value')
+        boundaries = np.flatnonzero(np.diff(rows['index_id'])) + 1
+        loaded = {int(chunk['index_id'][0]): _build_series(chunk) for chunk in np.split(rows, boundaries) if chunk.size}
+        with _cache_lock:
+            for pk in stale:
+                _cache[pk] = (versions[pk], loaded.get(pk))
+                cached[pk] = _cache[pk]
+    return {pk: entry[1] for pk, entry in cached.items() if entry[1] is not None}
+
+
+def clear_index_cache():
+    """Drops every cached index series of this process."""
+    with _cache_lock:
+        _cache.clear()
+
+
+def touch_indexes(index_ids: Iterable[int]):
+    """Marks indexes as changed so every process reloads them and the projections of their leases are dropped.
+
+    Bulk writes of PriceIndexValue rows bypass signals and must call this.
+    """
+    # Saving each index rather than updating, so its post_save handler invalidates lease projections
+    for index in PriceIndex.objects.filter(pk__in=list(index_ids)):
+        index.values_modified_at = timezone.now()
+        index.save(update_fields=['values_modified_at'])
+
+
+def store_index_values(index: PriceIndex, values: Iterable[Tuple[date, float]]) -> int:
+    """Upserts the monthly values of an index in bulk.
+
+    Args:
+        index (PriceIndex): The index to write to.
+        values (Iterable[Tuple[date, float]]): (date, level) pairs, such as a published CPI history.
+
+    Returns:
+        int: The number of values written.
+    """
+    rows = [PriceIndexValue(index=index, date=value_date, value=value) for value_date, value in values]
+    with transaction.atomic():
+        PriceIndexValue.objects.bulk_create(
+            rows, update_conflicts=True, update_fields=['value'], unique_fields=['index', 'date']
+        )
+        touch_indexes([index.pk])
+    return len(rows)
+
+
+def index_levels(series: List[IndexSeries], months: np.ndarray, annual_rate: ArrayLike) -> np.ndarray:
+    """Looks up the index level of many leases and months with one gather.
+
+    Every series is packed into one flat array, so each lookup is an offset plus a clipped
+    position. Months before a series starts take its first level; months after it ends grow
+    its last level at the lease's assumed annual rate.
+
+    Args:
+        series (List[IndexSeries]): The index of each lease.
+        months (np.ndarray): The ``datetime64[M]`` months to look up, shaped (leases, months).
+        annual_rate (ArrayLike): The assumed annual growth past the last value of each lease, as a percentage.
+
+    Returns:
+        np.ndarray: The index level of each lease in each month.
+    """
+    unique = {id(item): item for item in series}
+    keys = list(unique)
+    code_of = {key: code for code, key in enumerate(keys)}
+    lengths = np.array([unique[key].values.size for key in keys])
+    offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    flat = np.concatenate([unique[key].values for key in keys])
+    first_months = np.array([unique[key].first_month for key in keys], dtype='datetime64[M]')
+
+    codes = np.array([code_of[id(item)] for item in series])
+    positions = (months - first_months[codes][:, None]).astype(int)
+    last = (lengths[codes] - 1)[:, None]
+    levels = flat[offsets[codes][:, None] + np.clip(positions, 0, last)]
+    beyond = np.clip(positions - last, 0, None)
+    return levels * (1 + np.asarray(annual_rate, dtype=float).reshape(-1, 1) / 100) ** (beyond / 12)
+
+
+def _reset_months(cpi_method: np.ndarray, start_month_of_year: np.ndarray, term_months: np.ndarray, lease_months: np.ndarray) -> np.ndarray:
+    """Finds the lease month of the CPI reset in force in each lease month, mirroring escalation._escalation_count."""
+    calendar_month = start_month_of_year[:, None] - 1 + lease_months
+    mid_lease = (term_months // 2)[:, None]
+    return np.select(
+        [cpi_method[:, None] == 'calendar_year', cpi_method[:, None] == 'mid_lease'],
+        [
+            # The latest January after the lease starts
+            np.where(calendar_month >= 12, lease_months - calendar_month % 12, 0),
+            np.where(lease_months >= mid_lease, mid_lease, 0),
+        ],
+        # Lease-year anniversaries
+        lease_months - lease_months % 12
+    )
+
+
+def indexed_rents(
+    initial_rent: ArrayLike,
+    terms: EscalationTerms,
+    lease_months: ArrayLike,
+    lease_start_date: ArrayLike,
+    price_index_id: ArrayLike
+) -> np.ndarray:
+    """Calculates escalated rents, following stored price indexes for CPI leases that have one.
+
+    Rents of other leases come from escalated_rents. A CPI lease on an index pays its initial
+    rent times the index level at its latest reset over the level in its first month, with
+    resets on lease anniversaries, every January or once at mid-lease as its CPI method says.
+    Ratchets hold the rent at its running peak or trough.
+
+    Args:
+        initial_rent (ArrayLike): The initial monthly rent of each lease.
+        terms (EscalationTerms): The escalation terms of each lease.
+        lease_months (ArrayLike): Lease months per lease, shaped (leases,) or (leases, months).
+        lease_start_date (ArrayLike): The start date of each lease.
+        price_index_id (ArrayLike): The PriceIndex of each lease's escalation method, or None.
+
+    Returns:
+        np.ndarray: The rent of each lease in each requested month.
+    """
+    rents = escalated_rents(initial_rent, terms, lease_months)
+    price_index_id = np.atleast_1d(np.asarray(price_index_id, dtype=object))
+    indexed = (np.atleast_1d(terms.method) == 'cpi') & (price_index_id != None)  # noqa: E711
+    if not indexed.any():
+        return rents
+    series = load_indexes(set(price_index_id[indexed].tolist()))
+    indexed &= np.array([pk in series for pk in price_index_id.tolist()])
+    if not indexed.any():
+        return rents
+
+    rows = np.flatnonzero(indexed)
+    months = np.clip(np.broadcast_to(np.asarray(lease_months), rents.shape), 0, None).astype(int).reshape(rents.shape[0], -1)[rows]
+    start_months = np.broadcast_to(np.asarray(lease_start_date, dtype='datetime64[M]'), rents.shape[:1])[rows]
+    annual_rate = np.array([float(rate or 0) for rate in np.atleast_1d(terms.annual_rate)[rows]])
+    cpi_method = np.atleast_1d(terms.cpi_method)[rows]
+    review_option = np.atleast_1d(terms.review_option)[rows]
+
+    # Index ratios on every lease month up to the last one asked for, so ratchets can accumulate
+    curve_months = np.broadcast_to(np.arange(months.max(initial=0) + 1), (rows.size, months.max(initial=0) + 1))
+    resets = _reset_months(cpi_method, np.atleast_1d(terms.start_month_of_year)[rows].astype(int), np.atleast_1d(terms.term_months)[rows].astype(int), curve_months)
+    lease_series = [series[pk] for pk in price_index_id[rows].tolist()]
+    base = index_levels(lease_series, start_months[:, None], annual_rate)
+    multiplier = index_levels(lease_series, start_months[:, None] + resets, annual_rate) / base
+    higher = review_option == 'partial_ratchet_higher'
+    lower = review_option == 'partial_ratchet_lower'
+    multiplier[higher] = np.maximum.accumulate(multiplier[higher], axis=1)
+    multiplier[lower] = np.minimum.accumulate(multiplier[lower], axis=1)
+
+    initial_rent = np.broadcast_to(np.asarray(initial_rent, dtype=float), rents.shape[:1])[rows]
+    flat_rents = rents.reshape(rents.shape[0], -1)
+    flat_rents[rows] = initial_rent[:, None] * np.take_along_axis(multiplier, months, axis=1)
+    return flat_rents.reshape(rents.shape)
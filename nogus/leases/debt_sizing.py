@@ -0,0 +1,161 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+from django.db.models import QuerySet
+from numpy.typing import ArrayLike
+
+from .financial_calculations import calculate_monthly_debt_payment
+from .models import DebtFinancing, RealEstateProperty
+
+# Labels of the constraint that sets each loan amount
+LOAN_TO_VALUE = 'ltv'
+DEBT_SERVICE_COVERAGE = 'dscr'
+# The coverage limit needs an NOI that is missing, such as a property not revalued yet
+MISSING_NET_OPERATING_INCOME = 'noi_missing'
+
+# Property and DebtFinancing columns fetched for portfolio sizing, in one joined query
+PROPERTY_FIELDS = (
+    'pk',
+    'purchase_price',
+    'net_operating_income',
+    'debt_financing__interest_rate',
+    'debt_financing__amortization_period_years',
+    'debt_financing__max_loan_to_value',
+    'debt_financing__min_debt_service_coverage_ratio',
+    'debt_financing__closing_fees_percentage',
+)
+
+
+class LoanSizing(NamedTuple):
+    """The loans sized for one or many scenarios, shaped like the broadcast inputs.
+
+    Attributes:
+        loan_amount (np.ndarray): The binding loan amount, the lesser of the two constraints, NaN without an NOI to cover.
+        ltv_loan_amount (np.ndarray): The largest loan allowed by the loan-to-value limit.
+        dscr_loan_amount (np.ndarray): The largest loan whose debt service the NOI covers at the minimum ratio.
+        binding_constraint (np.ndarray): LOAN_TO_VALUE, DEBT_SERVICE_COVERAGE or MISSING_NET_OPERATING_INCOME for each loan.
+        annual_debt_service (np.ndarray): The annual payments on the binding loan amount.
+        net_proceeds (np.ndarray): The loan amount less closing fees.
+    """
+    loan_amount: np.ndarray
+    ltv_loan_amount: np.ndarray
+    dscr_loan_amount: np.ndarray
+    binding_constraint: np.ndarray
+    annual_debt_service: np.ndarray
+    net_proceeds: np.ndarray
+
+
+class PortfolioLoanSizing(NamedTuple):
+    """Loans sized for every property of a portfolio, one row per property.
+
+    Attributes:
+        property_ids (np.ndarray): The primary key of each property.
+        interest_rates (np.ndarray): The interest rate of each loan as a percentage.
+        sizing (LoanSizing): The loans, shaped properties x rates.
+    """
+    property_ids: np.ndarray
+    interest_rates: np.ndarray
+    sizing: LoanSizing
+
+
+def size_loans(
+    value: ArrayLike,
+    net_operating_income: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    max_loan_to_value: ArrayLike,
+    min_debt_service_coverage_ratio: ArrayLike,
+    closing_fees_percentage: ArrayLike = 0.0
+) -> LoanSizing:
+    """Sizes loans at the lesser of the loan-to-value and debt-service-coverage limits.
+
+    The coverage limit is the NOI divided by the minimum ratio and by the annual payment per
+    dollar borrowed, so it needs no iteration. Every input is broadcast, so a portfolio
+    column against a row of lender rates sizes the whole grid at once. A NaN NOI where
+    coverage is required sizes a NaN loan bound by MISSING_NET_OPERATING_INCOME, not a zero one.
+
+    Args:
+        value (ArrayLike): The property value the loan-to-value limit applies to.
+        net_operating_income (ArrayLike): The annual NOI that must cover the debt service, NaN where unknown.
+        interest_rate (ArrayLike): The annual interest rate as a percentage.
+        amortization_period_years (ArrayLike): The amortization period in years.
+        max_loan_to_value (ArrayLike): The maximum loan-to-value ratio as a percentage.
+        min_debt_service_coverage_ratio (ArrayLike): The minimum NOI over annual debt service.
+        closing_fees_percentage (ArrayLike): The closing fees as a percentage of the loan amount.
+
+    Returns:
+        LoanSizing: The binding loan amount, both limits and which one binds.
+    """
+    (value, net_operating_income, interest_rate, amortization_period_years, max_loan_to_value,
+     min_debt_service_coverage_ratio, closing_fees_percentage) = np.broadcast_arrays(*(
+        np.asarray(argument, dtype=float) for argument in (
+            value, net_operating_income, interest_rate, amortization_period_years, max_loan_to_value,
+            min_debt_service_coverage_ratio, closing_fees_percentage
+        )
+    ))
+    ltv_loan_amount = np.maximum(value, 0) * max_loan_to_value / 100
+
+    # The annual debt service of one dollar borrowed, the loan constant
+    loan_constant = 12 * calculate_monthly_debt_payment(1.0, interest_rate, amortization_period_years)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dscr_loan_amount = np.maximum(net_operating_income, 0) / min_debt_service_coverage_ratio / loan_constant
+    # Without a coverage requirement, or an amortizing payment, coverage sets no limit
+    dscr_loan_amount = np.where(np.isfinite(dscr_loan_amount) & (min_debt_service_coverage_ratio > 0), dscr_loan_amount, np.inf)
+    missing = np.isnan(net_operating_income) & (min_debt_service_coverage_ratio > 0)
+    dscr_loan_amount = np.where(missing, np.nan, dscr_loan_amount)
+
+    loan_amount = np.minimum(ltv_loan_amount, dscr_loan_amount)
+    binding_constraint = np.where(
+        missing, MISSING_NET_OPERATING_INCOME, np.where(dscr_loan_amount < ltv_loan_amount, DEBT_SERVICE_COVERAGE, LOAN_TO_VALUE)
+    )
+    with np.errstate(invalid='ignore'):
+        annual_debt_service = np.where(missing, np.nan, np.where(loan_amount > 0, loan_amount * loan_constant, 0.0))
+    net_proceeds = loan_amount * (1 - closing_fees_percentage / 100)
+    return LoanSizing(loan_amount, ltv_loan_amount, dscr_loan_amount, binding_constraint, annual_debt_service, net_proceeds)
+
+
+def _column(values, default: float) -> np.ndarray:
+    """Converts a fetched column to floats, replacing NULL with ``default``."""
+    return np.array([default if value is None else value for value in values], dtype=float)
+
+
+def size_portfolio_loans(properties, interest_rates: Optional[ArrayLike] = None) -> PortfolioLoanSizing:
+    """Sizes a loan on every property of a portfolio, optionally across a grid of lender rates.
+
+    Each property's loan uses its purchase price as the value, its revalued net operating
+    income and its DebtFinancing terms, or DebtFinancing's defaults without one. A property
+    not revalued yet has no NOI, so its loan is NaN and bound by MISSING_NET_OPERATING_INCOME
+    wherever coverage is required. Properties are fetched in one joined query and sized in one
+    vectorized call.
+
+    Args:
+        properties (Union[QuerySet, Iterable[RealEstateProperty]]): The properties to size.
+        interest_rates (Optional[ArrayLike]): Rates to size every property at, as percentages,
+            or None for each property's own DebtFinancing rate.
+
+    Returns:
+        PortfolioLoanSizing: Properties x rates loan sizing, with a single column without a grid.
+    """
+    if not isinstance(properties, QuerySet):
+        properties = RealEstateProperty.objects.filter(pk__in=[instance.pk for instance in properties])
+    rows = list(properties.order_by('pk').values_list(*PROPERTY_FIELDS))
+    columns = list(zip(*rows)) if rows else [()] * len(PROPERTY_FIELDS)
+    (property_ids, purchase_price, net_operating_income, interest_rate, amortization_period_years,
+     max_loan_to_value, min_debt_service_coverage_ratio, closing_fees_percentage) = columns
+
+    defaults = {field.name: field.default for field in DebtFinancing._meta.concrete_fields if field.has_default()}
+    if interest_rates is None:
+        interest_rates = _column(interest_rate, defaults['interest_rate'])[:, None]
+    else:
+        interest_rates = np.atleast_1d(np.asarray(interest_rates, dtype=float))[None, :]
+
+    sizing = size_loans(
+        _column(purchase_price, 0.0)[:, None],
+        _column(net_operating_income, np.nan)[:, None],
+        interest_rates,
+        _column(amortization_period_years, defaults['amortization_period_years'])[:, None],
+        _column(max_loan_to_value, defaults['max_loan_to_value'])[:, None],
+        _column(min_debt_service_coverage_ratio, defaults['min_debt_service_coverage_ratio'])[:, None],
+        _column(closing_fees_percentage, defaults['closing_fees_percentage'])[:, None]
+    )
+    return PortfolioLoanSizing(np.array(property_ids, dtype=int), np.broadcast_to(interest_rates, sizing.loan_amount.shape), sizing)
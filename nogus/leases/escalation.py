@@ -0,0 +1,199 @@
+from functools import lru_cache
+from typing import NamedTuple, Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+# Curves are computed in blocks of this many months so leases of different lengths share them
+CURVE_BLOCK_MONTHS = 120
+
+
+class EscalationCurve(NamedTuple):
+    """The escalation of a rent over the months of a lease, in closed form.
+
+    The escalated rent in lease month ``m`` is ``initial_rent * multiplier[m] + increment[m]``.
+    Both arrays are read-only because curves are shared between leases.
+
+    Attributes:
+        multiplier (np.ndarray): The factor applied to the initial rent.
+        increment (np.ndarray): The fixed amount added to the rent.
+    """
+    multiplier: np.ndarray
+    increment: np.ndarray
+
+
+class EscalationTerms(NamedTuple):
+    """The escalation parameters of many leases, one array entry per lease.
+
+    Attributes:
+        method (np.ndarray): The LeaseFinancialDetail annual rent escalation method.
+        annual_rate (np.ndarray): The annual escalation or assumed CPI rate as a percentage.
+        step_amount (np.ndarray): The amount added to the monthly rent at each anniversary for step escalations.
+        cpi_method (np.ndarray): The LeaseEscalationMethod CPI method, or None.
+        review_option (np.ndarray): The LeaseEscalationMethod review option, or None.
+        start_month_of_year (np.ndarray): The calendar month, 1 to 12, in which each lease starts.
+        term_months (np.ndarray): The length of each lease in months.
+    """
+    method: np.ndarray
+    annual_rate: np.ndarray
+    step_amount: np.ndarray
+    cpi_method: np.ndarray
+    review_option: np.ndarray
+    start_month_of_year: np.ndarray
+    term_months: np.ndarray
+
+
+def _escalation_count(cpi_method: Optional[str], start_month_of_year: int, term_months: int, months: np.ndarray) -> np.ndarray:
+    """Counts the escalations applied by each lease month under a CPI reset timing."""
+    if cpi_method == 'calendar_year':
+        # Resets every January after the lease starts
+        return (start_month_of_year - 1 + months) // 12
+    if cpi_method == 'mid_lease':
+        # One reset at mid-lease carrying the growth accrued up to then
+        mid_lease = term_months // 2
+        return np.where(months >= mid_lease, mid_lease / 12, 0.0)
+    # Resets on every lease anniversary
+    return months // 12
+
+
+@lru_cache(maxsize=4096)
+def escalation_curve(
+    method: Optional[str] = 'fixed',
+    annual_rate: float = 0.0,
+    step_amount: float = 0.0,
+    cpi_method: Optional[str] = None,
+    review_option: Optional[str] = None,
+    start_month_of_year: int = 1,
+    term_months: int = 0,
+    months: int = CURVE_BLOCK_MONTHS
+) -> EscalationCurve:
+    """Computes the escalation curve of a set of lease terms in closed form.
+
+    Curves are memoized by their parameters, so leases that share escalation terms share
+    one computed curve.
+
+    Args:
+        method (Optional[str]): 'fixed' for a fixed percentage, 'cpi' for CPI or 'step' for fixed steps.
+        annual_rate (float): The annual escalation, or assumed CPI growth, as a percentage.
+        step_amount (float): The amount added to the monthly rent at each lease anniversary.
+        cpi_method (Optional[str]): When CPI resets apply: 'lease_year', 'calendar_year' or 'mid_lease'.
+        review_option (Optional[str]): 'partial_ratchet_higher' lets the rent only rise and
+            'partial_ratchet_lower' lets it only fall. 'sales_review' needs sales data, so it
+            leaves the curve unchanged.
+        start_month_of_year (int): The calendar month, 1 to 12, in which the lease starts.
+        term_months (int): The length of the lease in months, used for mid-lease resets.
+        months (int): The number of lease months in the curve.
+
+    Returns:
+        EscalationCurve: The read-only multiplier and increment for every lease month.
+    """
+    lease_months = np.arange(months)
+    multiplier = np.ones(months)
+    increment = np.zeros(months)
+
+    if method == 'step':
+        increment = step_amount * (lease_months // 12)
+    elif method == 'cpi':
+        multiplier = (1 + annual_rate / 100) ** _escalation_count(cpi_method, start_month_of_year, term_months, lease_months)
+    elif method == 'fixed':
+        multiplier = (1 + annual_rate / 100) ** (lease_months // 12)
+
+    # Ratchets hold the rent at its running peak or trough
+    if review_option == 'partial_ratchet_higher':
+        multiplier = np.maximum.accumulate(multiplier)
+    elif review_option == 'partial_ratchet_lower':
+        multiplier = np.minimum.accumulate(multiplier)
+
+    multiplier = np.asarray(multiplier, dtype=float)
+    increment = np.asarray(increment, dtype=float)
+    multiplier.flags.writeable = False
+    increment.flags.writeable = False
+    return EscalationCurve(multiplier, increment)
+
+
+def _factorize(column: np.ndarray):
+    """Encodes a column as integer codes, hashing object columns instead of sorting them."""
+    if column.dtype == object:
+        values = column.tolist()
+        labels = {value: code for code, value in enumerate(dict.fromkeys(values))}
+        return np.fromiter(map(labels.__getitem__, values), dtype=np.int64, count=len(values)), len(labels)
+    uniques, codes = np.unique(column, return_inverse=True)
+    return codes.ravel(), uniques.size
+
+
+def escalation_terms(
+    method: ArrayLike,
+    annual_rate: ArrayLike,
+    step_amount: ArrayLike,
+    cpi_method: ArrayLike,
+    review_option: ArrayLike,
+    lease_start_date: ArrayLike,
+    lease_end_date: ArrayLike
+) -> EscalationTerms:
+    """Builds the escalation terms of many leases from their stored columns.
+
+    Args:
+        method (ArrayLike): The annual rent escalation method of each lease.
+        annual_rate (ArrayLike): The annual escalation rate of each lease as a percentage.
+        step_amount (ArrayLike): The step amount of each lease.
+        cpi_method (ArrayLike): The CPI method of each lease, or None.
+        review_option (ArrayLike): The review option of each lease, or None.
+        lease_start_date (ArrayLike): The start date of each lease.
+        lease_end_date (ArrayLike): The end date of each lease.
+
+    Returns:
+        EscalationTerms: The terms, one entry per lease.
+    """
+    start_month = np.asarray(lease_start_date, dtype='datetime64[M]')
+    end_month = np.asarray(lease_end_date, dtype='datetime64[M]')
+    columns = [np.asarray(column, dtype=object) for column in (method, annual_rate, step_amount, cpi_method, review_option)]
+    columns += [start_month.astype(int) % 12 + 1, (end_month - start_month).astype(int) + 1]
+    return EscalationTerms(*(np.atleast_1d(column) for column in np.broadcast_arrays(*columns)))
+
+
+def escalated_rents(initial_rent: ArrayLike, terms: EscalationTerms, lease_months: ArrayLike) -> np.ndarray:
+    """Calculates escalated rents of many leases by looking up their shared curves.
+
+    Leases are grouped by identical escalation terms; each group's curve is computed
+    once, or taken from the cache, and indexed for all of its leases at once.
+
+    Args:
+        initial_rent (ArrayLike): The initial monthly rent of each lease.
+        terms (EscalationTerms): The escalation terms of each lease.
+        lease_months (ArrayLike): Lease months per lease, shaped (leases,) or (leases, months).
+
+    Returns:
+        np.ndarray: The escalated rent of each lease in each requested month.
+    """
+    initial_rent = np.atleast_1d(np.asarray(initial_rent, dtype=float))
+    lease_months = np.asarray(lease_months)
+    lease_months = np.clip(np.broadcast_to(lease_months, initial_rent.shape + lease_months.shape[1:]), 0, None).astype(int)
+    trailing = (slice(None),) + (None,) * (lease_months.ndim - 1)
+    rents = np.empty(lease_months.shape)
+
+    # Grouping leases by their escalation terms without a Python loop over leases
+    columns = [np.atleast_1d(np.asarray(column)) for column in terms]
+    group_ids = np.zeros(initial_rent.size, dtype=np.int64)
+    for column in columns:
+        codes, size = _factorize(column)
+        group_ids = np.unique(group_ids * size + codes, return_inverse=True)[1].ravel()
+    order = np.argsort(group_ids, kind='stable')
+    boundaries = np.cumsum(np.bincount(group_ids))[:-1]
+
+    for positions in np.split(order, boundaries):
+        method, annual_rate, step_amount, cpi_method, review_option, start_month_of_year, term_months = (
+            column[positions[0]] for column in columns
+        )
+        group_months = lease_months[positions]
+        blocks = -(-(int(group_months.max(initial=0)) + 1) // CURVE_BLOCK_MONTHS)
+        # Only CPI curves depend on the lease's timing, so other leases share one cached curve
+        is_cpi = method == 'cpi'
+        curve = escalation_curve(
+            method, float(annual_rate or 0), float(step_amount or 0),
+            cpi_method if is_cpi else None, review_option,
+            int(start_month_of_year) if is_cpi and cpi_method == 'calendar_year' else 1,
+            int(term_months) if is_cpi and cpi_method == 'mid_lease' else 0,
+            blocks * CURVE_BLOCK_MONTHS
+        )
+        rents[positions] = initial_rent[positions][trailing] * curve.multiplier[group_months] + curve.increment[group_months]
+    return rents
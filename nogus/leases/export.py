@@ -0,0 +1,277 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+import numpy as np
+from django.db.models import QuerySet
+
+from .models import Lease, RealEstateProperty
+from .projections import compute_lease_projections, compute_property_projections, projection_matrix
+
+# File formats an export can write; every partition gets its .npy arrays either way
+FORMATS = ('npy', 'parquet')
+# Parquet needs pyarrow, so it is only written on request
+DEFAULT_FORMATS = ('npy',)
+MANIFEST_NAME = 'manifest.json'
+PORTFOLIO_DIRECTORY = 'portfolio'
+
+
+class ExportStats(NamedTuple):
+    """Counts of one projection export.
+
+    Attributes:
+        partitions (int): The partitions in the export.
+        written (int): The partitions whose contents changed and were rewritten.
+        unchanged (int): The partitions left in place because their fingerprint matched.
+        removed (int): The partitions that no longer have cash flows or whose property was deleted.
+    """
+    partitions: int
+    written: int
+    unchanged: int
+    removed: int
+
+
+class Partition(NamedTuple):
+    """The arrays of one property-year or portfolio-year partition, keyed by file stem.
+
+    Attributes:
+        path (str): The Hive-style directory of the partition relative to the export root.
+        arrays (Dict[str, np.ndarray]): The arrays written as ``<stem>.npy``.
+        tables (Dict[str, Tuple[str, str]]): The long Parquet tables of the partition, each
+            mapping a level name to its id and matrix stems.
+    """
+    path: str
+    arrays: Dict[str, np.ndarray]
+    tables: Dict[str, Tuple[str, str]]
+
+
+def _align(months: np.ndarray, matrix: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """Places a rows x months matrix on a wider month grid, with zeros outside its own months."""
+    aligned = np.zeros((matrix.shape[0], grid.size))
+    if months.size:
+        start = int((months[0] - grid[0]).astype(int))
+        aligned[:, start:start + months.size] = matrix
+    return aligned
+
+
+def _fingerprint(partition: Partition, formats: Tuple[str, ...]) -> str:
+    """Hashes the contents of a partition and the formats written, so any change rewrites it."""
+    digest = hashlib.sha256(repr(sorted(formats)).encode())
+    for stem in sorted(partition.arrays):
+        array = np.ascontiguousarray(partition.arrays[stem])
+        digest.update(f'{stem}:{array.dtype.str}:{array.shape}'.encode())
+        digest.update(array.tobytes())
+    return digest.hexdigest()
+
+
+def _pyarrow():
+    """Imports pyarrow and its Parquet module, which only Parquet exports need."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as error:
+        raise ImportError('Writing Parquet projections requires pyarrow') from error
+    return pyarrow, pyarrow.parquet
+
+
+def _write_parquet(path: Path, partition: Partition):
+    """Writes the long table of a partition: one row per level, id and month."""
+    pa, pq = _pyarrow()
+
+    months = partition.arrays['months']
+    levels, ids, row_months, cashflows = [], [], [], []
+    for level, (id_stem, matrix_stem) in partition.tables.items():
+        matrix = np.atleast_2d(partition.arrays[matrix_stem])
+        row_ids = partition.arrays[id_stem] if id_stem else np.zeros(matrix.shape[0], dtype=np.int64)
+        levels.append(np.full(matrix.size, level))
+        ids.append(np.repeat(row_ids, months.size))
+        row_months.append(np.tile(months, matrix.shape[0]))
+        cashflows.append(matrix.ravel())
+    table = pa.table({
+        'level': pa.array(np.concatenate(levels)),
+        'id': pa.array(np.concatenate(ids), type=pa.int64()),
+        'month': pa.array(np.concatenate(row_months).astype('datetime64[D]')),
+        'cashflow': pa.array(np.concatenate(cashflows)),
+    })
+    pq.write_table(table, path)
+
+
+def _write_partition(root: Path, partition: Partition, formats: Tuple[str, ...]):
+    """Writes a partition into a scratch directory and swaps it in, so readers never see half of it."""
+    target = root / partition.path
+    scratch = target.with_name(target.name + '.tmp')
+    shutil.rmtree(scratch, ignore_errors=True)
+    scratch.mkdir(parents=True)
+    for stem, array in partition.arrays.items():
+        np.save(scratch / f'{stem}.npy', np.ascontiguousarray(array), allow_pickle=False)
+    if 'parquet' in formats:
+        _write_parquet(scratch / 'cashflows.parquet', partition)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(scratch, target)
+
+
+def _year_slices(grid: np.ndarray) -> List[Tuple[int, slice]]:
+    """Splits a contiguous month grid into its calendar years."""
+    years = grid.astype('datetime64[Y]').astype(int) + 1970
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(years)) + 1, [grid.size]]).astype(int)
+    return [(int(years[start]), slice(start, end)) for start, end in zip(starts[:-1], starts[1:])]
+
+
+def projection_partitions(properties, portfolio: bool = True) -> List[Partition]:
+    """Lays the stored projections of many properties and their leases out as yearly partitions.
+
+    Each property gets one ``property_id=<pk>/year=<yyyy>`` partition per calendar year it has
+    cash flows in, holding its months, its lease ids, a leases x months matrix and its own
+    series. With ``portfolio``, the ``portfolio/year=<yyyy>`` partitions hold every property's
+    series and their total. Projections are read in two queries and computed first where they
+    are missing.
+
+    Args:
+        properties (Union[QuerySet, Iterable[RealEstateProperty]]): The properties to lay out.
+        portfolio (bool): Whether to add the portfolio partitions of these properties.
+
+    Returns:
+        List[Partition]: Every partition with cash flows, properties in primary key order.
+    """
+    if not isinstance(properties, QuerySet):
+        properties = RealEstateProperty.objects.filter(pk__in=[instance.pk for instance in properties])
+    property_ids = list(properties.order_by('pk').values_list('pk', flat=True))
+    leases = Lease.objects.filter(real_estate_property__in=properties.values('pk'))
+    lease_rows = list(leases.order_by('pk').values_list('pk', 'real_estate_property_id'))
+    lease_ids = [pk for pk, _ in lease_rows]
+
+    property_months, property_matrix = projection_matrix(
+        'real_estate_property_id', properties.values('pk'), property_ids, compute_property_projections
+    )
+    lease_months, lease_matrix = projection_matrix('lease_id', leases.values('pk'), lease_ids, compute_lease_projections)
+    spans = [months for months in (property_months, lease_months) if months.size]
+    if not spans:
+        return []
+    # One grid for both levels, so every partition's matrices share its months
+    first_month = min(months[0] for months in spans)
+    grid = np.arange(first_month, max(months[-1] for months in spans) + 1, dtype='datetime64[M]')
+    property_matrix = _align(property_months, property_matrix, grid)
+    lease_matrix = _align(lease_months, lease_matrix, grid)
+
+    # Lease rows grouped by property with one sort
+    lease_ids = np.array(lease_ids, dtype=np.int64)
+    lease_owners = np.array([owner for _, owner in lease_rows], dtype=np.int64)
+    order = np.argsort(lease_owners, kind='stable')
+    bounds = np.searchsorted(lease_owners[order], property_ids, side='left'), np.searchsorted(lease_owners[order], property_ids, side='right')
+
+    partitions = []
+    years = _year_slices(grid)
+    for row, property_id in enumerate(property_ids):
+        rows = order[bounds[0][row]:bounds[1][row]]
+        for year, columns in years:
+            series, matrix = property_matrix[row, columns], lease_matrix[rows, columns]
+            if not (series.any() or matrix.any()):
+                continue
+            partitions.append(Partition(
+                f'property_id={property_id}/year={year}',
+                {
+                    'months': grid[columns], 'lease_ids': lease_ids[rows], 'leases': matrix,
+                    'property_ids': np.array([property_id], dtype=np.int64), 'property': series,
+                },
+                {'lease': ('lease_ids', 'leases'), 'property': ('property_ids', 'property')},
+            ))
+    for year, columns in years if portfolio else ():
+        matrix = property_matrix[:, columns]
+        if not matrix.any():
+            continue
+        partitions.append(Partition(
+            f'{PORTFOLIO_DIRECTORY}/year={year}',
+            {'months': grid[columns], 'property_ids': np.array(property_ids, dtype=np.int64), 'properties': matrix, 'total': matrix.sum(axis=0)},
+            {'property': ('property_ids', 'properties'), 'total': ('', 'total')},
+        ))
+    return partitions
+
+
+def _partition_owner(path: str) -> str:
+    return path.split('/', 1)[0]
+
+
+def export_projections(properties, root, formats: Iterable[str] = DEFAULT_FORMATS) -> ExportStats:
+    """Writes the projections of many properties as columnar files partitioned by property and year.
+
+    Every partition holds ``.npy`` arrays that ``np.load(mmap_mode='r')`` maps without a
+    database, and with 'parquet' a long ``cashflows.parquet`` table of level, id, month and
+    cash flow that Hive-partitioned scans pick the property and year up from. The portfolio
+    partitions are only written when every property is exported, so exporting a few properties
+    leaves the portfolio totals of the last full export in place.
+
+    ``manifest.json`` keeps each partition's content fingerprint, so a re-export rewrites only
+    the partitions whose cash flows changed. It removes the exported properties' partitions
+    that no longer have cash flows, and the partitions of any property deleted since.
+
+    Args:
+        properties (Union[QuerySet, Iterable[RealEstateProperty]]): The properties to export.
+        root: The export directory, created if needed.
+        formats (Iterable[str]): The formats to write, from FORMATS; .npy only by default.
+
+    Returns:
+        ExportStats: The partitions written, left unchanged and removed.
+
+    Raises:
+        ValueError: If a format is unknown.
+        ImportError: If Parquet is requested and pyarrow is not installed.
+    """
+    formats = tuple(sorted(set(formats) | {'npy'}))
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f'Unknown export formats: {", ".join(sorted(unknown))}')
+    if 'parquet' in formats:
+        _pyarrow()
+    if not isinstance(properties, QuerySet):
+        properties = RealEstateProperty.objects.filter(pk__in=[instance.pk for instance in properties])
+
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    manifest_path = root / MANIFEST_NAME
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {}
+
+    # Portfolio totals only cover the whole portfolio
+    full_portfolio = properties.count() == RealEstateProperty.objects.count()
+    partitions = projection_partitions(properties, portfolio=full_portfolio)
+    written = unchanged = 0
+    exported = {}
+    for partition in partitions:
+        fingerprint = _fingerprint(partition, formats)
+        exported[partition.path] = fingerprint
+        if manifest.get(partition.path) == fingerprint and (root / partition.path).is_dir():
+            unchanged += 1
+            continue
+        _write_partition(root, partition, formats)
+        written += 1
+
+    # Partitions of the exported properties, and of the portfolio, that this export no longer has
+    owners = {f'property_id={pk}' for pk in properties.values_list('pk', flat=True)}
+    if full_portfolio:
+        owners.add(PORTFOLIO_DIRECTORY)
+    removed = [path for path in manifest if _partition_owner(path) in owners and path not in exported]
+    # and those of properties deleted since they were exported
+    manifest_owners = {_partition_owner(path) for path in manifest} - owners - {PORTFOLIO_DIRECTORY}
+    existing = {
+        f'property_id={pk}' for pk in RealEstateProperty.objects.filter(
+            pk__in=[int(owner.split('=', 1)[1]) for owner in manifest_owners]
+        ).values_list('pk', flat=True)
+    }
+    removed += [path for path in manifest if _partition_owner(path) in manifest_owners - existing]
+    for path in removed:
+        shutil.rmtree(root / path, ignore_errors=True)
+        del manifest[path]
+    for owner in {_partition_owner(path) for path in removed}:
+        # Dropping the property's directory once its last partition is gone
+        try:
+            (root / owner).rmdir()
+        except OSError:
+            pass
+
+    manifest.update(exported)
+    scratch = manifest_path.with_suffix('.tmp')
+    scratch.write_text(json.dumps(manifest, indent=2, sort_keys=True))
+    os.replace(scratch, manifest_path)
+    return ExportStats(len(partitions), written, unchanged, len(removed))
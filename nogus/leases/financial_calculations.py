@@ -1,5 +1,9 @@
+from typing import List, Optional
 
-from typing import List
+import numpy as np
+from numpy.typing import ArrayLike
+
+from .irr import solve_irr
 
 def calculate_unlevered_irr(cash_flows: List[float]) -> float:
     """Calculates the unlevered internal rate of return (IRR) for a given series of cash flows.
@@ -10,8 +14,8 @@ def calculate_unlevered_irr(cash_flows: List[float]) -> float:
     Returns:
         float: The unlevered IRR as a percentage.
     """
-    # Using the NumPy IRR function to calculate the unlevered IRR
-    unlevered_irr = np.irr(cash_flows)
+    # Solving the IRR with the batched solver on a single row
+    unlevered_irr = solve_irr(cash_flows).irr[0]
     return unlevered_irr * 100
 
 def calculate_levered_irr(
@@ -36,8 +40,8 @@ def calculate_levered_irr(
     # Calculating the net cash flows to equity by subtracting debt payments from operating cash flows
     net_cash_flows_to_equity = [acquisition_cash_flow] + [cf - dp for cf, dp in zip(operating_cash_flows, debt_payments)] + [refinancing_cash_flow] + [sale_cash_flow]
 
-    # Using the NumPy IRR function to calculate the levered IRR
-    levered_irr = np.irr(net_cash_flows_to_equity)
+    # Solving the IRR with the batched solver on a single row
+    levered_irr = solve_irr(net_cash_flows_to_equity).irr[0]
     return levered_irr * 100
 
 def calculate_acquisition_cash_flow(purchase_price_per_unit: float, units: int, closing_costs: float) -> float:
@@ -55,6 +59,73 @@ def calculate_acquisition_cash_flow(purchase_price_per_unit: float, units: int,
     acquisition_cash_flow = -(purchase_price_per_unit * units + closing_costs)
     return acquisition_cash_flow
 
+def calculate_operating_cash_flow_matrix(
+    in_place_rent: ArrayLike,
+    gross_square_feet: ArrayLike,
+    occupancy_rate: ArrayLike,
+    operating_expenses: ArrayLike,
+    rent_growth_rate: ArrayLike,
+    vacancy_rate: ArrayLike,
+    holding_period_years: ArrayLike,
+    expense_growth_rate: float = 3.0,
+    occupancy_curve: Optional[ArrayLike] = None
+) -> np.ndarray:
+    """Calculates the operating cash flows of many properties in one vectorized pass.
+
+    Every argument is broadcast to one row per property, so scalars can be mixed with
+    per-property arrays. Properties with a shorter holding period than the longest one
+    in the batch have their trailing years masked to zero.
+
+    Without an occupancy curve, every year is let at the flat ``occupancy_rate - vacancy_rate``.
+    A monthly curve, such as one from leases.absorption, replaces that factor month by month;
+    a curve shorter than the holding period is held at its last value.
+
+    Args:
+        in_place_rent (ArrayLike): The in-place rent per square foot per month.
+        gross_square_feet (ArrayLike): The total gross square feet in each property.
+        occupancy_rate (ArrayLike): The initial occupancy rate as a percentage.
+        operating_expenses (ArrayLike): The total operating expenses for the first year.
+        rent_growth_rate (ArrayLike): The annual rent growth rate as a percentage.
+        vacancy_rate (ArrayLike): The vacancy rate upon stabilization as a percentage.
+        holding_period_years (ArrayLike): The holding period of each property in years.
+        expense_growth_rate (float): The annual operating expense growth rate as a percentage.
+        occupancy_curve (Optional[ArrayLike]): The occupancy in each month as a percentage,
+            shaped (months,) or (properties, months).
+
+    Returns:
+        np.ndarray: A properties x years matrix of operating cash flows.
+    """
+    (in_place_rent, gross_square_feet, occupancy_rate, operating_expenses,
+     rent_growth_rate, vacancy_rate, holding_period_years) = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(value, dtype=float)) for value in (
+            in_place_rent, gross_square_feet, occupancy_rate, operating_expenses,
+            rent_growth_rate, vacancy_rate, holding_period_years
+        ))
+    )
+    holding_period_years = holding_period_years.astype(int)
+    years = np.arange(holding_period_years.max(initial=0))
+
+    if occupancy_curve is None:
+        # Calculating the first-year effective rent considering occupancy and vacancy
+        occupied_months = np.broadcast_to((12 * (occupancy_rate - vacancy_rate) / 100)[:, None], (occupancy_rate.size, years.size))
+    else:
+        # Summing the occupied share of each month into occupied months per year
+        occupancy_curve = np.atleast_2d(np.asarray(occupancy_curve, dtype=float))
+        if occupancy_curve.shape[1] == 0:
+            occupancy_curve = np.zeros((occupancy_curve.shape[0], 1))
+        months = np.minimum(np.arange(years.size * 12), occupancy_curve.shape[1] - 1)
+        occupancy_curve = np.broadcast_to(occupancy_curve, (occupancy_rate.size, occupancy_curve.shape[1]))
+        occupied_months = (occupancy_curve[:, months] / 100).reshape(occupancy_rate.size, years.size, 12).sum(axis=2)
+
+    # Growing rent and operating expenses for every property and year at once
+    rent_growth = (1 + rent_growth_rate[:, None] / 100) ** years
+    expense_growth = (1 + expense_growth_rate / 100) ** years
+    noi = (in_place_rent * gross_square_feet)[:, None] * occupied_months * rent_growth - operating_expenses[:, None] * expense_growth
+
+    # Masking the years beyond each property's own holding period
+    noi[years >= holding_period_years[:, None]] = 0.0
+    return noi
+
 def calculate_operating_cash_flows(
     in_place_rent: float,
     gross_square_feet: float,
@@ -62,7 +133,8 @@ def calculate_operating_cash_flows(
     operating_expenses: float,
     rent_growth_rate: float,
     vacancy_rate: float,
-    holding_period_years: int
+    holding_period_years: int,
+    occupancy_curve: Optional[List[float]] = None
 ) -> List[float]:
     """Calculates the operating cash flows for each period during the holding period.
     
@@ -74,30 +146,33 @@ def calculate_operating_cash_flows(
         rent_growth_rate (float): The annual rent growth rate as a percentage.
         vacancy_rate (float): The vacancy rate upon stabilization as a percentage.
         holding_period_years (int): The total holding period in years.
+        occupancy_curve (Optional[List[float]]): The monthly occupancy as percentages, in place of
+            the flat ``occupancy_rate - vacancy_rate``.
 
     Returns:
         List[float]: The operating cash flows for each period.
     """
-    operating_cash_flows = []
-    for year in range(holding_period_years):
-        # Calculating the effective rent considering occupancy and vacancy
-        effective_rent = in_place_rent * gross_square_feet * 12 * ((occupancy_rate - vacancy_rate) / 100)
-        
-        # Adjusting the rent for rent growth
-        effective_rent *= (1 + rent_growth_rate / 100) ** year
-
-        # Calculating the NOI by subtracting operating expenses
-        noi = effective_rent - operating_expenses * (1 + 0.03) ** year  # 3% annual growth in operating expenses
-
-        operating_cash_flows.append(noi)
-
-    return operating_cash_flows
+    # Delegating to the batched engine with a single property row
+    operating_cash_flows = calculate_operating_cash_flow_matrix(
+        in_place_rent,
+        gross_square_feet,
+        occupancy_rate,
+        operating_expenses,
+        rent_growth_rate,
+        vacancy_rate,
+        holding_period_years,
+        occupancy_curve=occupancy_curve
+    )
+    return operating_cash_flows[0].tolist()
 
 def calculate_refinancing_cash_flow(
     noi: float,
     cap_rate: float,
     max_loan_to_value_ratio: float,
-    closing_fees_percentage: float
+    closing_fees_percentage: float,
+    min_debt_service_coverage_ratio: Optional[float] = None,
+    interest_rate: float = 0.0,
+    amortization_period_years: int = 30
 ) -> float:
     """Calculates the refinancing cash flow for refinancing a property.
     
@@ -106,6 +181,10 @@ def calculate_refinancing_cash_flow(
         cap_rate (float): The capitalization rate used for refinancing valuation.
         max_loan_to_value_ratio (float): The maximum loan-to-value ratio allowed.
         closing_fees_percentage (float): The closing fees as a percentage of the refinanced amount.
+        min_debt_service_coverage_ratio (Optional[float]): The minimum NOI over annual debt service,
+            or None to size on loan-to-value alone.
+        interest_rate (float): The annual interest rate of the new loan as a percentage.
+        amortization_period_years (int): The amortization period of the new loan in years.
 
     Returns:
         float: The refinancing cash flow.
@@ -116,6 +195,14 @@ def calculate_refinancing_cash_flow(
     # Calculating the refinanced amount considering the max loan-to-value ratio
     refinanced_amount = property_value * max_loan_to_value_ratio / 100
 
+    # Limiting the refinanced amount to what the NOI covers at the minimum ratio
+    if min_debt_service_coverage_ratio is not None:
+        from .debt_sizing import size_loans
+        refinanced_amount = float(size_loans(
+            property_value, noi, interest_rate, amortization_period_years,
+            max_loan_to_value_ratio, min_debt_service_coverage_ratio
+        ).loan_amount)
+
     # Applying closing fees
     closing_fees = refinanced_amount * closing_fees_percentage / 100
 
@@ -145,6 +232,60 @@ def calculate_sale_cash_flow(
     sale_cash_flow = property_value - fees
     return sale_cash_flow
 
+def calculate_monthly_debt_payment(
+    principal: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike
+) -> np.ndarray:
+    """Calculates the level monthly payment of one or many amortizing loans.
+    
+    Args:
+        principal (ArrayLike): The principal amount of each loan.
+        interest_rate (ArrayLike): The annual interest rate as a percentage.
+        amortization_period_years (ArrayLike): The amortization period in years.
+
+    Returns:
+        np.ndarray: The monthly payment of each loan, broadcast over the inputs.
+    """
+    principal = np.asarray(principal, dtype=float)
+    monthly_interest_rate = np.asarray(interest_rate, dtype=float) / 100 / 12
+    total_payments_amortization = np.asarray(amortization_period_years, dtype=float) * 12
+
+    # Monthly payment using the formula for monthly payment on an amortizing loan, straight-line at a zero rate
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity_payment = (principal * monthly_interest_rate) / (1 - (1 + monthly_interest_rate) ** (-total_payments_amortization))
+        straight_line_payment = principal / total_payments_amortization
+    return np.where(monthly_interest_rate == 0, straight_line_payment, annuity_payment)
+
+def calculate_loan_balance(
+    principal: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    months_elapsed: ArrayLike
+) -> np.ndarray:
+    """Calculates the outstanding balance of one or many amortizing loans after a number of payments.
+    
+    Args:
+        principal (ArrayLike): The principal amount of each loan.
+        interest_rate (ArrayLike): The annual interest rate as a percentage.
+        amortization_period_years (ArrayLike): The amortization period in years.
+        months_elapsed (ArrayLike): The number of monthly payments already made.
+
+    Returns:
+        np.ndarray: The outstanding balance of each loan, broadcast over the inputs.
+    """
+    principal = np.asarray(principal, dtype=float)
+    monthly_interest_rate = np.asarray(interest_rate, dtype=float) / 100 / 12
+    months_elapsed = np.minimum(months_elapsed, np.asarray(amortization_period_years) * 12)
+    monthly_payment = calculate_monthly_debt_payment(principal, interest_rate, amortization_period_years)
+
+    # Closed-form balance: the principal grown at the loan rate less the future value of the payments made
+    growth = (1 + monthly_interest_rate) ** months_elapsed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annuity_balance = principal * growth - monthly_payment * (growth - 1) / monthly_interest_rate
+    straight_line_balance = principal - monthly_payment * months_elapsed
+    return np.where(monthly_interest_rate == 0, straight_line_balance, annuity_balance)
+
 def calculate_debt_payments(
     principal: float,
     interest_rate: float,
@@ -162,15 +303,11 @@ def calculate_debt_payments(
     Returns:
         List[float]: The monthly debt payments for each period within the loan term.
     """
-    # Monthly interest rate
-    monthly_interest_rate = (interest_rate / 100) / 12
-
     # Total number of payments (monthly)
-    total_payments_amortization = amortization_period_years * 12
     total_payments_loan_term = loan_term_years * 12
 
-    # Monthly payment using the formula for monthly payment on an amortizing loan
-    monthly_payment = (principal * monthly_interest_rate) / (1 - (1 + monthly_interest_rate) ** (-total_payments_amortization))
+    # Monthly payment from the vectorized helper
+    monthly_payment = float(calculate_monthly_debt_payment(principal, interest_rate, amortization_period_years))
 
     # Monthly payments over the loan term
     debt_payments = [monthly_payment] * total_payments_loan_term
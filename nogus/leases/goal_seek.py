@@ -0,0 +1,184 @@
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from .financial_calculations import calculate_operating_cash_flow_matrix
+from .underwriting import ACQUISITION_INPUTS, acquisition_inputs, calculate_equity_cash_flows, calculate_levered_returns
+
+# Search ranges of inputs solved by bisection, used when no bounds are given
+DEFAULT_BOUNDS = {
+    'in_place_rent': (0.0, 1000.0),
+    'occupancy_rate': (0.0, 100.0),
+    'operating_expenses': (0.0, 1e9),
+    'rent_growth_rate': (-50.0, 50.0),
+    'vacancy_rate': (0.0, 100.0),
+    'loan_to_value_ratio': (0.0, 100.0),
+    'interest_rate': (0.0, 50.0),
+    'closing_costs': (0.0, 1e9),
+    'sale_fees': (0.0, 1e9),
+}
+# Inputs of the operating cash flows, in the order calculate_operating_cash_flow_matrix accepts them;
+# while solving any other input they are computed once and reused at every step
+OPERATING_INPUTS = (
+    'in_place_rent',
+    'gross_square_feet',
+    'occupancy_rate',
+    'operating_expenses',
+    'rent_growth_rate',
+    'vacancy_rate',
+    'holding_period_years',
+)
+DEFAULT_TOLERANCE = 1e-8
+DEFAULT_MAX_ITERATIONS = 200
+
+
+class GoalSeekResult(NamedTuple):
+    """The value of one input that brings each scenario's levered IRR to its target.
+
+    Attributes:
+        input (str): The solved input.
+        values (np.ndarray): The solved value of each scenario, NaN where no value within reach meets the target.
+        irr (np.ndarray): The levered IRR at the solved values, as a percentage.
+        iterations (int): The bisection steps taken, 0 for inputs solved in closed form.
+    """
+    input: str
+    values: np.ndarray
+    irr: np.ndarray
+    iterations: int
+
+
+def _present_value(equity_cash_flows: np.ndarray, rate: np.ndarray) -> np.ndarray:
+    """Discounts annual cash flows, years on the last axis, at a percentage rate per scenario."""
+    years = np.arange(equity_cash_flows.shape[-1])
+    return (equity_cash_flows * (1 + rate[..., None] / 100) ** -years).sum(axis=-1)
+
+
+def _evaluate(inputs: Dict[str, ArrayLike], **changes) -> np.ndarray:
+    return calculate_equity_cash_flows(**dict(inputs, **changes))
+
+
+def _solve_purchase_price(inputs: Dict[str, ArrayLike], target: np.ndarray) -> np.ndarray:
+    """Solves the price in closed form, since equity cash flows are linear in it.
+
+    The loan, its debt service and its payoff all scale with the price, so two evaluations give
+    the price-free cash flows and the cash flows per unit of price.
+    """
+    fixed = _evaluate(inputs, purchase_price_per_unit=0.0)
+    per_price = _evaluate(inputs, purchase_price_per_unit=1.0) - fixed
+    with np.errstate(divide='ignore', invalid='ignore'):
+        price = -_present_value(fixed, target) / _present_value(per_price, target)
+    return np.where(np.isfinite(price) & (price >= 0), price, np.nan)
+
+
+def _solve_going_out_cap_rate(inputs: Dict[str, ArrayLike], target: np.ndarray) -> np.ndarray:
+    """Solves the highest exit cap rate in closed form, since only the sale value depends on it.
+
+    Evaluating without a sale value and at a 100% cap rate gives the other cash flows and the
+    final-year NOI; the sale value that meets the target is then discounted back to a cap rate.
+    """
+    without_sale = _evaluate(inputs, going_out_cap_rate=np.inf)
+    at_full_cap = _evaluate(inputs, going_out_cap_rate=100.0)
+    final_noi = (at_full_cap - without_sale).sum(axis=-1)
+    holding_period_years = np.broadcast_to(np.asarray(inputs['holding_period_years'], dtype=float), target.shape)
+    required_value = -_present_value(without_sale, target) * (1 + target / 100) ** holding_period_years
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cap_rate = np.where(required_value > 0, 100 * final_noi / required_value, np.inf)
+    return np.where((final_noi > 0) & (cap_rate > 0), cap_rate, np.nan)
+
+
+CLOSED_FORM_SOLVERS = {
+    'purchase_price_per_unit': _solve_purchase_price,
+    'going_out_cap_rate': _solve_going_out_cap_rate,
+}
+
+
+def _operating_cash_flows(inputs: Dict[str, np.ndarray]) -> np.ndarray:
+    """Computes every scenario's annual operating cash flows, years on the last axis, for calculate_equity_cash_flows."""
+    shape = inputs['holding_period_years'].shape
+    noi = calculate_operating_cash_flow_matrix(*(inputs[name].ravel() for name in OPERATING_INPUTS))
+    return noi.reshape(shape + noi.shape[-1:])
+
+
+def goal_seek(
+    inputs: Dict[str, ArrayLike],
+    input_name: str,
+    target_irr: ArrayLike,
+    bounds: Optional[Tuple[ArrayLike, ArrayLike]] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    max_iterations: int = DEFAULT_MAX_ITERATIONS
+) -> GoalSeekResult:
+    """Finds the value of one input at which every scenario's levered IRR equals its target.
+
+    The search works on the equity NPV at the target rate, which is positive exactly when the
+    IRR beats the target, so no IRR is solved while searching, and unless the input feeds the
+    operating cash flows they are computed once for the whole search. The purchase price and the
+    going-out cap rate are solved in closed form from two evaluations: the highest price, or
+    the highest exit cap rate, that still meets the target. Other inputs are bisected between
+    ``bounds`` for all scenarios at once; scenarios whose NPV has the same sign at both bounds
+    get NaN.
+
+    Args:
+        inputs (Dict[str, ArrayLike]): The inputs of calculate_levered_returns, broadcast together.
+        input_name (str): The input to solve for.
+        target_irr (ArrayLike): The target levered IRR of each scenario as a percentage.
+        bounds (Optional[Tuple[ArrayLike, ArrayLike]]): The low and high values to bisect between,
+            DEFAULT_BOUNDS by default.
+        tolerance (float): The bisection stops once every bracket is narrower than this.
+        max_iterations (int): The maximum number of bisection steps.
+
+    Returns:
+        GoalSeekResult: The solved value and the resulting IRR of every scenario.
+
+    Raises:
+        ValueError: If the input is unknown, or has no closed form, bounds or default bounds.
+    """
+    if input_name not in ACQUISITION_INPUTS:
+        raise ValueError(f'Unknown acquisition input_name: {input_name}')
+    inputs = {name: np.asarray(value, dtype=float) for name, value in inputs.items()}
+    shape = np.broadcast_shapes(*(value.shape for value in inputs.values()), np.shape(target_irr))
+    target = np.broadcast_to(np.asarray(target_irr, dtype=float), shape)
+    inputs = {name: np.broadcast_to(value, shape) for name, value in inputs.items()}
+    if input_name not in OPERATING_INPUTS:
+        inputs['operating_cash_flows'] = _operating_cash_flows(inputs)
+
+    iterations = 0
+    if input_name in CLOSED_FORM_SOLVERS:
+        values = CLOSED_FORM_SOLVERS[input_name](inputs, target)
+    else:
+        if bounds is None and input_name not in DEFAULT_BOUNDS:
+            raise ValueError(f'Pass bounds to solve for {input_name}')
+        low, high = (np.broadcast_to(np.asarray(bound, dtype=float), shape).copy() for bound in (bounds or DEFAULT_BOUNDS[input_name]))
+        low_sign = np.sign(_present_value(_evaluate(inputs, **{input_name: low}), target))
+        high_sign = np.sign(_present_value(_evaluate(inputs, **{input_name: high}), target))
+        bracketed = low_sign * high_sign <= 0
+        # Halving every bracket together; only the solved input_name changes between evaluations
+        while iterations < max_iterations and np.any(bracketed & (high - low > tolerance)):
+            middle = (low + high) / 2
+            middle_sign = np.sign(_present_value(_evaluate(inputs, **{input_name: middle}), target))
+            same_as_low = middle_sign == low_sign
+            low = np.where(same_as_low, middle, low)
+            high = np.where(same_as_low, high, middle)
+            iterations += 1
+        values = np.where(bracketed, (low + high) / 2, np.nan)
+
+    solved = dict(inputs, **{input_name: np.where(np.isnan(values), inputs[input_name], values)})
+    irr = np.where(np.isnan(values), np.nan, calculate_levered_returns(**solved).irr)
+    return GoalSeekResult(input_name, values, irr, iterations)
+
+
+def max_bid_prices(property_acquisitions: Iterable, investment_strategy, **overrides) -> GoalSeekResult:
+    """Finds the highest purchase price per unit of many acquisitions that meets a strategy's target IRR.
+
+    Args:
+        property_acquisitions (Iterable[PropertyAcquisition]): The acquisitions to price.
+        investment_strategy (InvestmentStrategy): Supplies target_irr and the holding period.
+        **overrides: Inputs passed to acquisition_inputs, such as in_place_rent and operating_expenses.
+
+    Returns:
+        GoalSeekResult: The maximum bid price per unit of each acquisition.
+    """
+    overrides.setdefault('holding_period_years', investment_strategy.holding_period_years)
+    rows = [acquisition_inputs(property_acquisition, **overrides) for property_acquisition in property_acquisitions]
+    inputs = {name: np.array([row[name] for row in rows], dtype=float) for name in ACQUISITION_INPUTS}
+    return goal_seek(inputs, 'purchase_price_per_unit', investment_strategy.target_irr)
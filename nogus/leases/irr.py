@@ -0,0 +1,166 @@
+from typing import NamedTuple, Optional
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+# Rates scanned when Newton's method fails or a row may have several roots
+RATE_GRID = np.unique(np.concatenate((np.linspace(-0.99, 1.0, 200), np.geomspace(1.0, 1e4, 40))))
+
+DEFAULT_GUESS = 0.1
+
+
+class IRRResult(NamedTuple):
+    """The outcome of solving the IRR of every cash-flow row.
+
+    Attributes:
+        irr (np.ndarray): The rate per period as a decimal, NaN where no root was found.
+        converged (np.ndarray): Whether a root was found for each row.
+        no_root (np.ndarray): Rows whose cash flows never change sign and so have no IRR.
+        multiple_roots (np.ndarray): Rows where more than one rate sets the NPV to zero.
+        iterations (int): The number of Newton iterations that were run.
+    """
+    irr: np.ndarray
+    converged: np.ndarray
+    no_root: np.ndarray
+    multiple_roots: np.ndarray
+    iterations: int
+
+
+def _net_present_value(cash_flows: np.ndarray, times: np.ndarray, rates: np.ndarray) -> np.ndarray:
+    """Calculates the NPV of each row at its own rate."""
+    discount = np.exp(-times * np.log1p(rates)[:, None])
+    return (cash_flows * discount).sum(axis=1)
+
+
+def _count_sign_changes(values: np.ndarray) -> np.ndarray:
+    """Counts the sign changes along each row, ignoring zeros."""
+    signs = np.sign(values)
+    counts = np.zeros(values.shape[0], dtype=int)
+    previous = np.zeros(values.shape[0])
+    for column in signs.T:
+        counts += (column * previous) < 0
+        previous = np.where(column != 0, column, previous)
+    return counts
+
+
+def _solve(
+    cash_flows: ArrayLike,
+    times: ArrayLike,
+    guess: Optional[ArrayLike],
+    tol: float,
+    max_iterations: int
+) -> IRRResult:
+    """Solves NPV(rate) = 0 for every row with Newton steps and a bisection fallback."""
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    times = np.broadcast_to(np.asarray(times, dtype=float), cash_flows.shape)
+    rows = cash_flows.shape[0]
+
+    # Descartes' rule of signs: no sign change means no root, one means exactly one
+    sign_changes = _count_sign_changes(cash_flows)
+    no_root = sign_changes == 0
+    multiple_roots = np.zeros(rows, dtype=bool)
+
+    # Warm-starting from the caller's guess, e.g. the solution of a neighbouring scenario
+    rates = np.full(rows, DEFAULT_GUESS) if guess is None else np.broadcast_to(np.asarray(guess, dtype=float), (rows,)).copy()
+    rates[~np.isfinite(rates) | (rates <= -1)] = DEFAULT_GUESS
+    converged = np.zeros(rows, dtype=bool)
+    active = ~no_root
+
+    iterations = 0
+    while iterations < max_iterations and active.any():
+        iterations += 1
+        index = np.flatnonzero(active)
+        flows, periods, rate = cash_flows[index], times[index], rates[index]
+
+        # Newton step on every unresolved row at once
+        discount = np.exp(-periods * np.log1p(rate)[:, None])
+        npv = (flows * discount).sum(axis=1)
+        derivative = -(periods * flows * discount).sum(axis=1) / (1 + rate)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = npv / derivative
+        new_rate = rate - step
+
+        # Rows that diverge are handed over to the bisection fallback
+        diverged = ~np.isfinite(new_rate) | (new_rate <= -1)
+        done = ~diverged & (np.abs(step) <= tol * (1 + np.abs(rate)))
+        rates[index[~diverged]] = new_rate[~diverged]
+        converged[index[done]] = True
+        active[index[done | diverged]] = False
+
+    # Scanning a rate grid for unresolved rows and rows that may have several roots
+    scan = np.flatnonzero(~no_root & (~converged | (sign_changes > 1)))
+    if scan.size:
+        grid_npv = np.stack(
+            [_net_present_value(cash_flows[scan], times[scan], np.full(scan.size, rate)) for rate in RATE_GRID],
+            axis=1
+        )
+        crossings = np.signbit(grid_npv[:, :-1]) != np.signbit(grid_npv[:, 1:])
+        multiple_roots[scan] = crossings.sum(axis=1) > 1
+
+        # Bracketing the crossing closest to the Newton estimate and bisecting it
+        fallback = ~converged[scan] & crossings.any(axis=1)
+        if fallback.any():
+            index = scan[fallback]
+            midpoints = (RATE_GRID[:-1] + RATE_GRID[1:]) / 2
+            distance = np.where(crossings[fallback], np.abs(midpoints - rates[index, None]), np.inf)
+            bracket = distance.argmin(axis=1)
+            low, high = RATE_GRID[bracket], RATE_GRID[bracket + 1]
+            low_npv = _net_present_value(cash_flows[index], times[index], low)
+            while np.max(high - low) > tol:
+                middle = (low + high) / 2
+                middle_npv = _net_present_value(cash_flows[index], times[index], middle)
+                same_side = np.signbit(middle_npv) == np.signbit(low_npv)
+                low = np.where(same_side, middle, low)
+                low_npv = np.where(same_side, middle_npv, low_npv)
+                high = np.where(same_side, high, middle)
+            rates[index] = (low + high) / 2
+            converged[index] = True
+
+    irr = np.where(converged, rates, np.nan)
+    return IRRResult(irr, converged, no_root, multiple_roots, iterations)
+
+
+def solve_irr(
+    cash_flows: ArrayLike,
+    guess: Optional[ArrayLike] = None,
+    tol: float = 1e-10,
+    max_iterations: int = 50
+) -> IRRResult:
+    """Solves the internal rate of return of every row of a cash-flow matrix together.
+
+    Args:
+        cash_flows (ArrayLike): A rows x periods matrix of evenly spaced cash flows, or a single row.
+        guess (Optional[ArrayLike]): Starting rates per row, e.g. ``previous_result.irr`` to warm start.
+        tol (float): The relative tolerance on the rate.
+        max_iterations (int): The maximum number of Newton iterations before falling back to bisection.
+
+    Returns:
+        IRRResult: The periodic IRR of each row as a decimal along with convergence diagnostics.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    periods = np.arange(cash_flows.shape[1], dtype=float)
+    return _solve(cash_flows, periods, guess, tol, max_iterations)
+
+
+def solve_xirr(
+    cash_flows: ArrayLike,
+    dates: ArrayLike,
+    guess: Optional[ArrayLike] = None,
+    tol: float = 1e-10,
+    max_iterations: int = 50
+) -> IRRResult:
+    """Solves the annualized IRR of irregularly dated cash flows for every row together.
+
+    Args:
+        cash_flows (ArrayLike): A rows x flows matrix of cash flows, or a single row.
+        dates (ArrayLike): The date of each flow, shared by all rows or given per row.
+        guess (Optional[ArrayLike]): Starting rates per row, e.g. ``previous_result.irr`` to warm start.
+        tol (float): The relative tolerance on the rate.
+        max_iterations (int): The maximum number of Newton iterations before falling back to bisection.
+
+    Returns:
+        IRRResult: The annual IRR of each row as a decimal along with convergence diagnostics.
+    """
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    years = (dates - dates[..., :1]).astype(float) / 365.0
+    return _solve(cash_flows, years, guess, tol, max_iterations)
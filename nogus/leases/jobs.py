@@ -0,0 +1,267 @@
+import asyncio
+import math
+import os
+import weakref
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from itertools import islice
+from typing import Dict, Optional
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import PropertyAcquisition, ValuationJob
+from .simulation import DEFAULT_CHUNK_SIZE, SimulationResult, check_distributions, simulate_chunk, simulation_chunks
+from .underwriting import acquisition_inputs, calculate_levered_returns
+
+# Processes evaluating valuations, shared by every job in this server process
+MAX_WORKERS = getattr(settings, 'VALUATION_WORKERS', None) or os.cpu_count() or 1
+# Jobs of this server process running at once; the rest wait their turn
+MAX_RUNNING_JOBS = getattr(settings, 'VALUATION_MAX_RUNNING_JOBS', MAX_WORKERS)
+# Unfinished jobs across all processes beyond which submissions are refused
+MAX_PENDING_JOBS = getattr(settings, 'VALUATION_MAX_PENDING_JOBS', 100)
+# Seconds between the heartbeats of a process's unfinished jobs, and the heartbeat age past which a job counts as abandoned
+HEARTBEAT_INTERVAL = getattr(settings, 'VALUATION_HEARTBEAT_INTERVAL', 10)
+STALE_JOB_AGE = getattr(settings, 'VALUATION_STALE_JOB_AGE', 6 * HEARTBEAT_INTERVAL)
+DEFAULT_SIMULATION_DRAWS = 100_000
+# Draws a single simulation job may request
+MAX_SIMULATION_DRAWS = getattr(settings, 'VALUATION_MAX_SIMULATION_DRAWS', 10_000_000)
+ABANDONED_ERROR = 'Abandoned: the process running the job stopped'
+
+_executor = None
+_tasks: Dict[int, asyncio.Task] = {}
+_semaphores = weakref.WeakKeyDictionary()
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while MAX_PENDING_JOBS live jobs are unfinished."""
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Returns this process's bounded pool of valuation workers, starting it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS)
+    return _executor
+
+
+def _running_slots() -> asyncio.Semaphore:
+    # Semaphores belong to one event loop, so each loop gets its own
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(MAX_RUNNING_JOBS)
+    return _semaphores[loop]
+
+
+def _json_value(value):
+    """Converts NumPy results to JSON values, with None in place of NaN and infinities."""
+    value = np.asarray(value).tolist()
+    if isinstance(value, list):
+        return [_json_value(item) for item in value]
+    return value if not isinstance(value, float) or math.isfinite(value) else None
+
+
+def _levered_returns(inputs: Dict[str, float]) -> Dict:
+    returns = calculate_levered_returns(**inputs)
+    return {
+        'irr': _json_value(returns.irr),
+        'equity_multiple': _json_value(returns.equity_multiple),
+        'equity_cash_flows': _json_value(returns.equity_cash_flows),
+    }
+
+
+async def _run_levered_returns(job: ValuationJob, inputs: Dict[str, float]) -> Dict:
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), _levered_returns, inputs)
+
+
+async def _run_simulation(job: ValuationJob, inputs: Dict[str, float]) -> Dict:
+    """Evaluates the simulation chunk by chunk, saving progress and honouring cancellation between chunks."""
+    loop = asyncio.get_running_loop()
+    chunks = simulation_chunks(
+        inputs,
+        job.parameters.get('draws', DEFAULT_SIMULATION_DRAWS),
+        job.parameters.get('distributions'),
+        job.parameters.get('seed'),
+        job.parameters.get('chunk_size', DEFAULT_CHUNK_SIZE)
+    )
+    # Keeping at most one chunk per worker in flight so concurrent jobs share the pool
+    queued = iter(chunks)
+    in_flight = deque(loop.run_in_executor(get_executor(), simulate_chunk, *arguments) for arguments in islice(queued, MAX_WORKERS))
+    results = []
+    try:
+        while in_flight:
+            results.append(await in_flight.popleft())
+            for arguments in islice(queued, 1):
+                in_flight.append(loop.run_in_executor(get_executor(), simulate_chunk, *arguments))
+            # Another process may have cancelled the job through its row
+            updated = await ValuationJob.objects.filter(pk=job.pk, status=ValuationJob.RUNNING).aupdate(progress=len(results) / len(chunks))
+            if not updated:
+                raise asyncio.CancelledError
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+    simulation = SimulationResult(
+        np.concatenate([irr for irr, _ in results]) if results else np.empty(0),
+        np.concatenate([equity_multiple for _, equity_multiple in results]) if results else np.empty(0)
+    )
+    return {name: {key: _json_value(value) for key, value in stats.items()} for name, stats in simulation.summary().items()}
+
+
+def _positive_integer(parameters: Dict, name: str, default: int) -> int:
+    value = parameters.get(name, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f'{name} must be a positive integer')
+    return value
+
+
+def _check_simulation_parameters(parameters: Dict):
+    """Checks the simulation settings of a submission, which come from the job API as JSON.
+
+    Raises:
+        ValueError: If draws or chunk_size is not a positive integer, draws exceeds
+            MAX_SIMULATION_DRAWS, the seed is not an integer or a distribution is invalid.
+    """
+    if _positive_integer(parameters, 'draws', DEFAULT_SIMULATION_DRAWS) > MAX_SIMULATION_DRAWS:
+        raise ValueError(f'draws cannot exceed {MAX_SIMULATION_DRAWS}')
+    _positive_integer(parameters, 'chunk_size', DEFAULT_CHUNK_SIZE)
+    seed = parameters.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise ValueError('seed must be a non-negative integer')
+    if parameters.get('distributions') is not None:
+        check_distributions(parameters['distributions'])
+
+
+RUNNERS = {
+    'levered_returns': _run_levered_returns,
+    'simulation': _run_simulation,
+}
+
+
+async def _finish(job_id: int, status: str, **fields):
+    await ValuationJob.objects.filter(pk=job_id).exclude(status__in=ValuationJob.FINISHED_STATUSES).aupdate(
+        status=status, finished_at=timezone.now(), **fields
+    )
+
+
+async def _heartbeat(job_id: int):
+    while True:
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+        await ValuationJob.objects.filter(pk=job_id).exclude(status__in=ValuationJob.FINISHED_STATUSES).aupdate(heartbeat_at=timezone.now())
+
+
+async def reap_stale_jobs() -> int:
+    """Marks as failed the unfinished jobs whose heartbeat is older than STALE_JOB_AGE.
+
+    Such jobs were left behind by a process that was killed or restarted mid-job, and their
+    tasks died with it, so nothing else would ever finish them.
+
+    Returns:
+        int: The number of jobs reaped.
+    """
+    return await ValuationJob.objects.exclude(status__in=ValuationJob.FINISHED_STATUSES).filter(
+        heartbeat_at__lt=timezone.now() - timedelta(seconds=STALE_JOB_AGE)
+    ).aupdate(status=ValuationJob.FAILED, error=ABANDONED_ERROR, finished_at=timezone.now())
+
+
+async def run_job(job_id: int):
+    """Runs a queued job to completion, recording its outcome on its row.
+
+    At most MAX_RUNNING_JOBS jobs run at once per event loop; the CPU-bound work goes to the
+    process pool so the event loop stays free to serve requests. The row's heartbeat is
+    refreshed every HEARTBEAT_INTERVAL seconds while the job waits or runs.
+
+    Args:
+        job_id (int): The primary key of the ValuationJob.
+    """
+    heartbeat = asyncio.create_task(_heartbeat(job_id))
+    try:
+        await _run_job(job_id)
+    finally:
+        heartbeat.cancel()
+
+
+async def _run_job(job_id: int):
+    async with _running_slots():
+        started = await ValuationJob.objects.filter(pk=job_id, status=ValuationJob.QUEUED).aupdate(
+            status=ValuationJob.RUNNING, started_at=timezone.now()
+        )
+        if not started:
+            return
+        job = await ValuationJob.objects.select_related('property_acquisition').aget(pk=job_id)
+        try:
+            inputs = await sync_to_async(acquisition_inputs)(job.property_acquisition, **job.parameters.get('overrides', {}))
+            result = await RUNNERS[job.kind](job, inputs)
+        except asyncio.CancelledError:
+            await _finish(job_id, ValuationJob.CANCELLED)
+            raise
+        except Exception as error:
+            await _finish(job_id, ValuationJob.FAILED, error=f'{type(error).__name__}: {error}')
+        else:
+            await _finish(job_id, ValuationJob.SUCCEEDED, progress=1.0, result=result)
+
+
+async def submit_job(property_acquisition: PropertyAcquisition, kind: str = 'levered_returns', parameters: Optional[Dict] = None) -> ValuationJob:
+    """Queues a valuation and starts it in the background of the running event loop.
+
+    Args:
+        property_acquisition (PropertyAcquisition): The acquisition to value.
+        kind (str): 'levered_returns' or 'simulation'.
+        parameters (Optional[Dict]): 'overrides' for acquisition_inputs, and 'draws', 'seed',
+            'distributions' and 'chunk_size' for simulations.
+
+    Returns:
+        ValuationJob: The queued job.
+
+    Raises:
+        ValueError: If the kind is unknown, a parameter is invalid or the acquisition lacks required inputs.
+        JobQueueFull: If MAX_PENDING_JOBS jobs are unfinished, not counting abandoned ones, which are reaped.
+    """
+    if kind not in RUNNERS:
+        raise ValueError(f'Unknown valuation kind: {kind}')
+    parameters = parameters or {}
+    if not isinstance(parameters, dict) or not isinstance(parameters.get('overrides', {}), dict):
+        raise ValueError('parameters and their overrides must be objects')
+    if kind == 'simulation':
+        _check_simulation_parameters(parameters)
+    # Rejecting incomplete acquisitions up front rather than queueing a failure
+    await sync_to_async(acquisition_inputs)(property_acquisition, **parameters.get('overrides', {}))
+    # Jobs abandoned by a stopped process would otherwise hold their pending slots forever
+    await reap_stale_jobs()
+    if await ValuationJob.objects.exclude(status__in=ValuationJob.FINISHED_STATUSES).acount() >= MAX_PENDING_JOBS:
+        raise JobQueueFull(f'{MAX_PENDING_JOBS} valuation jobs are already pending')
+
+    job = await ValuationJob.objects.acreate(property_acquisition=property_acquisition, kind=kind, parameters=parameters)
+    task = asyncio.create_task(run_job(job.pk))
+    _tasks[job.pk] = task
+    task.add_done_callback(lambda _: _tasks.pop(job.pk, None))
+    return job
+
+
+def job_task(job_id: int) -> Optional[asyncio.Task]:
+    """Returns the task running a job in this process, if any."""
+    return _tasks.get(job_id)
+
+
+async def cancel_job(job_id: int) -> bool:
+    """Cancels an unfinished job.
+
+    The row is marked cancelled so the process running it stops at its next checkpoint;
+    when that is this process, its task is cancelled right away.
+
+    Args:
+        job_id (int): The primary key of the ValuationJob.
+
+    Returns:
+        bool: Whether the job was still unfinished.
+    """
+    cancelled = await ValuationJob.objects.filter(pk=job_id).exclude(status__in=ValuationJob.FINISHED_STATUSES).aupdate(
+        status=ValuationJob.CANCELLED, finished_at=timezone.now()
+    )
+    task = _tasks.get(job_id)
+    if task is not None:
+        task.cancel()
+    return bool(cancelled)
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from leases.export import DEFAULT_FORMATS, FORMATS, export_projections
+from leases.models import RealEstateProperty
+
+
+class Command(BaseCommand):
+    help = 'Exports lease, property and portfolio projections as columnar files partitioned by property and year.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('root', help='The export directory; unchanged partitions of an earlier export are kept.')
+        parser.add_argument('--property', type=int, action='append', dest='properties', help='Only export this property, leaving the portfolio partitions alone; may be repeated.')
+        parser.add_argument('--format', choices=FORMATS, action='append', dest='formats', help='A format to write besides .npy, parquet requiring pyarrow; may be repeated.')
+
+    def handle(self, *args, **options):
+        properties = RealEstateProperty.objects.all()
+        if options['properties']:
+            properties = properties.filter(pk__in=options['properties'])
+
+        started = time.perf_counter()
+        try:
+            stats = export_projections(properties, options['root'], options['formats'] or DEFAULT_FORMATS)
+        except (OSError, ImportError) as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported {stats.partitions} partitions in {time.perf_counter() - started:.1f}s: '
+            f'{stats.written} written, {stats.unchanged} unchanged, {stats.removed} removed'
+        ))
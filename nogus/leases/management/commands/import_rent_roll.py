@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from leases.rent_roll import DEFAULT_CHUNK_SIZE, KEY_COLUMNS, ImportStats, import_rent_roll, read_rent_roll
+
+
+class Command(BaseCommand):
+    help = 'Streams a CSV or Excel rent roll into leases, upserting on an integration key.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='The .csv or .xlsx rent roll to import.')
+        parser.add_argument('--key', choices=KEY_COLUMNS, default='external_id', help='The column used to match existing leases.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='The rows written per transaction.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be at least 1')
+
+        def report(stats: ImportStats):
+            self.stdout.write(f'{stats.rows} rows, {stats.rows_per_second:,.0f} rows/s')
+
+        try:
+            stats = import_rent_roll(read_rent_roll(options['path']), options['key'], options['chunk_size'], report)
+        except (OSError, ImportError, ValueError) as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats.rows} rows in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s): '
+            f'{stats.created} created, {stats.updated} updated, {stats.skipped} skipped'
+        ))
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import time
+from datetime import datetime
+from functools import partial
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from leases.revaluation import DEFAULT_CHUNK_SIZE, RevaluationTimings, revalue_properties, stale_properties, summarize_timings
+
+
+def _start_worker():
+    # Each worker opens its own database connection on first use
+    connections.close_all()
+
+
+class Command(BaseCommand):
+    help = 'Revalues every property whose inputs changed since its last revaluation, in parallel chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='Only revalue properties whose inputs changed at or after this ISO date or datetime.')
+        parser.add_argument('--all', action='store_true', dest='revalue_all', help='Revalue properties that are already up to date too.')
+        parser.add_argument('--as-of', help='The ISO valuation date, today by default.')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes, one database connection each.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Properties revalued and written per task.')
+
+    def _parse_since(self, value):
+        since = parse_datetime(value) or (parse_date(value) and datetime.combine(parse_date(value), datetime.min.time()))
+        if not since:
+            raise CommandError(f'Invalid --since value: {value}')
+        return timezone.make_aware(since) if timezone.is_naive(since) else since
+
+    def _collect(self, results, total: int, started: float):
+        timings = []
+        for chunk in results:
+            timings.append(chunk)
+            done = sum(item.properties for item in timings)
+            self.stdout.write(f'{done}/{total} properties, {done / (time.perf_counter() - started):,.0f} properties/s')
+        return timings
+
+    def handle(self, *args, **options):
+        since = self._parse_since(options['since']) if options['since'] else None
+        as_of = parse_date(options['as_of']) if options['as_of'] else None
+        if options['as_of'] and as_of is None:
+            raise CommandError(f'Invalid --as-of value: {options["as_of"]}')
+        if options['workers'] < 1 or options['chunk_size'] < 1:
+            raise CommandError('--workers and --chunk-size must be at least 1')
+
+        property_ids = list(stale_properties(since, options['revalue_all']).values_list('pk', flat=True))
+        chunk_size = options['chunk_size']
+        chunks = [property_ids[start:start + chunk_size] for start in range(0, len(property_ids), chunk_size)]
+        self.stdout.write(f'Revaluing {len(property_ids)} properties in {len(chunks)} chunks')
+
+        started = time.perf_counter()
+        task = partial(revalue_properties, as_of=as_of)
+        workers = min(options['workers'], len(chunks))
+        if workers <= 1:
+            timings = self._collect(map(task, chunks), len(property_ids), started)
+        else:
+            # Forked workers must not share the parent's connections
+            connections.close_all()
+            with multiprocessing.Pool(workers, initializer=_start_worker) as pool:
+                timings = self._collect(pool.imap_unordered(task, chunks), len(property_ids), started)
+
+        elapsed = time.perf_counter() - started
+        totals = summarize_timings(timings)
+        for stage in RevaluationTimings._fields[1:]:
+            # Stage seconds are summed over workers, so this is the throughput of one worker
+            rate = totals['properties'] / totals[stage] if totals[stage] else 0.0
+            self.stdout.write(f'  {stage:<8} {totals[stage]:8.2f}s  {rate:12,.0f} properties/s per worker')
+        self.stdout.write(self.style.SUCCESS(
+            f'Revalued {totals["properties"]:.0f} properties in {elapsed:.1f}s '
+            f'({totals["properties"] / elapsed if elapsed else 0:,.0f} properties/s)'
+        ))
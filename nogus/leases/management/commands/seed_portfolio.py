@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from leases.synthetic import (
+    DEFAULT_ANALYSIS_YEARS,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_LEASES_PER_PROPERTY,
+    DEFAULT_START_DATE,
+    SeedStats,
+    create_synthetic_portfolio,
+)
+
+
+class Command(BaseCommand):
+    help = 'Bulk creates a seeded synthetic portfolio of properties, leases, lease details and operating expenses for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, required=True, help='The properties to create.')
+        parser.add_argument('--leases-per-property', type=int, default=DEFAULT_LEASES_PER_PROPERTY, help='The leases of each property.')
+        parser.add_argument('--months', type=int, default=DEFAULT_ANALYSIS_YEARS * 12, help='The months of lease details and operating expenses, 0 for none.')
+        parser.add_argument('--seed', type=int, default=0, help='The random seed; the same arguments create the same portfolio.')
+        parser.add_argument('--start-date', default=DEFAULT_START_DATE.isoformat(), help='The ISO analysis start date and first detail month.')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='The leases written per transaction.')
+
+    def handle(self, *args, **options):
+        start_date = parse_date(options['start_date'])
+        if start_date is None:
+            raise CommandError(f'Invalid --start-date value: {options["start_date"]}')
+
+        def report(stats: SeedStats):
+            self.stdout.write(f'{len(stats.property_ids)} properties, {stats.rows} rows, {stats.rows_per_second:,.0f} rows/s')
+
+        try:
+            stats = create_synthetic_portfolio(
+                options['properties'], options['leases_per_property'], options['months'], options['seed'],
+                start_date, options['chunk_size'], report
+            )
+        except ValueError as error:
+            raise CommandError(str(error)) from error
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {stats.rows} rows in {stats.seconds:.1f}s ({stats.rows_per_second:,.0f} rows/s): '
+            f'{len(stats.property_ids)} properties, {stats.leases} leases, '
+            f'{stats.lease_details} lease details, {stats.operating_expenses} operating expenses'
+        ))
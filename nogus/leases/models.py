@@ -5,10 +5,24 @@
 
 
 from datetime import date, timedelta
+import numpy as np
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 from django.contrib import admin
 
+from .cashflows import (
+    DEFAULT_CHUNK_MONTHS,
+    CashFlowSeries,
+    iter_month_grid,
+    month_grid,
+    months_since,
+    to_month,
+)
+from .escalation import escalation_terms
+from .querysets import ProjectionInputQuerySet, ProjectionInputSeriesQuerySet, TimeSeriesQuerySet
+
 
 
 # 1. Property Valuation Model
@@ -63,16 +77,6 @@ class PropertySale(models.Model):
         return f'Going Out Cap Rate: {self.going_out_cap_rate}, Sale Fees: {self.sale_fees}'
 
 
-class PropertyAcquisition(models.Model):
-    purchase_price_per_unit = models.FloatField(validators=[MinValueValidator(0)], default=0)
-    closing_costs = models.FloatField(validators=[MinValueValidator(0)], default=0)
-    acquisition_date = models.DateField()
-    # Additional fields can be added here as needed
-
-    def __str__(self):
-        return f'Purchase Price per Unit: {self.purchase_price_per_unit}, Closing Costs: {self.closing_costs}'
-
-
 class AreaMeasure(models.Model):
     building_total = models.FloatField(validators=[MinValueValidator(0)], default=0)
     office_total = models.FloatField(validators=[MinValueValidator(0)], default=0)
@@ -82,6 +86,8 @@ class AreaMeasure(models.Model):
     alternate_building_total = models.FloatField(validators=[MinValueValidator(0)], default=0)
 
 class MarketLeasingProfile(models.Model):
+    LEASE_LOOKUP = 'market_leasing_profile'
+
     market_rent = models.FloatField(validators=[MinValueValidator(0)], default=0)
     area_to_lease = models.FloatField(validators=[MinValueValidator(0)], default=0)
     average_lease_area = models.FloatField(validators=[MinValueValidator(0)], default=0)
@@ -89,6 +95,8 @@ class MarketLeasingProfile(models.Model):
     unit_rollover_fields = models.FloatField(validators=[MinValueValidator(0)], default=0) # New field
     absorption_assumptions = models.FloatField(validators=[MinValueValidator(0)], default=0) # New field
 
+    objects = ProjectionInputQuerySet.as_manager()
+
     def calculate_market_lease(self, lease):
         return self.market_rent * lease.leased_area
 
@@ -107,15 +115,25 @@ class LocationDetail(models.Model):
         return f'{self.address}, {self.city}, {self.state}, {self.zip_code}, {self.country}'
 
 class BuildingAreaEntry(models.Model):
+    SERIES_KEY = None
+
     date = models.DateField(default=date.today)
     month = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(11)])
     amount = models.FloatField(validators=[MinValueValidator(0)], default=0)
 
+    objects = TimeSeriesQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['date', 'amount'], name='buildingareaentry_date')]
+
 
 class LeaseFinancialDetail(models.Model):
+    LEASE_LOOKUP = 'financial_details'
+
     ANNUAL_RENT_ESCALATION_CHOICES = [
     ('fixed', 'Fixed Percentage'),
     ('cpi', 'Consumer Price Index'),
+    ('step', 'Fixed Step Amount'),
     # Add other choices here
     ]
     AREA_TYPE_CHOICES = [('standard', 'Standard Area'), ('alternate', 'Alternate Area')] # New choices
@@ -127,26 +145,56 @@ class LeaseFinancialDetail(models.Model):
     initial_rent_fixed_amount = models.FloatField(validators=[MinValueValidator(0)], default=0, blank=True, null=True)
     initial_rent_per_sqft = models.FloatField(validators=[MinValueValidator(0)], default=0, blank=True, null=True)
     annual_rent_escalation_method = models.CharField(max_length=50, choices=ANNUAL_RENT_ESCALATION_CHOICES, default='fixed')
+    annual_rent_escalation = models.FloatField(default=0, help_text="Annual escalation, or assumed CPI growth, (%)")
+    rent_step_amount = models.FloatField(default=0, help_text="Amount added to the monthly rent at each lease anniversary")
     CAM_charges = models.FloatField(validators=[MinValueValidator(0)], default=0)
     real_estate_taxes_pass_through = models.BooleanField(default=False)
     utilities_pass_through = models.BooleanField(default=False)
     tenant_improvement_allowances = models.FloatField(validators=[MinValueValidator(0)], default=0)
 
-    def calculate_initial_rent(self):
-        if self.initial_rent_fixed:
-            return self.initial_rent_fixed
-        elif self.leased_area and self.price_per_square_foot:
-            return self.leased_area * self.price_per_square_foot
-        else:
-            return 0
+    objects = ProjectionInputQuerySet.as_manager()
+
+    def calculate_initial_rent(self, leased_area=0):
+        if self.initial_rent_method == 'per_sqft':
+            return (self.initial_rent_per_sqft or 0) * leased_area
+        return self.initial_rent_fixed_amount or 0
 
     def __str__(self):
-        return f'Initial Rent: {self.initial_rent}, CAM Charges: {self.CAM_charges}'
+        if self.initial_rent_method == 'per_sqft':
+            return f'Initial Rent: {self.initial_rent_per_sqft} per sq ft, CAM Charges: {self.CAM_charges}'
+        return f'Initial Rent: {self.initial_rent_fixed_amount}, CAM Charges: {self.CAM_charges}'
 
     class Meta:
         verbose_name_plural = "Lease Financial Details"
 
+class PriceIndex(models.Model):
+    """
+    A published monthly price index, such as CPI-U, that CPI escalations can follow.
+    values_modified_at is touched whenever its values change, so cached copies of the series know to reload.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    description = models.TextField(blank=True, null=True)
+    values_modified_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return self.name
+
+class PriceIndexValue(models.Model):
+    SERIES_KEY = 'index'
+
+    index = models.ForeignKey(PriceIndex, related_name='values', on_delete=models.CASCADE)
+    date = models.DateField()
+    value = models.FloatField(validators=[MinValueValidator(0)])
+
+    objects = TimeSeriesQuerySet.as_manager()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['index', 'date'], name='priceindexvalue_index_date')]
+        indexes = [models.Index(fields=['index', 'date', 'value'], name='priceindexvalue_index_value')]
+
 class LeaseEscalationMethod(models.Model):
+    LEASE_LOOKUP = 'escalation_method'
+
     CPI_CHOICES = [
         ('lease_year', 'Lease Year'),
         ('calendar_year', 'Calendar Year'),
@@ -161,14 +209,14 @@ class LeaseEscalationMethod(models.Model):
     ]
     CPI_method = models.CharField(max_length=50, choices=CPI_CHOICES, default='default')
     review_option = models.CharField(max_length=50, choices=REVIEW_CHOICES, default='default')
+    # CPI escalations follow this index where it has values and the assumed CPI rate beyond them
+    price_index = models.ForeignKey(PriceIndex, related_name='escalation_methods', on_delete=models.SET_NULL, null=True, blank=True)
+
+    objects = ProjectionInputQuerySet.as_manager()
 
     def calculate_escalation(self, lease, month):
-        # Logic to calculate escalation based on the chosen methodology
-        if self.CPI_method == 'lease_year':
-            # Example logic for Lease Year CPI method
-            return lease.initial_rent * (1 + month * 0.01)
-        # Add logic for other methods
-        return lease.initial_rent
+        # Escalated rent from the lease's cached closed-form curve
+        return lease.calculate_monthly_rent(month)
 
 class rental_unit(models.Model):
     """
@@ -201,14 +249,22 @@ class RealEstateProperty(models.Model):
     vacancy_rate = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1)], default=0)
     debt_financing = models.OneToOneField(DebtFinancing, on_delete=models.SET_NULL, null=True, blank=True)
     property_sale = models.OneToOneField(PropertySale, on_delete=models.SET_NULL, null=True, blank=True)
+    purchase_price = models.FloatField(validators=[MinValueValidator(0)], default=0)
+    # Results of the last revaluation, written by leases.revaluation
+    net_operating_income = models.FloatField(null=True, blank=True)
+    annual_debt_service = models.FloatField(null=True, blank=True)
+    levered_irr = models.FloatField(null=True, blank=True)
+    revalued_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    # Touched by leases/signals.py whenever a valuation input changes
+    inputs_modified_at = models.DateTimeField(default=timezone.now, db_index=True)
     
     def calculate_cash_flow_after_debt_service(self):
         return self.calculate_net_operating_income() - self.debt_service - self.capital_costs
 
-    def calculate_net_operating_income(self):
-        gross_income = sum(lease.calculate_monthly_cashflow() for lease in self.leases.all())
-        operating_expenses_with_management = self.operating_expenses + (self.management_fee_percentage / 100) * gross_income
-        return gross_income - operating_expenses_with_management - self.real_estate_taxes - self.utilities
+    def calculate_net_operating_income(self, month=0):
+        # Rolling up all leases in one joined query instead of one query per lease
+        from .rollups import rollup_net_operating_income
+        return float(rollup_net_operating_income([self], month).net_operating_income[0])
 
   
     class Meta:
@@ -218,6 +274,7 @@ class RealEstateProperty(models.Model):
         return self.name
     
 class Lease(models.Model):
+    LEASE_LOOKUP = 'pk'
 
     PROPERTY_TYPE_CHOICES = [
         ('residential', 'Residential'),
@@ -230,14 +287,14 @@ class Lease(models.Model):
     real_estate_property = models.ForeignKey(RealEstateProperty, related_name='leases', on_delete=models.CASCADE)
     tenant_name = models.CharField(max_length=200)
     lease_start_date = models.DateField(default=date.today)
-    lease_end_date = models.DateField(default=date.today() + timedelta(days=365))
+    lease_end_date = models.DateField(default=date.today() + timedelta(days=365), db_index=True)
     leased_area = models.FloatField(validators=[MinValueValidator(0)], default=0)
     renewal_probability = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1)], default=0)
     rent_free_period = models.IntegerField(validators=[MinValueValidator(0)], default=0)
     financial_details = models.OneToOneField(LeaseFinancialDetail, on_delete=models.CASCADE, null=True, blank=True)
-    external_id = models.CharField(max_length=38, blank=True, null=True)
-    entity_id = models.CharField(max_length=38, blank=True, null=True)
-    property_type = models.CharField(max_length=50, choices=PROPERTY_TYPE_CHOICES, default='residential')
+    external_id = models.CharField(max_length=38, blank=True, null=True, db_index=True)
+    entity_id = models.CharField(max_length=38, blank=True, null=True, db_index=True)
+    property_type = models.CharField(max_length=50, choices=PROPERTY_TYPE_CHOICES, default='residential', db_index=True)
     building_area = models.FloatField(validators=[MinValueValidator(0)], default=0)
     analysis_begin_date = models.DateField(default=date.today)
     length_of_analysis_years = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(100)], default=1)
@@ -274,42 +331,90 @@ class Lease(models.Model):
     ]
     renewal_rate_option = models.CharField(max_length=12, choices=RENEWAL_CHOICES, default='market')
 
+    objects = ProjectionInputQuerySet.as_manager()
+
+    def last_lease_month(self):
+        return max(int(months_since(self.lease_start_date, to_month(self.lease_end_date))), 0)
+
+    def market_rent(self):
+        # Without a market leasing profile the space is assumed to re-let at its last contract rent
+        if self.market_leasing_profile is None:
+            return self.calculate_monthly_rent(self.last_lease_month())
+        return self.market_leasing_profile.calculate_market_lease(self)
+
     def handle_expiration(self):
-        # Logic to handle expiration based on selected option
-        if self.expiration_option == 'market':
-            return self.market_leasing_profile.calculate_market_lease(self)
-        # expiration option: reabsorb
-        # Definition: The space is reabsorbed into the property and the rent is set to the market rent
+        # Starting rent of the next generation, the renewal and market outcomes blended per the expiration option
+        from .rollover import renewal_probabilities
+        if self.expiration_option == 'vacate':
+            return 0.0
+        probability = float(renewal_probabilities([self.expiration_option], [self.renewal_probability], 1)[0, 0])
+        return probability * self.calculate_renewal_rate(self.last_lease_month()) + (1 - probability) * self.market_rent()
 
     def calculate_renewal_rate(self, month):
-        # Logic to calculate renewal rate based on selected option
-        if self.renewal_rate_option == 'market':
-            return self.market_leasing_profile.calculate_market_lease(self)
-        # Add logic for other renewal options
-
-    def calculate_monthly_cashflow(self, month): #todo
-        rent = self.escalation_method.calculate_escalation(self, month)
-        # Subtract expenses and other calculations
-        return rent - self.expenses
-
-    def calculate_monthly_rent(self, month): #todo
-        rent = self.financial_details.initial_rent
-        escalation_factor = 1 + (self.financial_details.annual_rent_escalation / 100)
-        for _ in range(month):
-            rent *= escalation_factor
-        return rent
-
-
-    def generate_cashflow_time_series(self, start_date, end_date):
-        cashflows = []
-        current_date = start_date
-        month = 0
-        while current_date <= end_date:
-            cashflow = self.calculate_monthly_cashflow(month)
-            cashflows.append((current_date, cashflow))
-            current_date += timedelta(days=30)
-            month += 1
-        return cashflows
+        # Renewal rent under the renewal option, with the rent of lease month ``month`` as the prior rent
+        from .rollover import renewal_rents
+        return float(renewal_rents(self.renewal_rate_option, self.calculate_monthly_rent(month), self.market_rent()))
+
+    @property
+    def initial_rent(self):
+        if self.financial_details is None:
+            return 0
+        return self.financial_details.calculate_initial_rent(self.leased_area)
+
+    def calculate_monthly_cashflow(self, month=0):
+        # Expenses are deducted at the property level, see RealEstateProperty.calculate_net_operating_income
+        return self.calculate_monthly_rent(month)
+
+    def calculate_monthly_cashflows(self, months):
+        # Cash flows for an array of lease months in one array operation
+        return self.calculate_monthly_rents(months)
+
+    def escalation_terms(self):
+        financial_details = self.financial_details
+        escalation_method = self.escalation_method
+        return escalation_terms(
+            financial_details.annual_rent_escalation_method if financial_details else None,
+            financial_details.annual_rent_escalation if financial_details else 0,
+            financial_details.rent_step_amount if financial_details else 0,
+            escalation_method.CPI_method if escalation_method else None,
+            escalation_method.review_option if escalation_method else None,
+            self.lease_start_date,
+            self.lease_end_date
+        )
+
+    def calculate_monthly_rent(self, month):
+        return float(self.calculate_monthly_rents(month))
+
+    def calculate_monthly_rents(self, months):
+        # Closed-form escalated rents, shared with other leases on the same terms, or the stored CPI index
+        from .cpi import indexed_rents
+        months = np.asarray(months)
+        price_index_id = self.escalation_method.price_index_id if self.escalation_method else None
+        return indexed_rents(self.initial_rent, self.escalation_terms(), months[None, ...], self.lease_start_date, price_index_id)[0]
+
+
+    def analysis_end_date(self):
+        months = self.length_of_analysis_years * 12 + self.length_of_analysis_months
+        return (to_month(self.analysis_begin_date) + max(months - 1, 0)).astype(date)
+
+    def _cashflow_series(self, months):
+        # Lease months are counted from the lease start, and the lease pays nothing outside its term
+        lease_months = months_since(self.lease_start_date, months)
+        in_term = (lease_months >= 0) & (months <= to_month(self.lease_end_date))
+        return CashFlowSeries(months, np.where(in_term, self.calculate_monthly_cashflows(lease_months), 0.0))
+
+    def generate_cashflow_time_series(self, start_date=None, end_date=None):
+        # Calendar-month grid over the analysis period unless explicit dates are given
+        start_date = start_date or self.analysis_begin_date
+        end_date = end_date or self.analysis_end_date()
+        return self._cashflow_series(month_grid(start_date, end_date))
+
+    def iter_cashflow_time_series(self, start_date=None, end_date=None, chunk_months=DEFAULT_CHUNK_MONTHS):
+        # Streams the series in bounded chunks so long horizons never sit in memory at once
+        start_date = start_date or self.analysis_begin_date
+        end_date = end_date or self.analysis_end_date()
+        for months in iter_month_grid(start_date, end_date, chunk_months):
+            yield self._cashflow_series(months)
 
     def calculate_total_value(self):
         return self.property_valuation.appraisal_value + self.property_improvement.cost
@@ -328,6 +433,8 @@ class Lease(models.Model):
         return self.tenant_name
 
 class LeaseDetail(models.Model):
+    SERIES_KEY = 'lease'
+
     lease = models.ForeignKey(Lease, related_name='details', on_delete=models.CASCADE)
     date = models.DateField(default=date.today)
     rent = models.FloatField(validators=[MinValueValidator(0)], default=0)
@@ -335,23 +442,71 @@ class LeaseDetail(models.Model):
     estimated_future_vacancy_rates = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(1)], default=0)
     time_to_lease_up_vacant_space = models.IntegerField(validators=[MinValueValidator(0)], default=0)
 
+    objects = TimeSeriesQuerySet.as_manager()
+
     class Meta:
         verbose_name_plural = "Lease Details"
+        indexes = [models.Index(fields=['lease', 'date', 'rent'], name='leasedetail_lease_date')]
 
     def __str__(self):
         return f'{self.lease.tenant_name} - {self.date}'
 class OperatingExpense(models.Model):
-    real_estate_property = models.ForeignKey(RealEstateProperty, related_name='operating_expenses', on_delete=models.CASCADE)
+    SERIES_KEY = 'real_estate_property'
+    LEASE_LOOKUP = None
+
+    real_estate_property = models.ForeignKey(RealEstateProperty, related_name='operating_expense_entries', on_delete=models.CASCADE)
     expense_type = models.CharField(max_length=200)
     amount = models.FloatField(validators=[MinValueValidator(0)], default=0)
     date = models.DateField()
+    account = models.ForeignKey('Account', related_name='operating_expenses', on_delete=models.SET_NULL, null=True, blank=True)
+
+    objects = ProjectionInputSeriesQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['real_estate_property', 'date', 'amount'], name='operatingexpense_property_date'),
+            models.Index(fields=['account', 'date', 'amount'], name='operatingexpense_account_date'),
+        ]
 
 class ExpenseRecovery(models.Model):
+    SERIES_KEY = 'lease'
+
     lease = models.ForeignKey(Lease, related_name='expense_recoveries', on_delete=models.CASCADE)
     recovery_type = models.CharField(max_length=200)
     amount = models.FloatField(validators=[MinValueValidator(0)], default=0)
     date = models.DateField()
 
+    objects = TimeSeriesQuerySet.as_manager()
+
+    class Meta:
+        indexes = [models.Index(fields=['lease', 'date', 'amount'], name='expenserecovery_lease_date')]
+
+
+class CashFlowProjection(models.Model):
+    """
+    Materialized monthly cash-flow series of one lease or one property.
+    Rows are deleted by the signal handlers in leases/signals.py whenever an input is saved, and by
+    ProjectionInputQuerySet on bulk writes. The fingerprint is a digest of the stored series, served as its ETag;
+    inputs_digest is a digest of the input columns it was computed from, compared on read to catch writes that skipped both.
+    """
+    lease = models.OneToOneField(Lease, related_name='projection', on_delete=models.CASCADE, null=True, blank=True)
+    real_estate_property = models.OneToOneField(RealEstateProperty, related_name='projection', on_delete=models.CASCADE, null=True, blank=True)
+    start_month = models.DateField()
+    fingerprint = models.CharField(max_length=64)
+    inputs_digest = models.CharField(max_length=64, blank=True, default='')
+    values = models.BinaryField()
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def as_series(self):
+        values = np.frombuffer(bytes(self.values), dtype='<f8')
+        return CashFlowSeries(to_month(self.start_month) + np.arange(values.size), values)
+
+    class Meta:
+        verbose_name_plural = "Cash Flow Projections"
+
+    def __str__(self):
+        return f'Projection of {self.lease or self.real_estate_property} from {self.start_month}'
+
 
 class ChartOfAccounts(models.Model):
     name = models.CharField(max_length=200)
@@ -365,8 +520,8 @@ class ChartOfAccounts(models.Model):
 class Account(models.Model):
     ACCOUNT_TYPE_CHOICES = [('parent', 'Parent Account'), ('child', 'Child Account')]
     CLASS_CHOICES = [('revenue', 'Revenue'), ('expense', 'Expense')]
-    LINE_ITEM_TYPE_CHOICES = [...]  # Define as per your requirements
-    COST_CODE_TYPE_CHOICES = [...]  # Define as per your requirements
+    LINE_ITEM_TYPE_CHOICES = [('header', 'Header'), ('detail', 'Detail'), ('total', 'Total')]
+    COST_CODE_TYPE_CHOICES = [('operating', 'Operating'), ('capital', 'Capital'), ('non_operating', 'Non-Operating')]
 
     chart = models.ForeignKey(ChartOfAccounts, related_name='accounts', on_delete=models.CASCADE)
     account_type = models.CharField(max_length=50, choices=ACCOUNT_TYPE_CHOICES)
@@ -378,53 +533,121 @@ class Account(models.Model):
     cost_code_type = models.CharField(max_length=50, choices=COST_CODE_TYPE_CHOICES)
     is_active = models.BooleanField(default=True)
 
+    def clean(self):
+        from .accounts import creates_cycle
+        if creates_cycle(self):
+            raise ValidationError({'parent_account': 'An account cannot be moved under one of its own descendants.'})
+
     def __str__(self):
         return self.description
 
+class AccountClosure(models.Model):
+    """
+    Every ancestor-descendant pair of the account tree, including each account paired with itself.
+    Maintained by the signal handlers in leases/signals.py and rebuilt by manage.py rebuild_account_closure.
+    """
+    ancestor = models.ForeignKey(Account, related_name='descendant_links', on_delete=models.CASCADE)
+    descendant = models.ForeignKey(Account, related_name='ancestor_links', on_delete=models.CASCADE)
+    depth = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['ancestor', 'descendant'], name='accountclosure_ancestor_descendant')]
+        indexes = [models.Index(fields=['descendant', 'ancestor'], name='accountclosure_descendant')]
+
+    def __str__(self):
+        return f'{self.ancestor_id} -> {self.descendant_id} ({self.depth})'
+
 class InvestmentStrategy(models.Model):
-    target_irr = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Target levered IRR (%)")
+    target_irr = models.FloatField(validators=[MinValueValidator(0)], help_text="Target levered IRR (%)")
     acquisition_method = models.CharField(max_length=50, choices=[('equity', 'All Equity')], default='equity', help_text="Method of acquisition")
-    holding_period_years = models.IntegerField(validators=[models.MinValueValidator(0), models.MaxValueValidator(30)], default=7, help_text="Holding period in years")
+    holding_period_years = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(30)], default=7, help_text="Holding period in years")
 
     def __str__(self):
         return f"Target IRR: {self.target_irr}%, Acquisition Method: {self.acquisition_method}, Holding Period: {self.holding_period_years} years"
 
 class PropertyAcquisition(models.Model):
     property_name = models.CharField(max_length=200, help_text="Name of the property")
-    units = models.IntegerField(validators=[models.MinValueValidator(0)], help_text="Number of units in the property")
-    gross_square_feet = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Total gross square feet of the property")
-    net_rentable_square_feet = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Net rentable square feet of the property")
-    occupancy_rate = models.FloatField(validators=[models.MinValueValidator(0), models.MaxValueValidator(100)], help_text="Current occupancy rate (%)")
-    purchase_price_per_unit = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Purchase price per unit")
+    units = models.IntegerField(validators=[MinValueValidator(0)], help_text="Number of units in the property")
+    gross_square_feet = models.FloatField(validators=[MinValueValidator(0)], help_text="Total gross square feet of the property")
+    net_rentable_square_feet = models.FloatField(validators=[MinValueValidator(0)], help_text="Net rentable square feet of the property")
+    occupancy_rate = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(100)], help_text="Current occupancy rate (%)")
+    purchase_price_per_unit = models.FloatField(validators=[MinValueValidator(0)], help_text="Purchase price per unit")
 
     def __str__(self):
         return f"{self.property_name} - {self.units} units, {self.net_rentable_square_feet} net rentable sq ft"
 
 class LeasingStrategy(models.Model):
     property_acquisition = models.OneToOneField(PropertyAcquisition, on_delete=models.CASCADE, related_name='leasing_strategy', help_text="Associated property acquisition")
-    lease_up_rate_per_month = models.IntegerField(validators=[models.MinValueValidator(0)], help_text="Number of units to be leased per month")
-    stabilization_vacancy_rate = models.FloatField(validators=[models.MinValueValidator(0), models.MaxValueValidator(100)], default=5, help_text="Vacancy rate upon stabilization (%)")
+    lease_up_rate_per_month = models.IntegerField(validators=[MinValueValidator(0)], help_text="Number of units to be leased per month")
+    stabilization_vacancy_rate = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(100)], default=5, help_text="Vacancy rate upon stabilization (%)")
 
     def __str__(self):
         return f"Lease-up Rate: {self.lease_up_rate_per_month} units/month, Stabilization Vacancy: {self.stabilization_vacancy_rate}%"
 
 class RefinancingDetails(models.Model):
     property_acquisition = models.OneToOneField(PropertyAcquisition, on_delete=models.CASCADE, related_name='refinancing_details', help_text="Associated property acquisition")
-    interest_rate = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Annual interest rate (%)")
-    amortization_period_years = models.IntegerField(validators=[models.MinValueValidator(0), models.MaxValueValidator(30)], help_text="Amortization period in years")
-    term_years = models.IntegerField(validators=[models.MinValueValidator(0), models.MaxValueValidator(30)], help_text="Term in years")
-    prepayment_penalty_period_years = models.IntegerField(validators=[models.MinValueValidator(0), models.MaxValueValidator(30)], default=4, help_text="Prepayment penalty period in years")
-    max_loan_to_value_ratio = models.FloatField(validators=[models.MinValueValidator(0), models.MaxValueValidator(100)], help_text="Max loan to value ratio (%)")
-    min_debt_service_coverage_ratio = models.FloatField(validators=[models.MinValueValidator(1)], help_text="Minimum debt service coverage ratio")
-    closing_fees_percentage = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Closing fees as a percentage of loan amount (%)")
+    interest_rate = models.FloatField(validators=[MinValueValidator(0)], help_text="Annual interest rate (%)")
+    amortization_period_years = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(30)], help_text="Amortization period in years")
+    term_years = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(30)], help_text="Term in years")
+    prepayment_penalty_period_years = models.IntegerField(validators=[MinValueValidator(0), MaxValueValidator(30)], default=4, help_text="Prepayment penalty period in years")
+    max_loan_to_value_ratio = models.FloatField(validators=[MinValueValidator(0), MaxValueValidator(100)], help_text="Max loan to value ratio (%)")
+    min_debt_service_coverage_ratio = models.FloatField(validators=[MinValueValidator(1)], help_text="Minimum debt service coverage ratio")
+    closing_fees_percentage = models.FloatField(validators=[MinValueValidator(0)], help_text="Closing fees as a percentage of loan amount (%)")
 
     def __str__(self):
         return f"Interest Rate: {self.interest_rate}%, Term: {self.term_years} years, Max LTV: {self.max_loan_to_value_ratio}%"
 
 class SaleDetails(models.Model):
     property_acquisition = models.OneToOneField(PropertyAcquisition, on_delete=models.CASCADE, related_name='sale_details', help_text="Associated property acquisition")
-    going_out_cap_rate = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Going out cap rate (%)")
-    fees = models.FloatField(validators=[models.MinValueValidator(0)], help_text="Fees associated with the sale")
+    going_out_cap_rate = models.FloatField(validators=[MinValueValidator(0)], help_text="Going out cap rate (%)")
+    fees = models.FloatField(validators=[MinValueValidator(0)], help_text="Fees associated with the sale")
 
     def __str__(self):
         return f"Going Out Cap Rate: {self.going_out_cap_rate}%, Fees: ${self.fees}"
+
+class ValuationJob(models.Model):
+    """
+    A valuation of a PropertyAcquisition run in the background by leases.jobs.
+    The row is the job's only state, so any process can report on or cancel it; an unfinished
+    job whose heartbeat stops was left behind by a process that exited and is reaped as failed.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    FINISHED_STATUSES = (SUCCEEDED, FAILED, CANCELLED)
+    KIND_CHOICES = [('levered_returns', 'Levered Returns'), ('simulation', 'Monte Carlo Simulation')]
+
+    property_acquisition = models.ForeignKey('PropertyAcquisition', on_delete=models.CASCADE, related_name='valuation_jobs', help_text="Property acquisition being valued")
+    kind = models.CharField(max_length=50, choices=KIND_CHOICES, default='levered_returns', help_text="Valuation to run")
+    parameters = models.JSONField(default=dict, blank=True, help_text="Input overrides and simulation settings")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True, help_text="Current state of the job")
+    progress = models.FloatField(default=0, help_text="Completed share of the work, from 0 to 1")
+    result = models.JSONField(null=True, blank=True, help_text="Valuation results once the job succeeds")
+    error = models.TextField(blank=True, default='', help_text="Failure message")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(default=timezone.now, help_text="Last time the process holding the unfinished job reported it alive")
+
+    def as_dict(self):
+        return {
+            'id': self.pk,
+            'property_acquisition': self.property_acquisition_id,
+            'kind': self.kind,
+            'status': self.status,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+        }
+
+    def __str__(self):
+        return f"{self.get_kind_display()} of acquisition {self.property_acquisition_id}: {self.status}"
@@ -0,0 +1,285 @@
+import hashlib
+import threading
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.db.models import Q, QuerySet
+from django.utils import timezone
+
+from .cashflows import CashFlowSeries, initial_rents, month_grid, months_since, to_month
+from .cpi import indexed_rents
+from .escalation import EscalationTerms, escalation_terms
+from .models import CashFlowProjection, Lease, OperatingExpense, PriceIndex, RealEstateProperty
+
+# Related rows whose fields feed a lease's cash flows
+LEASE_INPUT_RELATIONS = ('financial_details', 'escalation_method', 'market_leasing_profile')
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _record(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def projection_cache_stats() -> Dict[str, float]:
+    """Returns this process's projection cache hit and miss counters and the hit rate."""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    lookups = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': hits / lookups if lookups else 0.0}
+
+
+def reset_projection_cache_stats():
+    """Resets this process's projection cache counters."""
+    with _stats_lock:
+        _stats['hits'] = _stats['misses'] = 0
+
+
+def lease_escalation_terms(leases: List[Lease]) -> EscalationTerms:
+    """Builds the escalation terms of many loaded leases from their related rows."""
+    financial_details = [lease.financial_details for lease in leases]
+    escalation_methods = [lease.escalation_method for lease in leases]
+    return escalation_terms(
+        [detail.annual_rent_escalation_method if detail else None for detail in financial_details],
+        [detail.annual_rent_escalation if detail else 0 for detail in financial_details],
+        [detail.rent_step_amount if detail else 0 for detail in financial_details],
+        [method.CPI_method if method else None for method in escalation_methods],
+        [method.review_option if method else None for method in escalation_methods],
+        np.array([lease.lease_start_date for lease in leases], dtype='datetime64[D]'),
+        np.array([lease.lease_end_date for lease in leases], dtype='datetime64[D]')
+    )
+
+
+def lease_initial_rents(leases: List[Lease]) -> np.ndarray:
+    """Calculates the initial monthly rent of many loaded leases."""
+    financial_details = [lease.financial_details for lease in leases]
+    return initial_rents(
+        np.array([lease.leased_area for lease in leases], dtype=float),
+        np.array([detail.initial_rent_method if detail else None for detail in financial_details], dtype=object),
+        np.nan_to_num(np.array([detail.initial_rent_fixed_amount if detail else 0 for detail in financial_details], dtype=float)),
+        np.nan_to_num(np.array([detail.initial_rent_per_sqft if detail else 0 for detail in financial_details], dtype=float))
+    )
+
+
+def lease_cashflow_matrix(leases: List[Lease], months: np.ndarray) -> np.ndarray:
+    """Calculates the cash flows of many loaded leases on a shared month grid in one pass.
+
+    Args:
+        leases (List[Lease]): Leases with their related rows already loaded.
+        months (np.ndarray): The ``datetime64[M]`` month grid.
+
+    Returns:
+        np.ndarray: A leases x months matrix, zero outside each lease's term.
+    """
+    if not leases:
+        return np.zeros((0, months.size))
+    lease_start_dates = np.array([lease.lease_start_date for lease in leases], dtype='datetime64[D]')
+    lease_end_dates = np.array([lease.lease_end_date for lease in leases], dtype='datetime64[D]')
+    lease_months = months_since(lease_start_dates[:, None], months[None, :])
+    cashflows = indexed_rents(
+        lease_initial_rents(leases),
+        lease_escalation_terms(leases),
+        lease_months,
+        lease_start_dates,
+        [lease.escalation_method.price_index_id if lease.escalation_method else None for lease in leases]
+    )
+    in_term = (lease_months >= 0) & (months[None, :] <= lease_end_dates.astype('datetime64[M]')[:, None])
+    return np.where(in_term, cashflows, 0.0)
+
+
+def _field_values(instance) -> Optional[tuple]:
+    if instance is None:
+        return None
+    return tuple(getattr(instance, field.attname) for field in instance._meta.concrete_fields)
+
+
+def inputs_digest(leases: List[Lease], expenses: Iterable[Tuple] = ()) -> str:
+    """Digests the input columns a projection is computed from.
+
+    Covers each lease's own row, its related input rows and the version of the price index it
+    follows, then the (amount, date) of each operating expense.
+
+    Args:
+        leases (List[Lease]): Leases loaded from the database with their related rows.
+        expenses (Iterable[Tuple]): A property's operating expenses, empty for a lease.
+
+    Returns:
+        str: A sha256 hex digest.
+    """
+    index_ids = {lease.escalation_method.price_index_id for lease in leases if lease.escalation_method}
+    index_ids.discard(None)
+    versions = dict(PriceIndex.objects.filter(pk__in=index_ids).values_list('pk', 'values_modified_at')) if index_ids else {}
+    digest = hashlib.sha256()
+    for lease in leases:
+        rows = [_field_values(lease)] + [_field_values(getattr(lease, relation)) for relation in LEASE_INPUT_RELATIONS]
+        rows.append(versions.get(lease.escalation_method.price_index_id) if lease.escalation_method else None)
+        digest.update(repr(rows).encode())
+    digest.update(repr(list(expenses)).encode())
+    return digest.hexdigest()
+
+
+def _store(projection_filter: Dict, series: CashFlowSeries, input_digest: str) -> CashFlowProjection:
+    start_month = (series.months[0] if series.months.size else to_month(date.today())).astype(date)
+    values = np.asarray(series.cashflows, dtype='<f8').tobytes()
+    # A digest of the stored series, so an unchanged recomputation keeps its ETag
+    fingerprint = hashlib.sha256(start_month.isoformat().encode() + values).hexdigest()
+    projection, _ = CashFlowProjection.objects.update_or_create(
+        **projection_filter,
+        defaults={'start_month': start_month, 'fingerprint': fingerprint, 'inputs_digest': input_digest, 'values': values}
+    )
+    return projection
+
+
+def _cached(projection_filter: Dict, input_digest: str) -> Optional[CashFlowProjection]:
+    """Returns the stored projection if it was computed from the current inputs, counting the lookup."""
+    projection = CashFlowProjection.objects.filter(**projection_filter).first()
+    if projection is not None and projection.inputs_digest == input_digest:
+        _record('hits')
+        return projection
+    _record('misses')
+    return None
+
+
+def get_lease_projection(lease: Lease) -> CashFlowProjection:
+    """Returns the stored projection of a lease, computing and storing it on a miss.
+
+    The lease's inputs are reloaded and compared with the digest stored alongside the
+    projection, so one left stale by a write that skipped invalidation is recomputed.
+
+    Args:
+        lease (Lease): The lease to project over its analysis period.
+
+    Returns:
+        CashFlowProjection: The projection row; ``as_series()`` gives the monthly cash flows.
+    """
+    lease = Lease.objects.select_related(*LEASE_INPUT_RELATIONS).get(pk=lease.pk)
+    input_digest = inputs_digest([lease])
+    projection = _cached({'lease_id': lease.pk}, input_digest)
+    if projection is not None:
+        return projection
+    return _store({'lease_id': lease.pk}, lease.generate_cashflow_time_series(), input_digest)
+
+
+def _property_inputs(real_estate_property: RealEstateProperty) -> Tuple[List[Lease], List[Tuple]]:
+    leases = list(real_estate_property.leases.select_related(*LEASE_INPUT_RELATIONS).order_by('pk'))
+    expenses = list(
+        OperatingExpense.objects.filter(real_estate_property_id=real_estate_property.pk).order_by('pk').values_list('amount', 'date')
+    )
+    return leases, expenses
+
+
+def _property_series(leases: List[Lease], expenses: List[Tuple]) -> CashFlowSeries:
+    dates = [lease.analysis_begin_date for lease in leases] + [lease.analysis_end_date() for lease in leases]
+    dates += [expense_date for _, expense_date in expenses]
+    months = month_grid(min(dates), max(dates)) if dates else np.empty(0, dtype='datetime64[M]')
+
+    cashflows = lease_cashflow_matrix(leases, months).sum(axis=0)
+    if expenses:
+        amounts, expense_dates = zip(*expenses)
+        positions = months_since(months[0], np.array(expense_dates, dtype='datetime64[D]'))
+        cashflows -= np.bincount(positions, weights=np.array(amounts, dtype=float), minlength=months.size)
+    return CashFlowSeries(months, cashflows)
+
+
+def compute_property_projection(real_estate_property: RealEstateProperty) -> CashFlowSeries:
+    """Computes a property's monthly cash flows: lease income less dated operating expenses.
+
+    The series spans the union of its leases' analysis periods and its expense dates.
+
+    Args:
+        real_estate_property (RealEstateProperty): The property to project.
+
+    Returns:
+        CashFlowSeries: The monthly series.
+    """
+    return _property_series(*_property_inputs(real_estate_property))
+
+
+def get_property_projection(real_estate_property: RealEstateProperty) -> CashFlowProjection:
+    """Returns the stored projection of a property, computing and storing it on a miss.
+
+    A hit costs the projection lookup plus one query each for the property's leases and its
+    operating expenses, whose digest must match the one stored with the projection.
+
+    Args:
+        real_estate_property (RealEstateProperty): The property to project.
+
+    Returns:
+        CashFlowProjection: The projection row; ``as_series()`` gives the monthly cash flows.
+    """
+    leases, expenses = _property_inputs(real_estate_property)
+    input_digest = inputs_digest(leases, expenses)
+    projection = _cached({'real_estate_property_id': real_estate_property.pk}, input_digest)
+    if projection is not None:
+        return projection
+    return _store({'real_estate_property_id': real_estate_property.pk}, _property_series(leases, expenses), input_digest)
+
+
+def compute_property_projections(property_ids: List[int]):
+    """Computes and stores the projections of the given properties."""
+    for real_estate_property in RealEstateProperty.objects.filter(pk__in=property_ids):
+        get_property_projection(real_estate_property)
+
+
+def compute_lease_projections(lease_ids: List[int]):
+    """Computes and stores the projections of the given leases."""
+    # get_lease_projection loads each lease's inputs itself
+    for lease in Lease.objects.filter(pk__in=lease_ids).only('pk'):
+        get_lease_projection(lease)
+
+
+def projection_matrix(key: str, owners: QuerySet, ids: List[int], compute: Callable[[List[int]], None]) -> Tuple[np.ndarray, np.ndarray]:
+    """Loads the stored projections of many leases or properties into one rows x months matrix.
+
+    ``owners`` selects the primary keys of the rows, whose sorted values are ``ids``. Projections
+    that are not stored yet are computed by ``compute`` first. The matrix spans the union of all
+    projection periods, with zeros outside each row's own period.
+    """
+    projections = CashFlowProjection.objects.filter(**{f'{key}__in': owners}).values_list(key, 'start_month', 'values')
+    rows = list(projections)
+    missing = set(ids) - {row[0] for row in rows}
+    if missing:
+        compute(sorted(missing))
+        rows = list(projections.all())
+    if not rows:
+        return np.empty(0, dtype='datetime64[M]'), np.zeros((len(ids), 0))
+
+    row_ids, start_months, blobs = zip(*rows)
+    values = [np.frombuffer(bytes(blob), dtype='<f8') for blob in blobs]
+    lengths = np.array([series.size for series in values])
+    start_months = np.array(start_months, dtype='datetime64[M]')
+    # Empty projections have no period, so they do not stretch the grid
+    spanned = lengths > 0
+    if not spanned.any():
+        return np.empty(0, dtype='datetime64[M]'), np.zeros((len(ids), 0))
+    first_month = start_months[spanned].min()
+    offsets = months_since(first_month, start_months)
+    months = np.arange(first_month, first_month + int((offsets + lengths)[spanned].max()), dtype='datetime64[M]')
+
+    # Scattering every series into its row and columns in one assignment
+    positions = np.searchsorted(ids, row_ids)
+    matrix = np.zeros((len(ids), months.size))
+    columns = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(offsets, lengths)
+    matrix[np.repeat(positions, lengths), columns] = np.concatenate(values)
+    return months, matrix
+
+
+def invalidate_projections(lease_ids: Iterable[int] = (), property_ids: Iterable[int] = ()):
+    """Deletes the stored projections of the given leases and properties and marks the properties for revaluation."""
+    lease_ids = [pk for pk in lease_ids if pk is not None]
+    property_ids = [pk for pk in property_ids if pk is not None]
+    if lease_ids or property_ids:
+        CashFlowProjection.objects.filter(Q(lease_id__in=lease_ids) | Q(real_estate_property_id__in=property_ids)).delete()
+    if property_ids:
+        RealEstateProperty.objects.filter(pk__in=property_ids).update(inputs_modified_at=timezone.now())
+
+
+def invalidate_lease_projections(leases):
+    """Deletes the projections of every lease in a queryset and of the properties they belong to."""
+    rows = list(leases.values_list('pk', 'real_estate_property_id'))
+    if rows:
+        lease_ids, property_ids = zip(*rows)
+        invalidate_projections(lease_ids, set(property_ids))
@@ -0,0 +1,119 @@
+from datetime import date
+from typing import Iterable, Optional, Set, Tuple
+
+import numpy as np
+from django.db import models, transaction
+
+# NumPy dtypes of the field types fetched into arrays
+FIELD_DTYPES = {
+    'AutoField': 'i8',
+    'BigAutoField': 'i8',
+    'ForeignKey': 'i8',
+    'IntegerField': 'i8',
+    'FloatField': 'f8',
+    'DecimalField': 'f8',
+    'BooleanField': '?',
+    'DateField': 'datetime64[D]',
+}
+
+
+class TimeSeriesQuerySet(models.QuerySet):
+    """
+    Queries over dated rows, such as lease details or operating expenses.
+    Models using it set SERIES_KEY to the foreign key that owns each series, or None,
+    and index (SERIES_KEY, date, value) so window fetches are covered range scans in key and date order.
+    """
+
+    def between(self, start_date: Optional[date] = None, end_date: Optional[date] = None, keys: Optional[Iterable[int]] = None):
+        """Filters the rows dated from ``start_date`` to ``end_date`` inclusive, optionally for some series only.
+
+        Args:
+            start_date (Optional[date]): The first date, or None for no lower bound.
+            end_date (Optional[date]): The last date, or None for no upper bound.
+            keys (Optional[Iterable[int]]): The primary keys of the series owners, e.g. lease ids.
+
+        Returns:
+            TimeSeriesQuerySet: The rows ordered by series and date.
+        """
+        series_key = self.model.SERIES_KEY
+        queryset = self
+        if keys is not None:
+            queryset = queryset.filter(**{f'{series_key}__in': list(keys)})
+        if start_date is not None:
+            queryset = queryset.filter(date__gte=start_date)
+        if end_date is not None:
+            queryset = queryset.filter(date__lte=end_date)
+        return queryset.order_by(*([series_key] if series_key else []), 'date')
+
+    def as_arrays(self, *fields: str) -> np.ndarray:
+        """Fetches the given columns with a single ``values_list`` query into a NumPy record array.
+
+        The series key and the date are always included, so ``fields`` lists the value columns.
+
+        Args:
+            *fields (str): The value columns to fetch, e.g. 'rent'.
+
+        Returns:
+            np.ndarray: A structured array with one record per row and one field per column.
+        """
+        series_key = self.model.SERIES_KEY
+        names = ([f'{series_key}_id'] if series_key else []) + ['date'] + list(fields)
+        dtype = [(name, FIELD_DTYPES.get(self.model._meta.get_field(name).get_internal_type(), 'O')) for name in names]
+        return np.array(list(self.values_list(*names)), dtype=dtype)
+
+
+class ProjectionInputQuerySet(models.QuerySet):
+    """
+    Queries over rows that feed stored cash-flow projections, such as leases and their terms.
+    update(), bulk_update() and bulk_create() send no signals, so they invalidate the projections
+    of the rows they write themselves, as the handlers in leases/signals.py do for saves.
+    Models using it set LEASE_LOOKUP to the path from Lease to the model, or None for rows that
+    belong to a property through a real_estate_property foreign key.
+    """
+
+    def _projection_owners(self) -> Tuple[Set[int], Set[int]]:
+        """Fetches the ids of the leases and properties whose projections the selected rows feed."""
+        from .models import Lease
+
+        lookup = self.model.LEASE_LOOKUP
+        if lookup is None:
+            return set(), set(self.values_list('real_estate_property_id', flat=True))
+        rows = list(Lease.objects.filter(**{f'{lookup}__in': self.values('pk')}).values_list('pk', 'real_estate_property_id'))
+        return {pk for pk, _ in rows}, {property_id for _, property_id in rows}
+
+    def update(self, **kwargs):
+        from .projections import invalidate_projections
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            # Owners are fetched first, since updated rows may no longer match the filter
+            lease_ids, property_ids = self._projection_owners()
+            rows = super().update(**kwargs)
+            # Rows moved to another property change its projection as well
+            target = kwargs.get('real_estate_property', kwargs.get('real_estate_property_id'))
+            if isinstance(target, (int, models.Model)):
+                property_ids.add(getattr(target, 'pk', target))
+            invalidate_projections(lease_ids, property_ids)
+        return rows
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        from .projections import invalidate_projections
+
+        objs = list(objs)
+        with transaction.atomic(using=self.db, savepoint=False):
+            lease_ids, property_ids = self.filter(pk__in=[obj.pk for obj in objs])._projection_owners()
+            rows = super().bulk_update(objs, fields, batch_size=batch_size)
+            property_ids.update(obj.real_estate_property_id for obj in objs if hasattr(obj, 'real_estate_property_id'))
+            invalidate_projections(lease_ids, property_ids)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .projections import invalidate_projections
+
+        objs = super().bulk_create(objs, *args, **kwargs)
+        # New rows only change the projections of the properties they join; other inputs are not referenced yet
+        invalidate_projections(property_ids={getattr(obj, 'real_estate_property_id', None) for obj in objs})
+        return objs
+
+
+class ProjectionInputSeriesQuerySet(ProjectionInputQuerySet, TimeSeriesQuerySet):
+    """Queries over dated rows that feed stored projections, such as operating expenses."""
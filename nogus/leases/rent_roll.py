@@ -0,0 +1,293 @@
+import csv
+import time
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from django.db import transaction
+
+from .models import Lease, LeaseDetail, LeaseFinancialDetail, RealEstateProperty
+
+# Rent-roll columns written to each model, named after the model fields
+LEASE_COLUMNS = (
+    'tenant_name',
+    'lease_start_date',
+    'lease_end_date',
+    'leased_area',
+    'renewal_probability',
+    'rent_free_period',
+    'external_id',
+    'entity_id',
+    'property_type',
+    'building_area',
+    'analysis_begin_date',
+    'length_of_analysis_years',
+    'length_of_analysis_months',
+    'expiration_option',
+    'renewal_rate_option',
+)
+FINANCIAL_DETAIL_COLUMNS = (
+    'initial_rent_method',
+    'initial_rent_fixed_amount',
+    'initial_rent_per_sqft',
+    'annual_rent_escalation_method',
+    'annual_rent_escalation',
+    'rent_step_amount',
+    'CAM_charges',
+)
+# Optional per-row LeaseDetail columns, keyed by rent-roll column name
+DETAIL_COLUMNS = {
+    'detail_date': 'date',
+    'rent': 'rent',
+    'historical_vacancy_rates': 'historical_vacancy_rates',
+    'estimated_future_vacancy_rates': 'estimated_future_vacancy_rates',
+}
+PROPERTY_COLUMN = 'property_id'
+KEY_COLUMNS = ('external_id', 'entity_id')
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+class ImportStats(NamedTuple):
+    """Counters of a rent-roll import.
+
+    Attributes:
+        rows (int): The rows read from the file.
+        created (int): The leases created.
+        updated (int): The existing leases updated.
+        skipped (int): The rows without a key, or without a property for a new lease.
+        seconds (float): The wall-clock duration.
+    """
+    rows: int
+    created: int
+    updated: int
+    skipped: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def read_rent_roll(path) -> Iterator[Dict[str, object]]:
+    """Streams the rows of a CSV or Excel rent roll as dictionaries keyed by the header row.
+
+    Args:
+        path: The path of a ``.csv`` or ``.xlsx`` file.
+
+    Yields:
+        Dict[str, object]: One row at a time.
+    """
+    path = Path(path)
+    if path.suffix.lower() in ('.xlsx', '.xlsm'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError as error:
+            raise ImportError('Reading Excel rent rolls requires openpyxl') from error
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(name).strip() for name in next(rows, ())]
+            for values in rows:
+                yield dict(zip(header, values))
+        finally:
+            workbook.close()
+    else:
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            yield from csv.DictReader(handle)
+
+
+def _field_values(
+    model,
+    row: Dict[str, object],
+    columns: Iterable[str],
+    renames: Optional[Dict[str, str]] = None,
+    skip_empty: bool = False
+) -> Dict[str, object]:
+    """Converts the row's values for the given columns with the model fields' own parsers.
+
+    Empty cells become None or the field default, or are left out with ``skip_empty`` so an
+    update keeps the stored value.
+    """
+    values = {}
+    for column in columns:
+        if column not in row:
+            continue
+        name = renames[column] if renames else column
+        value = row[column]
+        if value == '' or value is None:
+            if skip_empty:
+                continue
+            field = model._meta.get_field(name)
+            value = None if field.null else field.get_default()
+        else:
+            value = model._meta.get_field(name).to_python(value)
+        values[name] = value
+    return values
+
+
+def _property_ids(records: Dict[str, Dict[str, object]], row_numbers: Dict[str, int]) -> Dict[str, int]:
+    """Parses the property ids of a chunk and checks they exist with one query.
+
+    Raises:
+        ValueError: If a property id is not an integer or no such property exists, naming the row.
+    """
+    property_ids = {}
+    for lease_key, row in records.items():
+        if not row.get(PROPERTY_COLUMN):
+            continue
+        try:
+            property_ids[lease_key] = int(row[PROPERTY_COLUMN])
+        except (TypeError, ValueError):
+            raise ValueError(f'Row {row_numbers[lease_key]}: {PROPERTY_COLUMN} {row[PROPERTY_COLUMN]!r} is not an integer') from None
+    known = set(RealEstateProperty.objects.filter(pk__in=set(property_ids.values())).values_list('pk', flat=True))
+    for lease_key, property_id in property_ids.items():
+        if property_id not in known:
+            raise ValueError(f'Row {row_numbers[lease_key]}: no property with {PROPERTY_COLUMN} {property_id}')
+    return property_ids
+
+
+def _import_chunk(rows: List[Dict[str, object]], key: str, first_row: int = 2) -> Dict[str, int]:
+    """Upserts one chunk of rows, the first numbered ``first_row`` in the file, inside the caller's transaction."""
+    records = {}
+    row_numbers = {}
+    skipped = 0
+    for number, row in enumerate(rows, first_row):
+        if row.get(key):
+            records[str(row[key])] = row
+            row_numbers[str(row[key])] = number
+        else:
+            skipped += 1
+
+    header = set().union(*(row.keys() for row in records.values())) if records else set()
+    lease_fields = [column for column in LEASE_COLUMNS if column in header]
+    financial_fields = [column for column in FINANCIAL_DETAIL_COLUMNS if column in header]
+    detail_fields = [DETAIL_COLUMNS[column] for column in DETAIL_COLUMNS if column in header and column != 'detail_date']
+    has_property = PROPERTY_COLUMN in header
+    property_ids = _property_ids(records, row_numbers)
+
+    # One query for every existing lease in the chunk, with the stored values that empty cells keep
+    existing, stored_leases = {}, {}
+    for values in Lease.objects.filter(**{f'{key}__in': list(records)}).values(
+        *dict.fromkeys([key, 'pk', 'financial_details_id', 'real_estate_property_id', *lease_fields])
+    ):
+        lease_key = str(values[key])
+        existing[lease_key] = (values['pk'], values['financial_details_id'], values['real_estate_property_id'])
+        stored_leases[lease_key] = {field: values[field] for field in lease_fields}
+
+    # Financial details for new leases and for existing leases that have none yet
+    new_keys = [lease_key for lease_key in records if lease_key not in existing and lease_key in property_ids]
+    skipped += sum(1 for lease_key in records if lease_key not in existing and lease_key not in property_ids)
+    missing_details = [lease_key for lease_key in existing if existing[lease_key][1] is None]
+    created_details = LeaseFinancialDetail.objects.bulk_create([
+        LeaseFinancialDetail(**_field_values(LeaseFinancialDetail, records[lease_key], financial_fields))
+        for lease_key in new_keys + missing_details
+    ])
+    detail_by_key = dict(zip(new_keys + missing_details, created_details))
+
+    # New leases wired to their financial details in memory
+    created_leases = Lease.objects.bulk_create([
+        Lease(
+            real_estate_property_id=property_ids[lease_key],
+            financial_details=detail_by_key[lease_key],
+            **_field_values(Lease, records[lease_key], lease_fields)
+        )
+        for lease_key in new_keys
+    ])
+
+    # Existing leases and their financial details updated in bulk
+    updated_keys = [lease_key for lease_key in records if lease_key in existing]
+    lease_updates = []
+    for lease_key in updated_keys:
+        pk, financial_details_id, property_id = existing[lease_key]
+        values = dict(stored_leases[lease_key], **_field_values(Lease, records[lease_key], lease_fields, skip_empty=True))
+        values['real_estate_property_id'] = property_ids.get(lease_key, property_id)
+        values['financial_details_id'] = financial_details_id or detail_by_key[lease_key].pk
+        lease_updates.append(Lease(pk=pk, **values))
+    update_fields = lease_fields + ['financial_details'] + (['real_estate_property'] if has_property else [])
+    if lease_updates:
+        Lease.objects.bulk_update(lease_updates, update_fields, batch_size=1000)
+    if financial_fields:
+        detail_ids = {lease_key: existing[lease_key][1] for lease_key in updated_keys if existing[lease_key][1] is not None}
+        stored_details = {
+            values.pop('pk'): values for values in LeaseFinancialDetail.objects.filter(pk__in=detail_ids.values()).values('pk', *financial_fields)
+        }
+        detail_updates = []
+        for lease_key, pk in detail_ids.items():
+            values = dict(stored_details[pk], **_field_values(LeaseFinancialDetail, records[lease_key], financial_fields, skip_empty=True))
+            detail_updates.append(LeaseFinancialDetail(pk=pk, **values))
+        LeaseFinancialDetail.objects.bulk_update(detail_updates, financial_fields, batch_size=1000)
+
+    # Dated LeaseDetail rows, upserted on (lease, date)
+    lease_ids = {lease_key: lease.pk for lease_key, lease in zip(new_keys, created_leases)}
+    lease_ids.update((lease_key, existing[lease_key][0]) for lease_key in updated_keys)
+    if 'detail_date' in header:
+        # Empty cells are left out, so new rows take the field defaults and existing rows keep their values
+        details = {}
+        for lease_key, lease_id in lease_ids.items():
+            values = _field_values(LeaseDetail, records[lease_key], DETAIL_COLUMNS, DETAIL_COLUMNS, skip_empty=True)
+            if values.get('date'):
+                details[(lease_id, values['date'])] = values
+        existing_details = {
+            (values.pop('lease_id'), values.pop('date')): values
+            for values in LeaseDetail.objects.filter(
+                lease_id__in=[lease_id for lease_id, _ in details], date__in={detail_date for _, detail_date in details}
+            ).values('lease_id', 'date', 'pk', *detail_fields)
+        }
+        LeaseDetail.objects.bulk_create([
+            LeaseDetail(lease_id=lease_id, **values) for (lease_id, detail_date), values in details.items()
+            if (lease_id, detail_date) not in existing_details
+        ])
+        if detail_fields:
+            LeaseDetail.objects.bulk_update([
+                LeaseDetail(**dict(existing_details[detail_key], **details[detail_key])) for detail_key in details if detail_key in existing_details
+            ], detail_fields, batch_size=1000)
+
+    return {'created': len(created_leases), 'updated': len(updated_keys), 'skipped': skipped}
+
+
+def import_rent_roll(
+    rows: Iterable[Dict[str, object]],
+    key: str = 'external_id',
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[ImportStats], None]] = None
+) -> ImportStats:
+    """Upserts a stream of rent-roll rows into Lease, LeaseFinancialDetail and LeaseDetail.
+
+    Rows are consumed ``chunk_size`` at a time and each chunk is written with bulk inserts
+    and updates in its own transaction, so memory use does not grow with the file.
+    Leases are matched on ``key``; only the columns present in the rows are written, and empty
+    cells leave an existing lease's stored values alone.
+
+    Args:
+        rows (Iterable[Dict[str, object]]): Rows keyed by model field name, see read_rent_roll.
+        key (str): The integration key column, 'external_id' or 'entity_id'.
+        chunk_size (int): The number of rows written per transaction.
+        progress (Optional[Callable[[ImportStats], None]]): Called with the running totals after each chunk.
+
+    Returns:
+        ImportStats: The final counters.
+
+    Raises:
+        ValueError: If the key is unknown, or a row names a property that does not exist. Earlier
+            chunks stay imported.
+    """
+    if key not in KEY_COLUMNS:
+        raise ValueError(f'The key must be one of: {", ".join(KEY_COLUMNS)}')
+
+    started = time.perf_counter()
+    totals = {'rows': 0, 'created': 0, 'updated': 0, 'skipped': 0}
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        with transaction.atomic():
+            # Row numbers count the header row, as spreadsheets do
+            counts = _import_chunk(chunk, key, totals['rows'] + 2)
+        totals['rows'] += len(chunk)
+        for name, count in counts.items():
+            totals[name] += count
+        if progress is not None:
+            progress(ImportStats(seconds=time.perf_counter() - started, **totals))
+    return ImportStats(seconds=time.perf_counter() - started, **totals)
@@ -0,0 +1,195 @@
+import time
+from datetime import date, datetime
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .cashflows import months_since, to_month
+from .financial_calculations import calculate_monthly_debt_payment
+from .models import DebtFinancing, Lease, OperatingExpense, PropertySale, RealEstateProperty
+from .projections import LEASE_INPUT_RELATIONS, lease_cashflow_matrix
+from .underwriting import calculate_levered_returns
+
+DEFAULT_HOLDING_PERIOD_YEARS = 7
+DEFAULT_CHUNK_SIZE = 500
+
+# Property and related-row columns fetched for each chunk, in one joined query
+PROPERTY_FIELDS = (
+    'pk',
+    'purchase_price',
+    'operating_expenses',
+    'management_fee_percentage',
+    'real_estate_taxes',
+    'utilities',
+    'debt_financing__max_loan_to_value',
+    'debt_financing__interest_rate',
+    'debt_financing__amortization_period_years',
+    'debt_financing__closing_fees_percentage',
+    'debt_financing__prepayment_penalty_period_years',
+    'property_sale__going_out_cap_rate',
+    'property_sale__sale_fees',
+    'property_sale__sale_date',
+)
+RESULT_FIELDS = ('net_operating_income', 'annual_debt_service', 'levered_irr', 'revalued_at')
+# RealEstateProperty fields read by the revaluation; saving any of them marks the property stale
+VALUATION_INPUT_FIELDS = (
+    'purchase_price',
+    'operating_expenses',
+    'management_fee_percentage',
+    'real_estate_taxes',
+    'utilities',
+    'debt_financing',
+    'property_sale',
+)
+
+
+class RevaluationTimings(NamedTuple):
+    """Seconds spent in each stage of revaluing one chunk of properties.
+
+    Attributes:
+        properties (int): The number of properties revalued.
+        load (float): Fetching the properties, leases and expenses.
+        compute (float): Evaluating cash flows, debt and IRRs.
+        write (float): Writing the results back.
+    """
+    properties: int
+    load: float
+    compute: float
+    write: float
+
+
+def stale_properties(since: Optional[datetime] = None, revalue_all: bool = False):
+    """Selects the properties whose valuation inputs changed after their last revaluation.
+
+    Because every chunk records ``revalued_at`` as it finishes, an interrupted run resumes
+    where it stopped when this selection is taken again.
+
+    Args:
+        since (Optional[datetime]): Only properties whose inputs changed at or after this time.
+        revalue_all (bool): Whether to include properties that are already up to date.
+
+    Returns:
+        QuerySet: The properties ordered by primary key.
+    """
+    properties = RealEstateProperty.objects.order_by('pk')
+    if not revalue_all:
+        properties = properties.filter(Q(revalued_at__isnull=True) | Q(revalued_at__lt=F('inputs_modified_at')))
+    if since is not None:
+        properties = properties.filter(inputs_modified_at__gte=since)
+    return properties
+
+
+def _column(values, default: float = 0.0) -> np.ndarray:
+    """Converts a fetched column to floats, replacing NULL with ``default``."""
+    return np.array([default if value is None else value for value in values], dtype=float)
+
+
+def revalue_properties(property_ids: List[int], as_of: Optional[date] = None) -> RevaluationTimings:
+    """Revalues a chunk of properties and writes their NOI, debt service and levered IRR back in bulk.
+
+    Monthly lease income comes from the batched lease cash-flow engine, less management
+    fees, the property's monthly expenses and its dated operating expenses. The property
+    is bought at ``purchase_price`` on ``as_of``, financed per its DebtFinancing and sold
+    at its PropertySale date, or after DEFAULT_HOLDING_PERIOD_YEARS, at the going-out cap rate.
+
+    Args:
+        property_ids (List[int]): The properties to revalue.
+        as_of (Optional[date]): The valuation date, today by default.
+
+    Returns:
+        RevaluationTimings: The time spent in each stage.
+    """
+    as_of = as_of or date.today()
+    # Stamping the results with the time before the inputs are read, so concurrent edits stay stale
+    revalued_at = timezone.now()
+
+    started = time.perf_counter()
+    rows = list(RealEstateProperty.objects.filter(pk__in=property_ids).order_by('pk').values_list(*PROPERTY_FIELDS))
+    if not rows:
+        return RevaluationTimings(0, time.perf_counter() - started, 0.0, 0.0)
+    (ids, purchase_price, operating_expenses, management_fee_percentage, real_estate_taxes, utilities,
+     loan_to_value, interest_rate, amortization_period_years, closing_fees_percentage,
+     prepayment_penalty_period_years, going_out_cap_rate, sale_fees, sale_date) = zip(*rows)
+    ids = np.array(ids)
+
+    # Holding each property until its sale date, in whole years
+    first_month = to_month(as_of)
+    sale_months = np.array(
+        [months_since(first_month, value) if value else DEFAULT_HOLDING_PERIOD_YEARS * 12 for value in sale_date]
+    )
+    holding_period_years = np.maximum(-(-sale_months // 12), 1)
+    months = first_month + np.arange(holding_period_years.max() * 12)
+
+    leases = list(Lease.objects.filter(real_estate_property_id__in=ids.tolist()).select_related(*LEASE_INPUT_RELATIONS))
+    last_day = ((months[-1] + 1).astype('datetime64[D]') - 1).astype(date)
+    expenses = OperatingExpense.objects.between(as_of.replace(day=1), last_day, ids.tolist()).as_arrays('amount')
+    loaded = time.perf_counter()
+
+    # Monthly gross income of every property from one leases x months matrix
+    gross_income = np.zeros((ids.size, months.size))
+    if leases:
+        positions = np.searchsorted(ids, [lease.real_estate_property_id for lease in leases])
+        np.add.at(gross_income, positions, lease_cashflow_matrix(leases, months))
+
+    monthly_noi = gross_income * (1 - _column(management_fee_percentage)[:, None] / 100)
+    monthly_noi -= (_column(operating_expenses) + _column(real_estate_taxes) + _column(utilities))[:, None]
+    if expenses.size:
+        np.add.at(
+            monthly_noi,
+            (np.searchsorted(ids, expenses['real_estate_property_id']), months_since(first_month, expenses['date'])),
+            -expenses['amount']
+        )
+
+    held = np.arange(1, holding_period_years.max() + 1) <= holding_period_years[:, None]
+    annual_noi = np.where(held, monthly_noi.reshape(ids.size, -1, 12).sum(axis=2), 0.0)
+
+    # The levered model of underwriting on this NOI: bought at the purchase price with no other
+    # closing costs, financed on it, and sold with the loan repaid, penalty included
+    price = _column(purchase_price)
+    loan_to_value = _column(loan_to_value)
+    interest_rate = _column(interest_rate)
+    amortization_period_years = _column(amortization_period_years, DebtFinancing._meta.get_field('amortization_period_years').default)
+    returns = calculate_levered_returns(
+        purchase_price_per_unit=price,
+        units=1,
+        closing_costs=0,
+        in_place_rent=0,
+        gross_square_feet=0,
+        occupancy_rate=0,
+        operating_expenses=0,
+        rent_growth_rate=0,
+        vacancy_rate=0,
+        holding_period_years=holding_period_years,
+        loan_to_value_ratio=loan_to_value,
+        interest_rate=interest_rate,
+        amortization_period_years=amortization_period_years,
+        loan_closing_fees_percentage=_column(closing_fees_percentage),
+        # Properties without a sale row use PropertySale's default terms
+        going_out_cap_rate=_column(going_out_cap_rate, PropertySale._meta.get_field('going_out_cap_rate').default),
+        sale_fees=_column(sale_fees, PropertySale._meta.get_field('sale_fees').default),
+        prepayment_penalty_period_years=_column(prepayment_penalty_period_years),
+        operating_cash_flows=annual_noi
+    )
+    levered_irr = np.where(price > 0, returns.irr, np.nan)
+    loan_amount = price * loan_to_value / 100
+    annual_debt_service = np.where(loan_amount > 0, 12 * calculate_monthly_debt_payment(loan_amount, interest_rate, amortization_period_years), 0.0)
+    computed = time.perf_counter()
+
+    RealEstateProperty.objects.bulk_update([
+        RealEstateProperty(
+            pk=pk,
+            net_operating_income=float(noi),
+            annual_debt_service=float(debt_service),
+            levered_irr=float(irr) if np.isfinite(irr) else None,
+            revalued_at=revalued_at
+        )
+        for pk, noi, debt_service, irr in zip(ids.tolist(), annual_noi[:, 0], annual_debt_service, levered_irr)
+    ], RESULT_FIELDS)
+    return RevaluationTimings(ids.size, loaded - started, computed - loaded, time.perf_counter() - computed)
+
+
+def summarize_timings(timings: List[RevaluationTimings]) -> Dict[str, float]:
+    """Totals the per-stage seconds of many chunks."""
+    return {stage: sum(getattr(chunk, stage) for chunk in timings) for stage in RevaluationTimings._fields}
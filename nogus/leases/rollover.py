@@ -0,0 +1,167 @@
+from typing import List, NamedTuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from .escalation import escalated_rents
+from .models import Lease
+from .projections import lease_cashflow_matrix, lease_escalation_terms, lease_initial_rents
+
+# Months a space stays empty between a departing tenant and a new one
+DEFAULT_DOWNTIME_MONTHS = 3
+
+
+class RolloverResult(NamedTuple):
+    """Expected monthly rents and occupancy of many leases, including their future generations.
+
+    Attributes:
+        months (np.ndarray): The calendar months as ``datetime64[M]``.
+        cashflows (np.ndarray): A leases x months matrix of probability-weighted rents.
+        occupancy (np.ndarray): A leases x months matrix of the expected occupied share of each space, 0 to 1.
+    """
+    months: np.ndarray
+    cashflows: np.ndarray
+    occupancy: np.ndarray
+
+
+def renewal_rents(renewal_rate_option: ArrayLike, prior_rent: ArrayLike, market_rent: ArrayLike) -> np.ndarray:
+    """Calculates the starting rent of renewing tenants under each Lease.RENEWAL_CHOICES option.
+
+    Args:
+        renewal_rate_option (ArrayLike): 'market', 'prior', 'lesser_of' or 'greater_of' per lease.
+        prior_rent (ArrayLike): The last monthly rent of the expiring lease.
+        market_rent (ArrayLike): The monthly market rent of the space.
+
+    Returns:
+        np.ndarray: The renewal rent of each lease.
+    """
+    option = np.asarray(renewal_rate_option, dtype=object)
+    prior_rent = np.asarray(prior_rent, dtype=float)
+    market_rent = np.asarray(market_rent, dtype=float)
+    return np.select(
+        [option == 'prior', option == 'lesser_of', option == 'greater_of'],
+        [prior_rent, np.minimum(prior_rent, market_rent), np.maximum(prior_rent, market_rent)],
+        market_rent
+    )
+
+
+def renewal_probabilities(expiration_option: ArrayLike, renewal_probability: ArrayLike, generations: int) -> np.ndarray:
+    """Gives the chance that the sitting tenant renews at each future expiration.
+
+    'market' blends by ``renewal_probability`` at every expiration, 'renew' always renews,
+    'option' renews for one option term and then rolls like 'market', and 'reabsorb' and
+    'vacate' never renew.
+
+    Args:
+        expiration_option (ArrayLike): The Lease.EXPIRATION_CHOICES option of each lease.
+        renewal_probability (ArrayLike): The renewal probability of each lease, 0 to 1.
+        generations (int): The number of future lease generations.
+
+    Returns:
+        np.ndarray: A leases x generations matrix of renewal probabilities.
+    """
+    option = np.asarray(expiration_option, dtype=object)[:, None]
+    probability = np.broadcast_to(np.asarray(renewal_probability, dtype=float)[:, None], (option.shape[0], generations))
+    first = np.arange(generations) == 0
+    return np.select(
+        [option == 'renew', (option == 'option') & first, np.isin(option, ('reabsorb', 'vacate'))],
+        [1.0, 1.0, 0.0],
+        probability
+    )
+
+
+def rollover_matrix(
+    leases: List[Lease],
+    months: np.ndarray,
+    downtime_months: ArrayLike = DEFAULT_DOWNTIME_MONTHS,
+    market_rent_growth: float = 0.0
+) -> RolloverResult:
+    """Projects many leases past their expiration through every future lease generation at once.
+
+    Each generation lasts as long as the original lease. At each expiration the sitting tenant
+    renews with the probability given by ``renewal_probabilities`` at its ``renewal_rents`` rate
+    and keeps paying; otherwise a new tenant signs at market rent after ``downtime_months``
+    and ``rent_free_period`` free months. Both outcomes are blended by their probabilities,
+    and 'vacate' spaces stay empty. Rents escalate within every generation on the lease's own
+    escalation terms. Market rent comes from the lease's MarketLeasingProfile, or is the last
+    contract rent without one, and grows by ``market_rent_growth`` percent a year from the
+    first expiration.
+
+    Generations are walked in a loop that is vectorized across leases, so rolling thousands
+    of leases over a hold costs a handful of array operations per generation.
+
+    Args:
+        leases (List[Lease]): Leases with their related rows already loaded.
+        months (np.ndarray): The ``datetime64[M]`` month grid.
+        downtime_months (ArrayLike): The vacant months before a new tenant, per lease or for all.
+        market_rent_growth (float): The annual market rent growth as a percentage.
+
+    Returns:
+        RolloverResult: The expected rents and occupancy of each lease in each month.
+    """
+    if not leases:
+        return RolloverResult(months, np.zeros((0, months.size)), np.zeros((0, months.size)))
+    terms = lease_escalation_terms(leases)
+    initial_rent = lease_initial_rents(leases)
+    term_months = np.maximum(terms.term_months.astype(int), 1)
+    downtime = np.broadcast_to(np.asarray(downtime_months, dtype=int), term_months.shape)
+    free_months = np.array([lease.rent_free_period for lease in leases])
+    rows = np.arange(len(leases))[:, None]
+
+    # Escalation in closed form, rent = start_rent * multiplier[month] + increment[month], per lease
+    curve_months = np.broadcast_to(np.arange(term_months.max()), (len(leases), term_months.max()))
+    increment = escalated_rents(np.zeros(len(leases)), terms, curve_months)
+    multiplier = escalated_rents(np.ones(len(leases)), terms, curve_months) - increment
+    last_contract_rent = initial_rent * multiplier[rows[:, 0], term_months - 1] + increment[rows[:, 0], term_months - 1]
+
+    # Locating every month after expiration in its generation
+    start_months = np.array([lease.lease_start_date for lease in leases], dtype='datetime64[M]')
+    end_months = np.array([lease.lease_end_date for lease in leases], dtype='datetime64[M]')
+    after_expiration = (months[None, :] - (end_months + 1)[:, None]).astype(int)
+    rolled = after_expiration >= 0
+    generation = np.where(rolled, after_expiration // term_months[:, None], 0)
+    generation_month = np.where(rolled, after_expiration % term_months[:, None], 0)
+    generations = int(generation.max(initial=0)) + 1
+
+    probability = renewal_probabilities(
+        [lease.expiration_option for lease in leases], [lease.renewal_probability for lease in leases], generations
+    )
+    profiles = [lease.market_leasing_profile for lease in leases]
+    base_market_rent = np.array([
+        profile.calculate_market_lease(lease) if profile else rent
+        for profile, lease, rent in zip(profiles, leases, last_contract_rent.tolist())
+    ])
+    renewal_rate_option = np.array([lease.renewal_rate_option for lease in leases], dtype=object)
+    relet = np.array([lease.expiration_option != 'vacate' for lease in leases])
+
+    # Chaining generations: each renewal starts from the blended rent the previous one ended on
+    renewal_start = np.zeros((len(leases), generations))
+    market_start = np.zeros((len(leases), generations))
+    prior_rent = last_contract_rent
+    new_tenant_last_month = np.clip(term_months - 1 - downtime, 0, None)
+    for index in range(generations):
+        market_rent = base_market_rent * (1 + market_rent_growth / 100) ** ((index * term_months) // 12)
+        renewal_start[:, index] = renewal_rents(renewal_rate_option, prior_rent, market_rent)
+        market_start[:, index] = market_rent
+        renewal_end = renewal_start[:, index] * multiplier[rows[:, 0], term_months - 1] + increment[rows[:, 0], term_months - 1]
+        market_end = market_rent * multiplier[rows[:, 0], new_tenant_last_month] + increment[rows[:, 0], new_tenant_last_month]
+        prior_rent = probability[:, index] * renewal_end + (1 - probability[:, index]) * market_end
+
+    # Blending the renewing and the new tenant in every rolled month in one pass
+    renew = probability[rows, generation]
+    renewing_rent = renewal_start[rows, generation] * multiplier[rows, generation_month] + increment[rows, generation_month]
+    new_tenant_month = generation_month - downtime[:, None]
+    new_lease_month = np.clip(new_tenant_month, 0, None)
+    new_tenant_rent = np.where(
+        new_tenant_month >= free_months[:, None],
+        market_start[rows, generation] * multiplier[rows, new_lease_month] + increment[rows, new_lease_month],
+        0.0
+    )
+    new_tenant_occupied = (new_tenant_month >= 0) & relet[:, None]
+    expected_rent = renew * renewing_rent + (1 - renew) * np.where(new_tenant_occupied, new_tenant_rent, 0.0)
+    expected_occupancy = renew + (1 - renew) * new_tenant_occupied
+
+    in_term = (months[None, :] >= start_months[:, None]) & ~rolled
+    cashflows = np.where(rolled, expected_rent, lease_cashflow_matrix(leases, months))
+    occupancy = np.where(rolled, expected_occupancy, in_term.astype(float))
+    return RolloverResult(months, cashflows, occupancy)
@@ -0,0 +1,121 @@
+from typing import Dict, Iterable, NamedTuple, Union
+
+import numpy as np
+from django.db.models import QuerySet
+
+from .cashflows import initial_rents
+from .cpi import indexed_rents
+from .escalation import escalation_terms
+from .models import Lease, RealEstateProperty
+
+# Property columns needed to turn gross lease income into NOI
+PROPERTY_FIELDS = ('pk', 'operating_expenses', 'management_fee_percentage', 'real_estate_taxes', 'utilities')
+
+# Lease and related-row columns fetched in the single joined lease query
+LEASE_FIELDS = (
+    'real_estate_property_id',
+    'leased_area',
+    'financial_details__initial_rent_method',
+    'financial_details__initial_rent_fixed_amount',
+    'financial_details__initial_rent_per_sqft',
+    'financial_details__annual_rent_escalation_method',
+    'financial_details__annual_rent_escalation',
+    'financial_details__rent_step_amount',
+    'escalation_method__CPI_method',
+    'escalation_method__review_option',
+    'escalation_method__price_index_id',
+    'lease_start_date',
+    'lease_end_date',
+)
+
+# Queries issued by rollup_net_operating_income for a property queryset, whatever its size
+ROLLUP_QUERY_COUNT = 2
+# The most it issues when leases escalate on stored price indexes: one to check the cached
+# index versions and one to reload those that changed, see cpi.load_indexes
+ROLLUP_INDEXED_QUERY_COUNT = ROLLUP_QUERY_COUNT + 2
+
+
+class PropertyRollup(NamedTuple):
+    """Gross income and NOI of many properties for one month.
+
+    Attributes:
+        property_ids (np.ndarray): The primary key of each property.
+        gross_income (np.ndarray): The total lease cash flow of each property.
+        net_operating_income (np.ndarray): The gross income less the property's expenses.
+    """
+    property_ids: np.ndarray
+    gross_income: np.ndarray
+    net_operating_income: np.ndarray
+
+    def as_dict(self) -> Dict[int, float]:
+        """Maps each property's primary key to its NOI."""
+        return dict(zip(self.property_ids.tolist(), self.net_operating_income.tolist()))
+
+
+def _float_column(values) -> np.ndarray:
+    """Converts a fetched column to floats, treating NULL as zero."""
+    return np.nan_to_num(np.array(values, dtype=float))
+
+
+def rollup_net_operating_income(
+    properties: Union[QuerySet, Iterable[RealEstateProperty]],
+    month: int = 0
+) -> PropertyRollup:
+    """Calculates the NOI of many properties with a constant number of queries.
+
+    All leases of all properties, joined to their financial details and escalation
+    methods, are fetched in one columnar query and reduced per property with NumPy.
+    A property queryset costs ROLLUP_QUERY_COUNT queries, or up to ROLLUP_INDEXED_QUERY_COUNT
+    when leases escalate on a price index; already loaded property instances cost one less.
+
+    Args:
+        properties (Union[QuerySet, Iterable[RealEstateProperty]]): The properties to roll up.
+        month (int): The lease month to evaluate.
+
+    Returns:
+        PropertyRollup: The gross income and NOI of each property.
+    """
+    if isinstance(properties, QuerySet):
+        property_rows = list(properties.values_list(*PROPERTY_FIELDS))
+    else:
+        property_rows = [tuple(getattr(instance, field) for field in PROPERTY_FIELDS) for instance in properties]
+    if not property_rows:
+        empty = np.empty(0)
+        return PropertyRollup(np.empty(0, dtype=int), empty, empty)
+
+    property_ids, operating_expenses, management_fee_percentage, real_estate_taxes, utilities = (
+        np.array(column) for column in zip(*property_rows)
+    )
+    property_ids = property_ids.astype(int)
+
+    # One joined query for every lease column the cash flow needs
+    lease_rows = list(
+        Lease.objects.filter(real_estate_property_id__in=property_ids.tolist()).values_list(*LEASE_FIELDS)
+    )
+    gross_income = np.zeros(property_ids.size)
+    if lease_rows:
+        (lease_property_ids, leased_area, rent_method, fixed_amount, per_sqft, escalation_method,
+         annual_rate, step_amount, cpi_method, review_option, price_index_id, lease_start_date, lease_end_date) = zip(*lease_rows)
+        lease_start_date = np.array(lease_start_date, dtype='datetime64[D]')
+        terms = escalation_terms(
+            escalation_method, annual_rate, step_amount, cpi_method, review_option,
+            lease_start_date, np.array(lease_end_date, dtype='datetime64[D]')
+        )
+        initial_rent = initial_rents(
+            _float_column(leased_area),
+            np.array(rent_method, dtype=object),
+            _float_column(fixed_amount),
+            _float_column(per_sqft)
+        )
+        cashflows = indexed_rents(initial_rent, terms, month, lease_start_date, price_index_id)
+
+        # Summing lease cash flows per property in one reduction
+        order = np.argsort(property_ids)
+        positions = order[np.searchsorted(property_ids, lease_property_ids, sorter=order)]
+        gross_income = np.bincount(positions, weights=cashflows, minlength=property_ids.size)
+
+    operating_expenses_with_management = (
+        _float_column(operating_expenses) + (_float_column(management_fee_percentage) / 100) * gross_income
+    )
+    net_operating_income = gross_income - operating_expenses_with_management - _float_column(real_estate_taxes) - _float_column(utilities)
+    return PropertyRollup(property_ids, gross_income, net_operating_income)
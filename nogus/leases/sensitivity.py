@@ -0,0 +1,140 @@
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+from .underwriting import ACQUISITION_INPUTS, MODEL_FIELD_INPUTS, calculate_levered_returns
+
+# Inputs left out of the default tornado because they are not continuous assumptions
+TORNADO_EXCLUDED_INPUTS = ('units', 'holding_period_years', 'amortization_period_years', 'prepayment_penalty_period_years')
+
+# Inputs expressed as a share of a whole, whose default tornado range is capped at 100%
+PERCENTAGE_OF_WHOLE_INPUTS = ('occupancy_rate', 'vacancy_rate', 'loan_to_value_ratio')
+
+
+class SensitivityGrid(NamedTuple):
+    """A two-way table of levered returns labelled by the values of its two axes.
+
+    Attributes:
+        row_input (str): The input varied down the rows.
+        row_values (np.ndarray): The value of ``row_input`` on each row.
+        column_input (str): The input varied across the columns.
+        column_values (np.ndarray): The value of ``column_input`` on each column.
+        irr (np.ndarray): The rows x columns levered IRR as a percentage.
+        equity_multiple (np.ndarray): The rows x columns equity multiple.
+    """
+    row_input: str
+    row_values: np.ndarray
+    column_input: str
+    column_values: np.ndarray
+    irr: np.ndarray
+    equity_multiple: np.ndarray
+
+
+class TornadoBar(NamedTuple):
+    """The IRR swing caused by moving one input between a low and a high value.
+
+    Attributes:
+        input (str): The name of the input.
+        low_value (float): The low value of the input.
+        high_value (float): The high value of the input.
+        low_irr (float): The levered IRR with the input at its low value, as a percentage.
+        high_irr (float): The levered IRR with the input at its high value, as a percentage.
+        swing (float): The absolute difference between the two IRRs.
+    """
+    input: str
+    low_value: float
+    high_value: float
+    low_irr: float
+    high_irr: float
+    swing: float
+
+
+def _input_name(name: str) -> str:
+    """Resolves an acquisition input or its model field name, such as max_loan_to_value_ratio, to the input."""
+    input_name = MODEL_FIELD_INPUTS.get(name, name)
+    if input_name not in ACQUISITION_INPUTS:
+        raise ValueError(f'Unknown acquisition input: {name}')
+    return input_name
+
+
+def sensitivity_grid(
+    inputs: Dict[str, float],
+    row_input: str,
+    row_values: ArrayLike,
+    column_input: str,
+    column_values: ArrayLike
+) -> SensitivityGrid:
+    """Evaluates a two-way sensitivity table of levered returns in one vectorized pass.
+
+    For example ``sensitivity_grid(inputs, 'going_out_cap_rate', caps, 'rent_growth_rate', growths)``
+    or ``sensitivity_grid(inputs, 'interest_rate', rates, 'max_loan_to_value_ratio', ltvs)``.
+    Inputs may be named as in ACQUISITION_INPUTS or by their model field, see MODEL_FIELD_INPUTS.
+
+    Args:
+        inputs (Dict[str, float]): The base-case model inputs, see acquisition_inputs.
+        row_input (str): The input varied down the rows.
+        row_values (ArrayLike): The values of ``row_input``.
+        column_input (str): The input varied across the columns.
+        column_values (ArrayLike): The values of ``column_input``.
+
+    Returns:
+        SensitivityGrid: The labelled IRR and equity multiple tables.
+    """
+    if _input_name(row_input) == _input_name(column_input):
+        raise ValueError('The rows and columns must vary different inputs')
+
+    row_values = np.asarray(row_values, dtype=float)
+    column_values = np.asarray(column_values, dtype=float)
+
+    # Broadcasting the axes against each other turns every cell into one scenario of a single batch
+    scenario = dict(inputs)
+    scenario[_input_name(row_input)] = row_values[:, None]
+    scenario[_input_name(column_input)] = column_values[None, :]
+    base_irr = calculate_levered_returns(**inputs).irr / 100
+    returns = calculate_levered_returns(**scenario, irr_guess=np.nan_to_num(base_irr, nan=0.1))
+    irr = np.broadcast_to(returns.irr, (row_values.size, column_values.size))
+    equity_multiple = np.broadcast_to(returns.equity_multiple, irr.shape)
+
+    return SensitivityGrid(row_input, row_values, column_input, column_values, irr, equity_multiple)
+
+
+def tornado(
+    inputs: Dict[str, float],
+    ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+    relative_change: float = 0.1
+) -> List[TornadoBar]:
+    """Ranks inputs by how far the levered IRR swings between their low and high values.
+
+    Every low and high scenario is evaluated together in one batch.
+
+    Args:
+        inputs (Dict[str, float]): The base-case model inputs, see acquisition_inputs.
+        ranges (Optional[Dict[str, Tuple[float, float]]]): Explicit low and high values per input,
+            keyed by input or model field name.
+            Defaults to moving every continuous input by ``relative_change`` either side of its base value.
+        relative_change (float): The fractional change used for the default ranges.
+
+    Returns:
+        List[TornadoBar]: One bar per input, widest swing first.
+    """
+    if ranges is None:
+        ranges = {
+            name: (inputs[name] * (1 - relative_change), inputs[name] * (1 + relative_change))
+            for name in ACQUISITION_INPUTS if name not in TORNADO_EXCLUDED_INPUTS
+        }
+        for name in PERCENTAGE_OF_WHOLE_INPUTS:
+            ranges[name] = (ranges[name][0], min(ranges[name][1], 100.0))
+    names = list(ranges)
+
+    # Scenario 2i holds input i at its low value and scenario 2i + 1 at its high value
+    scenario = {name: np.full(2 * len(names), float(value)) for name, value in inputs.items()}
+    for position, name in enumerate(names):
+        scenario[_input_name(name)][2 * position:2 * position + 2] = ranges[name]
+    irr = calculate_levered_returns(**scenario).irr.reshape(-1, 2)
+
+    bars = [
+        TornadoBar(name, float(ranges[name][0]), float(ranges[name][1]), float(low_irr), float(high_irr), float(abs(high_irr - low_irr)))
+        for name, (low_irr, high_irr) in zip(names, irr)
+    ]
+    return sorted(bars, key=lambda bar: np.nan_to_num(bar.swing, nan=-np.inf), reverse=True)
@@ -0,0 +1,134 @@
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .accounts import creates_cycle, detach_children, insert_account, move_account
+from .cpi import touch_indexes
+from .models import (
+    Account,
+    DebtFinancing,
+    Lease,
+    LeaseEscalationMethod,
+    LeaseFinancialDetail,
+    MarketLeasingProfile,
+    OperatingExpense,
+    PriceIndex,
+    PriceIndexValue,
+    PropertySale,
+    RealEstateProperty,
+)
+from .projections import invalidate_lease_projections, invalidate_projections
+from .revaluation import VALUATION_INPUT_FIELDS
+
+
+@receiver(pre_save, sender=Lease)
+def lease_saving(sender, instance, update_fields=None, **kwargs):
+    # Fetching the stored property so a lease moved to another property invalidates both
+    instance._stored_property_id = None
+    if not instance._state.adding and (update_fields is None or 'real_estate_property' in update_fields):
+        instance._stored_property_id = Lease.objects.filter(pk=instance.pk).values_list('real_estate_property_id', flat=True).first()
+
+
+@receiver([post_save, post_delete], sender=Lease)
+def lease_changed(sender, instance, **kwargs):
+    property_ids = {instance.real_estate_property_id, getattr(instance, '_stored_property_id', None)}
+    invalidate_projections(lease_ids=[instance.pk], property_ids=property_ids)
+
+
+@receiver([post_save, pre_delete], sender=LeaseFinancialDetail)
+def lease_financial_detail_changed(sender, instance, **kwargs):
+    invalidate_lease_projections(Lease.objects.filter(financial_details_id=instance.pk))
+
+
+# Deleting these rows nulls the lease foreign keys without signals, so leases are found before the delete
+@receiver([post_save, pre_delete], sender=LeaseEscalationMethod)
+def lease_escalation_method_changed(sender, instance, **kwargs):
+    invalidate_lease_projections(Lease.objects.filter(escalation_method_id=instance.pk))
+
+
+@receiver([post_save, pre_delete], sender=MarketLeasingProfile)
+def market_leasing_profile_changed(sender, instance, **kwargs):
+    invalidate_lease_projections(Lease.objects.filter(market_leasing_profile_id=instance.pk))
+
+
+@receiver([post_save, pre_delete], sender=PriceIndex)
+def price_index_changed(sender, instance, **kwargs):
+    invalidate_lease_projections(Lease.objects.filter(escalation_method__price_index_id=instance.pk))
+
+
+@receiver([post_save, post_delete], sender=PriceIndexValue)
+def price_index_value_changed(sender, instance, **kwargs):
+    touch_indexes([instance.index_id])
+
+
+@receiver([post_save, post_delete], sender=OperatingExpense)
+def operating_expense_changed(sender, instance, **kwargs):
+    invalidate_projections(property_ids=[instance.real_estate_property_id])
+
+
+@receiver(pre_save, sender=RealEstateProperty)
+def real_estate_property_saving(sender, instance, update_fields=None, **kwargs):
+    # A full save writes the new timestamp in its own UPDATE
+    if update_fields is None or 'inputs_modified_at' in update_fields:
+        instance.inputs_modified_at = timezone.now()
+
+
+@receiver(post_save, sender=RealEstateProperty)
+def real_estate_property_saved(sender, instance, update_fields=None, **kwargs):
+    # A save limited to valuation inputs cannot add inputs_modified_at to its fields, so it gets an UPDATE of its own;
+    # saves limited to other fields, such as revaluation results, leave the inputs untouched
+    if update_fields is not None and 'inputs_modified_at' not in update_fields and not update_fields.isdisjoint(VALUATION_INPUT_FIELDS):
+        instance.inputs_modified_at = timezone.now()
+        RealEstateProperty.objects.filter(pk=instance.pk).update(inputs_modified_at=instance.inputs_modified_at)
+
+
+@receiver(post_save, sender=DebtFinancing)
+def debt_financing_changed(sender, instance, **kwargs):
+    RealEstateProperty.objects.filter(debt_financing_id=instance.pk).update(inputs_modified_at=timezone.now())
+
+
+@receiver(post_save, sender=PropertySale)
+def property_sale_changed(sender, instance, **kwargs):
+    RealEstateProperty.objects.filter(property_sale_id=instance.pk).update(inputs_modified_at=timezone.now())
+
+
+# Deleting these rows nulls the property foreign keys without signals, so the properties are found before the delete
+@receiver(pre_delete, sender=DebtFinancing)
+def debt_financing_deleting(sender, instance, **kwargs):
+    instance._property_ids = list(RealEstateProperty.objects.filter(debt_financing_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(pre_delete, sender=PropertySale)
+def property_sale_deleting(sender, instance, **kwargs):
+    instance._property_ids = list(RealEstateProperty.objects.filter(property_sale_id=instance.pk).values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=DebtFinancing)
+@receiver(post_delete, sender=PropertySale)
+def property_financing_deleted(sender, instance, **kwargs):
+    RealEstateProperty.objects.filter(pk__in=getattr(instance, '_property_ids', [])).update(inputs_modified_at=timezone.now())
+
+
+@receiver(post_init, sender=Account)
+def remember_account_parent(sender, instance, **kwargs):
+    instance._loaded_parent_account_id = instance.parent_account_id
+
+
+@receiver(pre_save, sender=Account)
+def account_moving(sender, instance, **kwargs):
+    if instance.pk is not None and instance.parent_account_id != instance._loaded_parent_account_id and creates_cycle(instance):
+        raise ValueError('An account cannot be moved under one of its own descendants.')
+
+
+@receiver(post_save, sender=Account)
+def account_saved(sender, instance, created, **kwargs):
+    if created:
+        insert_account(instance)
+    elif instance.parent_account_id != instance._loaded_parent_account_id:
+        move_account(instance)
+    instance._loaded_parent_account_id = instance.parent_account_id
+
+
+@receiver(pre_delete, sender=Account)
+def account_deleting(sender, instance, **kwargs):
+    detach_children(instance)
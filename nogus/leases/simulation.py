@@ -0,0 +1,226 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .underwriting import ACQUISITION_INPUTS, acquisition_inputs, calculate_levered_returns
+
+# Inputs that are sampled in each draw and the bounds their samples are clipped to
+SIMULATED_INPUTS = {
+    'rent_growth_rate': (-100.0, np.inf),
+    'vacancy_rate': (0.0, 100.0),
+    'going_out_cap_rate': (0.1, np.inf),
+    'interest_rate': (0.0, np.inf),
+}
+
+# Standard deviations of the default normal distributions around the base case, in percentage points
+DEFAULT_STANDARD_DEVIATIONS = {
+    'rent_growth_rate': 1.0,
+    'vacancy_rate': 2.0,
+    'going_out_cap_rate': 0.5,
+    'interest_rate': 0.75,
+}
+
+DEFAULT_CHUNK_SIZE = 100_000
+
+# Generator methods a distribution spec may name, and the number of parameters each takes
+DISTRIBUTIONS = {
+    'normal': 2,
+    'uniform': 2,
+    'triangular': 3,
+    'lognormal': 2,
+}
+
+
+class SimulationResult(NamedTuple):
+    """The distribution of levered returns across all simulated draws.
+
+    Attributes:
+        irr (np.ndarray): The levered IRR of each draw as a percentage.
+        equity_multiple (np.ndarray): The equity multiple of each draw.
+    """
+    irr: np.ndarray
+    equity_multiple: np.ndarray
+
+    def summary(self, percentiles: Sequence[float] = (5, 25, 50, 75, 95)) -> Dict[str, Dict[str, float]]:
+        """Summarizes both distributions by their mean and percentiles, ignoring draws without an IRR."""
+        summary = {}
+        for name, values in (('irr', self.irr), ('equity_multiple', self.equity_multiple)):
+            values = values[np.isfinite(values)]
+            if not values.size:
+                values = np.array([np.nan])
+            summary[name] = {'mean': float(values.mean())}
+            summary[name].update(
+                (f'p{percentile:g}', float(value)) for percentile, value in zip(percentiles, np.percentile(values, percentiles))
+            )
+        return summary
+
+
+def default_distributions(inputs: Dict[str, float]) -> Dict[str, Tuple]:
+    """Builds normal distributions centred on the base-case value of every simulated input.
+
+    Args:
+        inputs (Dict[str, float]): The base-case model inputs.
+
+    Returns:
+        Dict[str, Tuple]: Distribution specs keyed by input name.
+    """
+    return {name: ('normal', inputs[name], deviation) for name, deviation in DEFAULT_STANDARD_DEVIATIONS.items()}
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float, np.number)) and not isinstance(value, bool) and bool(np.isfinite(value))
+
+
+def check_distributions(distributions: Dict[str, object]):
+    """Checks distribution specs from an untrusted source, such as the job API.
+
+    Each input must be one of ACQUISITION_INPUTS, and its spec a finite number or a sequence
+    of a name from DISTRIBUTIONS followed by that distribution's parameters.
+
+    Raises:
+        ValueError: If an input, a distribution or its parameters are invalid.
+    """
+    if not isinstance(distributions, dict):
+        raise ValueError('Distributions must map input names to specs')
+    for name, spec in distributions.items():
+        if name not in ACQUISITION_INPUTS:
+            raise ValueError(f'Unknown acquisition input: {name}')
+        if _is_number(spec):
+            continue
+        if not isinstance(spec, (list, tuple)) or not spec or spec[0] not in DISTRIBUTIONS:
+            raise ValueError(f'The distribution of {name} must be a number or one of: {", ".join(DISTRIBUTIONS)}')
+        method, *parameters = spec
+        if len(parameters) != DISTRIBUTIONS[method] or not all(_is_number(parameter) for parameter in parameters):
+            raise ValueError(f'A {method} distribution takes {DISTRIBUTIONS[method]} numeric parameters')
+
+
+def _sample(rng: np.random.Generator, spec, size: int) -> np.ndarray:
+    """Draws samples from a spec such as ``('normal', mean, std)`` or a fixed number."""
+    if np.isscalar(spec):
+        return np.full(size, float(spec))
+    method, *parameters = spec
+    if method not in DISTRIBUTIONS:
+        raise ValueError(f'Unknown distribution: {method}')
+    return getattr(rng, method)(*parameters, size=size)
+
+
+def simulate_chunk(
+    inputs: Dict[str, float],
+    distributions: Dict[str, Tuple],
+    size: int,
+    seed_sequence: np.random.SeedSequence,
+    irr_guess: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Samples one chunk of draws and evaluates their levered returns, see simulation_chunks."""
+    rng = np.random.default_rng(seed_sequence)
+    scenario = dict(inputs)
+    for name, spec in distributions.items():
+        low, high = SIMULATED_INPUTS.get(name, (-np.inf, np.inf))
+        scenario[name] = np.clip(_sample(rng, spec, size), low, high)
+    returns = calculate_levered_returns(**scenario, irr_guess=irr_guess)
+    # Without sampled inputs every draw is the same single scenario
+    return np.broadcast_to(returns.irr, size), np.broadcast_to(returns.equity_multiple, size)
+
+
+def simulation_chunks(
+    inputs: Dict[str, float],
+    draws: int,
+    distributions: Optional[Dict[str, Tuple]] = None,
+    seed: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> List[Tuple]:
+    """Splits a simulation into the argument tuples of its simulate_chunk calls.
+
+    Each chunk gets its own child seed of ``seed``, so results are reproducible however
+    the chunks are scheduled.
+
+    Args:
+        inputs (Dict[str, float]): The base-case model inputs.
+        draws (int): The total number of draws.
+        distributions (Optional[Dict[str, Tuple]]): Distribution specs keyed by input name,
+            defaulting to default_distributions.
+        seed (Optional[int]): The seed that makes the simulation reproducible.
+        chunk_size (int): The number of draws per chunk.
+
+    Returns:
+        List[Tuple]: The arguments of each chunk.
+    """
+    if distributions is None:
+        distributions = default_distributions(inputs)
+
+    # Splitting the draws into chunks with independent, reproducible streams
+    sizes = [min(chunk_size, draws - start) for start in range(0, draws, chunk_size)]
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(sizes))
+
+    # Warm-starting every chunk's IRR solver from the base case
+    irr_guess = calculate_levered_returns(**inputs).irr / 100
+    irr_guess = float(irr_guess) if np.isfinite(irr_guess) else None
+
+    return [(inputs, distributions, size, seed_sequence, irr_guess) for size, seed_sequence in zip(sizes, seed_sequences)]
+
+
+def simulate_returns(
+    inputs: Dict[str, float],
+    draws: int = 1_000_000,
+    distributions: Optional[Dict[str, Tuple]] = None,
+    seed: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None
+) -> SimulationResult:
+    """Runs a Monte Carlo simulation of levered returns around a set of base-case inputs.
+
+    Draws are generated in chunks, each with its own child seed of ``seed``, so results are
+    reproducible regardless of how many worker processes evaluate them.
+
+    Args:
+        inputs (Dict[str, float]): The base-case model inputs, see acquisition_inputs.
+        draws (int): The total number of draws.
+        distributions (Optional[Dict[str, Tuple]]): Specs such as ``{'interest_rate': ('normal', 6.0, 0.5)}``
+            naming a numpy Generator method and its parameters. Defaults to default_distributions.
+        seed (Optional[int]): The seed that makes the simulation reproducible.
+        chunk_size (int): The number of draws evaluated at once, bounding peak memory.
+        workers (Optional[int]): The number of worker processes, all cores by default and inline when 1.
+
+    Returns:
+        SimulationResult: The IRR and equity multiple of every draw.
+    """
+    arguments = simulation_chunks(inputs, draws, distributions, seed, chunk_size)
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(arguments) == 1:
+        chunks = [simulate_chunk(*argument) for argument in arguments]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(arguments))) as executor:
+            chunks = list(executor.map(simulate_chunk, *zip(*arguments)))
+
+    irr = np.concatenate([chunk[0] for chunk in chunks]) if chunks else np.empty(0)
+    equity_multiple = np.concatenate([chunk[1] for chunk in chunks]) if chunks else np.empty(0)
+    return SimulationResult(irr, equity_multiple)
+
+
+def simulate_acquisition(
+    property_acquisition,
+    draws: int = 1_000_000,
+    distributions: Optional[Dict[str, Tuple]] = None,
+    seed: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    workers: Optional[int] = None,
+    **overrides
+) -> SimulationResult:
+    """Runs a Monte Carlo simulation of the levered returns of a PropertyAcquisition.
+
+    Args:
+        property_acquisition (PropertyAcquisition): The acquisition to simulate.
+        draws (int): The total number of draws.
+        distributions (Optional[Dict[str, Tuple]]): Distribution specs keyed by input name.
+        seed (Optional[int]): The seed that makes the simulation reproducible.
+        chunk_size (int): The number of draws evaluated at once.
+        workers (Optional[int]): The number of worker processes.
+        **overrides: Base-case inputs that are not stored on the models, see acquisition_inputs.
+
+    Returns:
+        SimulationResult: The IRR and equity multiple of every draw.
+    """
+    inputs = acquisition_inputs(property_acquisition, **overrides)
+    return simulate_returns(inputs, draws, distributions, seed, chunk_size, workers)
@@ -0,0 +1,313 @@
+import time
+from datetime import date
+from itertools import islice, repeat
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+from django.db import connections, router, transaction
+
+from .cashflows import months_since
+from .escalation import escalated_rents, escalation_terms
+from .models import Lease, LeaseDetail, LeaseFinancialDetail, OperatingExpense, RealEstateProperty
+from .underwriting import ACQUISITION_INPUTS
+
+DEFAULT_LEASES_PER_PROPERTY = 20
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_START_DATE = date(2024, 1, 1)
+DEFAULT_ANALYSIS_YEARS = 10
+# Rows per executemany call of the monthly detail tables
+BATCH_SIZE = 5000
+# Drawn LeaseDetail columns besides the lease and the date
+LEASE_DETAIL_VALUE_FIELDS = ('rent', 'historical_vacancy_rates', 'estimated_future_vacancy_rates', 'time_to_lease_up_vacant_space')
+# Monthly operating expense rows of each property, as shares of its annual operating expenses
+EXPENSE_TYPES = {
+    'real_estate_taxes': 0.35,
+    'insurance': 0.1,
+    'utilities': 0.2,
+    'repairs_and_maintenance': 0.2,
+    'management': 0.15,
+}
+EXPENSE_INFLATION_RATE = 3.0
+
+
+class SeedStats(NamedTuple):
+    """Counters of a synthetic portfolio written by create_synthetic_portfolio.
+
+    Attributes:
+        property_ids (List[int]): The primary keys of the created properties.
+        leases (int): The leases created, each with its LeaseFinancialDetail.
+        lease_details (int): The monthly LeaseDetail rows created.
+        operating_expenses (int): The monthly OperatingExpense rows created.
+        seconds (float): The wall-clock duration.
+    """
+    property_ids: List[int]
+    leases: int
+    lease_details: int
+    operating_expenses: int
+    seconds: float
+
+    @property
+    def rows(self) -> int:
+        # Every lease also writes its financial details row
+        return len(self.property_ids) + 2 * self.leases + self.lease_details + self.operating_expenses
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def synthetic_lease_columns(rng: np.random.Generator, count: int, start_date: date = DEFAULT_START_DATE) -> Dict[str, np.ndarray]:
+    """Draws the columns of ``count`` plausible leases around an analysis start date.
+
+    Leases started up to five years before ``start_date`` and run three to ten years, on
+    500 to 20,000 square feet at 1.5 to 6 per square foot per month, with fixed, step or
+    CPI escalations.
+
+    Args:
+        rng (np.random.Generator): The source of randomness, so portfolios are reproducible.
+        count (int): The number of leases.
+        start_date (date): The analysis start date.
+
+    Returns:
+        Dict[str, np.ndarray]: Lease and LeaseFinancialDetail field values keyed by field name.
+    """
+    start_month = np.datetime64(start_date, 'M')
+    lease_start = start_month - rng.integers(0, 60, count)
+    term_months = rng.integers(36, 121, count)
+    lease_end = (lease_start + term_months).astype('datetime64[D]') - 1
+    escalation_method = rng.choice(np.array(['fixed', 'step', 'cpi']), count, p=[0.7, 0.2, 0.1])
+    return {
+        'leased_area': rng.uniform(500, 20000, count).round(),
+        'property_type': rng.choice(np.array([choice for choice, _ in Lease.PROPERTY_TYPE_CHOICES]), count),
+        'expiration_option': rng.choice(np.array([choice for choice, _ in Lease.EXPIRATION_CHOICES]), count),
+        'renewal_probability': rng.uniform(0.3, 0.8, count).round(2),
+        'lease_start_date': lease_start.astype('datetime64[D]'),
+        'lease_end_date': lease_end,
+        'initial_rent_per_sqft': rng.uniform(1.5, 6, count).round(2),
+        'annual_rent_escalation_method': escalation_method,
+        'annual_rent_escalation': np.where(escalation_method == 'step', 0, rng.uniform(1, 4, count).round(2)),
+        'rent_step_amount': np.where(escalation_method == 'step', rng.uniform(50, 500, count).round(), 0),
+    }
+
+
+def _insert_rows(model, columns: Dict[str, Iterable]):
+    """Inserts rows given column by column into a model's table with batched executemany calls.
+
+    For high-volume child rows whose primary keys are not needed: bulk_create's per-instance
+    preparation runs it about five times slower. Every concrete field but the automatic
+    primary key is written, those missing from ``columns`` with their default, so the INSERT
+    follows the model as fields are added. Given values must already be in their database
+    form, such as ISO strings for dates.
+
+    Raises:
+        ValueError: If a column is not a field of the model, or a field without a default is missing.
+    """
+    connection = connections[router.db_for_write(model)]
+    fields = [field for field in model._meta.concrete_fields if field is not model._meta.auto_field]
+    unknown = set(columns) - {field.name for field in fields}
+    if unknown:
+        raise ValueError(f'Unknown {model.__name__} fields: {", ".join(sorted(unknown))}')
+    values = []
+    for field in fields:
+        if field.name in columns:
+            values.append(columns[field.name])
+        elif field.has_default() or field.null:
+            # The default is the same for every row, so it is prepared once
+            values.append(repeat(field.get_db_prep_save(field.get_default(), connection)))
+        else:
+            raise ValueError(f'{model.__name__}.{field.name} has no default and must be given')
+
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields))
+    )
+    rows = zip(*values)
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                break
+            cursor.executemany(sql, batch)
+
+
+def _lease_detail_columns(rng: np.random.Generator, columns: Dict[str, np.ndarray], months: np.ndarray) -> Dict[str, np.ndarray]:
+    """Calculates the monthly rent of every lease, zero outside its term, and draws vacancy rates."""
+    terms = escalation_terms(
+        columns['annual_rent_escalation_method'], columns['annual_rent_escalation'], columns['rent_step_amount'],
+        None, None, columns['lease_start_date'], columns['lease_end_date']
+    )
+    initial_rent = columns['leased_area'] * columns['initial_rent_per_sqft']
+    lease_months = months_since(columns['lease_start_date'][:, None], months[None, :])
+    in_term = (lease_months >= 0) & (months[None, :] <= columns['lease_end_date'].astype('datetime64[M]')[:, None])
+    rents = np.where(in_term, escalated_rents(initial_rent, terms, np.clip(lease_months, 0, None)), 0.0).round(2)
+    shape = rents.shape
+    return {
+        'rent': rents,
+        'historical_vacancy_rates': rng.uniform(0, 0.1, shape).round(3),
+        'estimated_future_vacancy_rates': rng.uniform(0, 0.1, shape).round(3),
+        'time_to_lease_up_vacant_space': np.where(in_term, 0, rng.integers(3, 13, shape)),
+    }
+
+
+def create_synthetic_portfolio(
+    properties: int,
+    leases_per_property: int = DEFAULT_LEASES_PER_PROPERTY,
+    months: int = 0,
+    seed: int = 0,
+    start_date: date = DEFAULT_START_DATE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    progress: Optional[Callable[[SeedStats], None]] = None
+) -> SeedStats:
+    """Bulk creates properties, leases and their monthly history for benchmarks and load tests.
+
+    Leases are drawn by synthetic_lease_columns. With ``months``, every lease also gets a
+    LeaseDetail row per month from ``start_date``, at its escalated rent within its term,
+    and every property an OperatingExpense row per expense type and month. Properties are
+    written about ``chunk_size`` leases at a time, each chunk in its own transaction with
+    one bulk insert per model and foreign keys wired in memory, so memory stays flat at
+    any size. New rows have no stored projections yet, so nothing needs invalidating.
+
+    Args:
+        properties (int): The number of properties to create.
+        leases_per_property (int): The leases of each property.
+        months (int): The months of lease details and operating expenses, or 0 for none.
+        seed (int): The random seed, so the same arguments create the same portfolio.
+        start_date (date): The analysis start date of every lease and the first detail month.
+        chunk_size (int): The leases written per transaction.
+        progress (Optional[Callable[[SeedStats], None]]): Called with the running totals after each chunk.
+
+    Returns:
+        SeedStats: The created properties and row counts.
+
+    Raises:
+        ValueError: If a count is negative, or ``leases_per_property`` or ``chunk_size`` is below 1.
+    """
+    if properties < 0 or months < 0 or leases_per_property < 1 or chunk_size < 1:
+        raise ValueError('Counts must not be negative, and leases_per_property and chunk_size must be at least 1')
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    detail_months = np.arange(np.datetime64(start_date, 'M'), np.datetime64(start_date, 'M') + months)
+    operations = connections[router.db_for_write(LeaseDetail)].ops
+    detail_dates = [operations.adapt_datefield_value(value) for value in detail_months.astype('datetime64[D]').tolist()]
+    expense_shares = np.array(list(EXPENSE_TYPES.values()))
+    # Expenses grow at a steady annual inflation from the start month
+    expense_growth = (1 + EXPENSE_INFLATION_RATE / 100) ** (np.arange(months) / 12)
+
+    property_ids = []
+    totals = {'leases': 0, 'lease_details': 0, 'operating_expenses': 0}
+    properties_per_chunk = max(chunk_size // leases_per_property, 1)
+    for first in range(0, properties, properties_per_chunk):
+        count = min(properties_per_chunk, properties - first)
+        leases = count * leases_per_property
+        operating_expenses = rng.uniform(50000, 500000, count).round()
+        columns = synthetic_lease_columns(rng, leases, start_date)
+        rows = {name: values.tolist() for name, values in columns.items()}
+        with transaction.atomic():
+            created = RealEstateProperty.objects.bulk_create([
+                RealEstateProperty(
+                    name=f'Synthetic {first + index + 1}',
+                    total_area=leases_per_property * 20000,
+                    operating_expenses=operating_expense,
+                    purchase_price=round(operating_expense * 40, -3),
+                )
+                for index, operating_expense in enumerate(operating_expenses.tolist())
+            ])
+            chunk_property_ids = [real_estate_property.pk for real_estate_property in created]
+            financial_details = LeaseFinancialDetail.objects.bulk_create([
+                LeaseFinancialDetail(
+                    initial_rent_method='per_sqft',
+                    initial_rent_per_sqft=per_sqft,
+                    annual_rent_escalation_method=method,
+                    annual_rent_escalation=rate,
+                    rent_step_amount=step,
+                )
+                for per_sqft, method, rate, step in zip(
+                    rows['initial_rent_per_sqft'], rows['annual_rent_escalation_method'],
+                    rows['annual_rent_escalation'], rows['rent_step_amount']
+                )
+            ])
+            created_leases = Lease.objects.bulk_create([
+                Lease(
+                    real_estate_property_id=chunk_property_ids[row // leases_per_property],
+                    tenant_name=f'Tenant {totals["leases"] + row + 1}',
+                    financial_details=financial_details[row],
+                    leased_area=rows['leased_area'][row],
+                    property_type=rows['property_type'][row],
+                    expiration_option=rows['expiration_option'][row],
+                    renewal_probability=rows['renewal_probability'][row],
+                    lease_start_date=rows['lease_start_date'][row],
+                    lease_end_date=rows['lease_end_date'][row],
+                    analysis_begin_date=start_date,
+                    length_of_analysis_years=DEFAULT_ANALYSIS_YEARS,
+                    length_of_analysis_months=0,
+                )
+                for row in range(leases)
+            ])
+
+            if months:
+                details = _lease_detail_columns(rng, columns, detail_months)
+                _insert_rows(LeaseDetail, {
+                    'lease': np.repeat([lease.pk for lease in created_leases], months).tolist(),
+                    'date': detail_dates * leases,
+                    **{name: details[name].ravel().tolist() for name in LEASE_DETAIL_VALUE_FIELDS},
+                })
+                # Properties x expense types x months, each type a share of the property's annual expenses
+                amounts = operating_expenses[:, None, None] * expense_shares[None, :, None] * expense_growth / 12
+                _insert_rows(OperatingExpense, {
+                    'real_estate_property': np.repeat(chunk_property_ids, len(EXPENSE_TYPES) * months).tolist(),
+                    'expense_type': np.tile(np.repeat(list(EXPENSE_TYPES), months), count).tolist(),
+                    'amount': amounts.round(2).ravel().tolist(),
+                    'date': detail_dates * (count * len(EXPENSE_TYPES)),
+                })
+
+        property_ids.extend(chunk_property_ids)
+        totals['leases'] += leases
+        totals['lease_details'] += leases * months
+        totals['operating_expenses'] += count * len(EXPENSE_TYPES) * months
+        if progress is not None:
+            progress(SeedStats(property_ids, seconds=time.perf_counter() - started, **totals))
+    return SeedStats(property_ids, seconds=time.perf_counter() - started, **totals)
+
+
+def synthetic_acquisition_inputs(count: int, seed: int = 0) -> Dict[str, np.ndarray]:
+    """Draws ``count`` plausible acquisition scenarios for the batched underwriting functions.
+
+    Args:
+        count (int): The number of scenarios.
+        seed (int): The random seed.
+
+    Returns:
+        Dict[str, np.ndarray]: An array per name in ACQUISITION_INPUTS.
+    """
+    rng = np.random.default_rng(seed)
+    units = rng.integers(20, 400, count)
+    in_place_rent = rng.uniform(1.5, 4, count).round(2)
+    gross_square_feet = units * rng.uniform(700, 1200, count).round()
+    occupancy_rate = rng.uniform(85, 98, count).round(1)
+    vacancy_rate = rng.uniform(3, 8, count).round(1)
+    # Expenses take 30% to 45% of revenue, and the price capitalizes the resulting NOI at 5% to 7%
+    revenue = in_place_rent * gross_square_feet * 12 * (occupancy_rate - vacancy_rate) / 100
+    operating_expenses = (revenue * rng.uniform(0.3, 0.45, count)).round()
+    purchase_price_per_unit = ((revenue - operating_expenses) / rng.uniform(0.05, 0.07, count) / units).round(-3)
+    inputs = {
+        'purchase_price_per_unit': purchase_price_per_unit,
+        'units': units,
+        'closing_costs': (purchase_price_per_unit * units * rng.uniform(0.005, 0.02, count)).round(),
+        'in_place_rent': in_place_rent,
+        'gross_square_feet': gross_square_feet,
+        'occupancy_rate': occupancy_rate,
+        'operating_expenses': operating_expenses,
+        'rent_growth_rate': rng.uniform(0, 5, count).round(2),
+        'vacancy_rate': vacancy_rate,
+        'holding_period_years': rng.integers(3, 11, count),
+        'loan_to_value_ratio': rng.uniform(50, 75, count).round(),
+        'interest_rate': rng.uniform(4, 8, count).round(2),
+        'amortization_period_years': rng.choice([25, 30], count),
+        'loan_closing_fees_percentage': rng.uniform(0.5, 2, count).round(2),
+        'going_out_cap_rate': rng.uniform(4.5, 7.5, count).round(2),
+        'sale_fees': (purchase_price_per_unit * units * rng.uniform(0.01, 0.03, count)).round(),
+        'prepayment_penalty_period_years': rng.integers(0, 5, count),
+    }
+    return {name: inputs[name] for name in ACQUISITION_INPUTS}
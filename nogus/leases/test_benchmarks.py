@@ -0,0 +1,205 @@
+"""Benchmarks of the calculation and ORM hot paths on synthetic portfolios.
+
+Each benchmark records wall time, peak traced memory and queries, and fails when the query
+count or the peak memory exceeds its budget. The suite runs at 100 and 10,000 leases by
+default; set LEASES_BENCHMARK_SIZES, such as ``100,10000,1000000``, to choose the sizes, run the
+million-lease portfolio and print a timing report.
+"""
+import os
+import sys
+import time
+import tracemalloc
+import unittest
+from typing import Callable, List, NamedTuple, Tuple
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from . import financial_calculations
+from .models import Lease, RealEstateProperty
+from .projections import LEASE_INPUT_RELATIONS
+from .rollups import ROLLUP_QUERY_COUNT, rollup_net_operating_income
+from .synthetic import DEFAULT_LEASES_PER_PROPERTY, create_synthetic_portfolio, synthetic_acquisition_inputs
+
+# Portfolio sizes in leases; each has its own PortfolioBenchmark TestCase below
+DEFAULT_BENCHMARK_SIZES = '100,10000'
+BENCHMARK_SIZES = tuple(int(size) for size in os.environ.get('LEASES_BENCHMARK_SIZES', DEFAULT_BENCHMARK_SIZES).split(','))
+# Leases timed one call at a time; the calls are per lease, so a sample shows the per-call cost
+SAMPLE_LEASES = 100
+# Peak memory budgets: a fixed allowance plus an allowance per row of input
+BASE_MEMORY_BYTES = 4 * 1024 ** 2
+MATRIX_BYTES_PER_ROW_YEAR = 8 * 24
+ROLLUP_BYTES_PER_LEASE = 4 * 1024
+CHANGELIST_MEMORY_BYTES = 16 * 1024 ** 2
+# Queries of one lease changelist page, whatever the number of leases
+CHANGELIST_QUERY_COUNT = 6
+
+_report: List[Tuple[str, int, 'Measurement']] = []
+
+
+class Measurement(NamedTuple):
+    """The cost of one benchmarked call.
+
+    Attributes:
+        seconds (float): The wall time.
+        peak_bytes (int): The peak memory traced by tracemalloc, NumPy buffers included.
+        queries (int): The database queries issued.
+    """
+    seconds: float
+    peak_bytes: int
+    queries: int
+
+
+def measure(name: str, size: int, function: Callable, *args, **kwargs):
+    """Calls ``function`` once, recording its Measurement under ``name`` for the report."""
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - started
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    measurement = Measurement(seconds, peak_bytes, len(queries))
+    _report.append((name, size, measurement))
+    return result, measurement
+
+
+def tearDownModule():
+    if 'LEASES_BENCHMARK_SIZES' not in os.environ:
+        return
+    sys.stderr.write(f'\n{"benchmark":<48} {"size":>9} {"seconds":>9} {"peak MB":>9} {"queries":>8}\n')
+    for name, size, measurement in _report:
+        sys.stderr.write(
+            f'{name:<48} {size:>9} {measurement.seconds:>9.3f} {measurement.peak_bytes / 1024 ** 2:>9.1f} {measurement.queries:>8}\n'
+        )
+
+
+class FinancialCalculationBenchmark(SimpleTestCase):
+    """Every function of financial_calculations, vectorized ones on a row per lease and scalar ones per property."""
+
+    def assert_within(self, measurement: Measurement, budget: float):
+        self.assertEqual(measurement.queries, 0)
+        self.assertLessEqual(measurement.peak_bytes, BASE_MEMORY_BYTES + budget)
+
+    def test_vectorized_functions(self):
+        for size in BENCHMARK_SIZES:
+            with self.subTest(leases=size):
+                inputs = synthetic_acquisition_inputs(size)
+                years = int(inputs['holding_period_years'].max())
+                _, measurement = measure(
+                    'calculate_operating_cash_flow_matrix', size, financial_calculations.calculate_operating_cash_flow_matrix,
+                    inputs['in_place_rent'], inputs['gross_square_feet'], inputs['occupancy_rate'], inputs['operating_expenses'],
+                    inputs['rent_growth_rate'], inputs['vacancy_rate'], inputs['holding_period_years']
+                )
+                self.assert_within(measurement, MATRIX_BYTES_PER_ROW_YEAR * size * years)
+
+                principal = inputs['purchase_price_per_unit'] * inputs['units'] * inputs['loan_to_value_ratio'] / 100
+                _, measurement = measure(
+                    'calculate_monthly_debt_payment', size, financial_calculations.calculate_monthly_debt_payment,
+                    principal, inputs['interest_rate'], inputs['amortization_period_years']
+                )
+                self.assert_within(measurement, 8 * 8 * size)
+                _, measurement = measure(
+                    'calculate_loan_balance', size, financial_calculations.calculate_loan_balance,
+                    principal[:, None], inputs['interest_rate'][:, None], inputs['amortization_period_years'][:, None], np.arange(0, 121, 12)
+                )
+                self.assert_within(measurement, 8 * 8 * size * 11)
+
+    def test_scalar_functions_per_property(self):
+        def underwrite(inputs, row):
+            values = {name: column[row].item() for name, column in inputs.items()}
+            acquisition = financial_calculations.calculate_acquisition_cash_flow(values['purchase_price_per_unit'], values['units'], values['closing_costs'])
+            operating = financial_calculations.calculate_operating_cash_flows(
+                values['in_place_rent'], values['gross_square_feet'], values['occupancy_rate'], values['operating_expenses'],
+                values['rent_growth_rate'], values['vacancy_rate'], values['holding_period_years']
+            )
+            refinancing = financial_calculations.calculate_refinancing_cash_flow(operating[-1], values['going_out_cap_rate'], values['loan_to_value_ratio'], values['loan_closing_fees_percentage'])
+            sale = financial_calculations.calculate_sale_cash_flow(operating[-1], values['going_out_cap_rate'], values['sale_fees'])
+            principal = -acquisition * values['loan_to_value_ratio'] / 100
+            monthly = financial_calculations.calculate_debt_payments(principal, values['interest_rate'], values['amortization_period_years'], values['holding_period_years'])
+            annual = [12 * payment for payment in monthly[::12]]
+            financial_calculations.calculate_comprehensive_cash_flows(acquisition, operating, refinancing, sale, annual)
+            with np.errstate(over='ignore', invalid='ignore'):
+                financial_calculations.calculate_levered_irr(acquisition + principal, operating[:-1], 0.0, operating[-1] + sale - principal, annual[:-1])
+            return financial_calculations.calculate_unlevered_irr([acquisition] + operating[:-1] + [operating[-1] + sale])
+
+        for size in BENCHMARK_SIZES:
+            properties = max(size // DEFAULT_LEASES_PER_PROPERTY, 1)
+            with self.subTest(leases=size):
+                inputs = synthetic_acquisition_inputs(properties)
+                irrs, measurement = measure(
+                    'financial_calculations scalar functions', properties,
+                    lambda: [underwrite(inputs, row) for row in range(properties)]
+                )
+                # Levered IRRs of deals that lose the equity may not exist; unlevered ones always do here
+                self.assertTrue(np.all(np.isfinite(irrs)))
+                # One float per property is kept; every intermediate list is released between properties
+                self.assert_within(measurement, 128 * properties)
+
+
+class PortfolioBenchmarkMixin:
+    """The ORM hot paths on a synthetic portfolio of ``leases`` leases."""
+
+    leases: int
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.portfolio = create_synthetic_portfolio(-(-cls.leases // DEFAULT_LEASES_PER_PROPERTY))
+        cls.user = get_user_model().objects.create_superuser('benchmark', 'benchmark@example.com', 'password')
+
+    def test_generate_cashflow_time_series(self):
+        leases = list(Lease.objects.select_related(*LEASE_INPUT_RELATIONS).order_by('pk')[:SAMPLE_LEASES])
+        series, measurement = measure(
+            'Lease.generate_cashflow_time_series', len(leases),
+            lambda: [lease.generate_cashflow_time_series() for lease in leases]
+        )
+        self.assertEqual(measurement.queries, 0)
+        self.assertEqual({item.months.size for item in series}, {120})
+        self.assertLessEqual(measurement.peak_bytes, BASE_MEMORY_BYTES)
+
+    def test_calculate_net_operating_income(self):
+        real_estate_property = RealEstateProperty.objects.get(pk=self.portfolio.property_ids[0])
+        _, measurement = measure('RealEstateProperty.calculate_net_operating_income', DEFAULT_LEASES_PER_PROPERTY, real_estate_property.calculate_net_operating_income)
+        # Synthetic leases escalate without a price index, so no index queries are added
+        self.assertLessEqual(measurement.queries, ROLLUP_QUERY_COUNT)
+        self.assertLessEqual(measurement.peak_bytes, BASE_MEMORY_BYTES)
+
+    def test_rollup_whole_portfolio(self):
+        rollup, measurement = measure('rollup_net_operating_income', self.leases, rollup_net_operating_income, RealEstateProperty.objects.all())
+        self.assertEqual(rollup.property_ids.size, len(self.portfolio.property_ids))
+        self.assertEqual(measurement.queries, ROLLUP_QUERY_COUNT)
+        self.assertLessEqual(measurement.peak_bytes, BASE_MEMORY_BYTES + ROLLUP_BYTES_PER_LEASE * self.leases)
+
+    def test_admin_changelist(self):
+        self.client.force_login(self.user)
+        for path in ('/admin/leases/lease/', '/admin/leases/realestateproperty/'):
+            response, measurement = measure(f'admin changelist {path}', self.leases, self.client.get, path)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(measurement.queries, CHANGELIST_QUERY_COUNT)
+            self.assertLessEqual(measurement.peak_bytes, CHANGELIST_MEMORY_BYTES)
+
+
+def _benchmark_size(leases: int):
+    """Skips a portfolio benchmark unless LEASES_BENCHMARK_SIZES includes its size."""
+    return unittest.skipUnless(leases in BENCHMARK_SIZES, f'Set LEASES_BENCHMARK_SIZES to include {leases} to run')
+
+
+# One TestCase per portfolio size, so each size builds its portfolio once
+@_benchmark_size(100)
+class PortfolioBenchmark100(PortfolioBenchmarkMixin, TestCase):
+    leases = 100
+
+
+@_benchmark_size(10_000)
+class PortfolioBenchmark10000(PortfolioBenchmarkMixin, TestCase):
+    leases = 10_000
+
+
+@_benchmark_size(1_000_000)
+class PortfolioBenchmark1000000(PortfolioBenchmarkMixin, TestCase):
+    leases = 1_000_000
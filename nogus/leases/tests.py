@@ -1,5 +1,88 @@
+import asyncio
+import csv
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date, timedelta
+from importlib.util import find_spec
+from io import StringIO
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
 from django.core.exceptions import ValidationError
-from .models import InvestmentStrategy
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_init
+from django.utils import timezone
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+import numpy as np
+
+from .absorption import absorption_curve, compare_absorption
+from .accounts import rebuild_closure, subtree_total, subtree_totals
+from .amortization import amortization_schedule, balloon_balance, payoff_amount, prepayment_penalty_percentage
+from .cpi import clear_index_cache, load_indexes, store_index_values
+from .debt_sizing import DEBT_SERVICE_COVERAGE, LOAN_TO_VALUE, MISSING_NET_OPERATING_INCOME, size_loans, size_portfolio_loans
+from .escalation import escalated_rents, escalation_curve, escalation_terms
+from .export import MANIFEST_NAME, export_projections
+from .financial_calculations import (
+    calculate_debt_payments,
+    calculate_levered_irr,
+    calculate_monthly_debt_payment,
+    calculate_operating_cash_flow_matrix,
+    calculate_operating_cash_flows,
+    calculate_refinancing_cash_flow,
+    calculate_unlevered_irr,
+)
+from .cashflows import month_grid, months_since
+from .goal_seek import goal_seek, max_bid_prices
+from .irr import solve_irr, solve_xirr
+from .jobs import ABANDONED_ERROR, job_task
+from .sensitivity import sensitivity_grid, tornado
+from .simulation import simulate_acquisition, simulate_returns
+from .synthetic import EXPENSE_TYPES, create_synthetic_portfolio
+from .underwriting import acquisition_inputs, calculate_levered_returns
+from .models import (
+    Account,
+    AccountClosure,
+    CashFlowProjection,
+    ChartOfAccounts,
+    DebtFinancing,
+    InvestmentStrategy,
+    Lease,
+    LeaseEscalationMethod,
+    LeaseDetail,
+    LeaseFinancialDetail,
+    LeasingStrategy,
+    LocationDetail,
+    MarketLeasingProfile,
+    OperatingExpense,
+    PriceIndex,
+    PriceIndexValue,
+    PropertyAcquisition,
+    PropertySale,
+    RealEstateProperty,
+    RefinancingDetails,
+    SaleDetails,
+    ValuationJob,
+)
+from .portfolio import portfolio_cashflows
+from .projections import (
+    LEASE_INPUT_RELATIONS,
+    get_lease_projection,
+    get_property_projection,
+    lease_cashflow_matrix,
+    projection_cache_stats,
+    reset_projection_cache_stats,
+)
+from .rent_roll import import_rent_roll
+from .revaluation import revalue_properties, stale_properties
+from .rollover import renewal_rents, rollover_matrix
+from .rollups import ROLLUP_INDEXED_QUERY_COUNT, ROLLUP_QUERY_COUNT, rollup_net_operating_income
 
 class InvestmentStrategyModelTest(TestCase):
     def test_create_investment_strategy(self):
@@ -193,3 +276,1398 @@ class PresidioSetupTest(TestCase):
             fees=200000
         )
 # Additional setup for Leasing Strategy, Refinancing Details, and Sale Details will be added later
+
+class OperatingCashFlowMatrixTest(SimpleTestCase):
+    def test_matches_scalar_function_per_property(self):
+        # Every row of the batched matrix equals the scalar projection of that property
+        matrix = calculate_operating_cash_flow_matrix(
+            in_place_rent=[2.5, 3.0],
+            gross_square_feet=[150000, 90000],
+            occupancy_rate=[60, 95],
+            operating_expenses=[1200000, 800000],
+            rent_growth_rate=[3, 2],
+            vacancy_rate=5,
+            holding_period_years=7
+        )
+        self.assertEqual(matrix.shape, (2, 7))
+        expected = calculate_operating_cash_flows(3.0, 90000, 95, 800000, 2, 5, 7)
+        np.testing.assert_allclose(matrix[1], expected)
+        # First-year NOI written out by hand for the Presidio inputs
+        self.assertAlmostEqual(matrix[0, 0], 2.5 * 150000 * 12 * 0.55 - 1200000)
+
+    def test_ragged_holding_periods_are_masked(self):
+        # Shorter holding periods are padded with zeros after their final year
+        matrix = calculate_operating_cash_flow_matrix(2.5, 150000, 60, 1200000, 3, 5, [3, 5])
+        self.assertEqual(matrix.shape, (2, 5))
+        np.testing.assert_array_equal(matrix[0, 3:], 0)
+        np.testing.assert_allclose(matrix[0, :3], matrix[1, :3])
+
+    def test_scalar_wrapper_returns_list(self):
+        cash_flows = calculate_operating_cash_flows(2.5, 150000, 60, 1200000, 3, 5, 7)
+        self.assertIsInstance(cash_flows, list)
+        self.assertEqual(len(cash_flows), 7)
+        self.assertEqual(calculate_operating_cash_flows(2.5, 150000, 60, 1200000, 3, 5, 0), [])
+
+class IRRSolverTest(SimpleTestCase):
+    def test_solves_every_row_together(self):
+        # A 10% bond and a 0% round trip solved in one call
+        result = solve_irr([
+            [-100, 10, 10, 110],
+            [-100, 50, 50, 0],
+        ])
+        np.testing.assert_allclose(result.irr, [0.10, 0.0], atol=1e-9)
+        self.assertTrue(result.converged.all())
+        self.assertFalse(result.multiple_roots.any())
+
+    def test_reports_rows_without_a_root(self):
+        result = solve_irr([[100, 10, 10], [-100, 60, 60]])
+        self.assertTrue(result.no_root[0])
+        self.assertTrue(np.isnan(result.irr[0]))
+        self.assertTrue(result.converged[1])
+
+    def test_reports_multiple_roots(self):
+        # Cash flows with roots at 10% and 20%
+        result = solve_irr([[-100, 230, -132]])
+        self.assertTrue(result.multiple_roots[0])
+        self.assertIn(round(result.irr[0], 6), (0.1, 0.2))
+
+    def test_bisection_fallback_and_warm_start(self):
+        # A guess far from the root still ends on the correct rate
+        cash_flows = [[-100, 0, 0, 0, 0, 1000]]
+        cold = solve_irr(cash_flows, guess=50)
+        self.assertAlmostEqual(cold.irr[0], 10 ** (1 / 5) - 1, places=8)
+        warm = solve_irr(cash_flows, guess=cold.irr)
+        self.assertLessEqual(warm.iterations, 2)
+
+    def test_xirr_with_irregular_dates(self):
+        result = solve_xirr([-1000, 1100], ['2023-01-01', '2024-01-01'])
+        self.assertAlmostEqual(result.irr[0], 0.10, places=9)
+
+    def test_financial_calculations_use_solver(self):
+        self.assertAlmostEqual(calculate_unlevered_irr([-100, 10, 10, 110]), 10.0, places=6)
+        levered_irr = calculate_levered_irr(-100, [20, 20], 0, 100, [10, 10])
+        self.assertAlmostEqual(levered_irr, solve_irr([-100, 10, 10, 0, 100]).irr[0] * 100)
+
+BASE_CASE_INPUTS = {
+    'purchase_price_per_unit': 315000,
+    'units': 150,
+    'closing_costs': 500000,
+    'in_place_rent': 3.0,
+    'gross_square_feet': 150000,
+    'occupancy_rate': 95,
+    'operating_expenses': 1500000,
+    'rent_growth_rate': 3,
+    'vacancy_rate': 5,
+    'holding_period_years': 7,
+    'loan_to_value_ratio': 60,
+    'interest_rate': 5.5,
+    'amortization_period_years': 30,
+    'loan_closing_fees_percentage': 1.0,
+    'going_out_cap_rate': 5.5,
+    'sale_fees': 200000,
+}
+
+class LeveredReturnsTest(SimpleTestCase):
+    def test_all_equity_matches_unlevered_irr(self):
+        inputs = dict(BASE_CASE_INPUTS, loan_to_value_ratio=0)
+        returns = calculate_levered_returns(**inputs)
+        noi = calculate_operating_cash_flows(3.0, 150000, 95, 1500000, 3, 5, 7)
+        sale = noi[-1] / 0.055 - 200000
+        cash_flows = [-(315000 * 150 + 500000)] + noi[:-1] + [noi[-1] + sale]
+        self.assertAlmostEqual(float(returns.irr), calculate_unlevered_irr(cash_flows), places=6)
+
+    def test_inputs_are_broadcast(self):
+        inputs = dict(BASE_CASE_INPUTS, going_out_cap_rate=np.array([[5.0], [6.0]]), rent_growth_rate=[1, 2, 3])
+        returns = calculate_levered_returns(**inputs)
+        self.assertEqual(returns.irr.shape, (2, 3))
+        self.assertEqual(returns.equity_cash_flows.shape, (2, 3, 8))
+        # Lower exit cap rates and faster rent growth both raise the IRR
+        self.assertTrue((returns.irr[0] > returns.irr[1]).all())
+        self.assertTrue((np.diff(returns.irr, axis=1) > 0).all())
+
+    def test_rejects_holding_periods_under_a_year(self):
+        with self.assertRaises(ValueError):
+            calculate_levered_returns(**dict(BASE_CASE_INPUTS, holding_period_years=[7, 0]))
+
+    def test_given_operating_cash_flows_replace_the_model(self):
+        noi = calculate_operating_cash_flow_matrix(3.0, 150000, 95, 1500000, 3, 5, 7)
+        modelled = calculate_levered_returns(**BASE_CASE_INPUTS)
+        given = calculate_levered_returns(**dict(BASE_CASE_INPUTS, in_place_rent=0, operating_expenses=0), operating_cash_flows=noi[0])
+        np.testing.assert_allclose(given.equity_cash_flows, modelled.equity_cash_flows)
+        with self.assertRaises(ValueError):
+            calculate_levered_returns(**dict(BASE_CASE_INPUTS, holding_period_years=8), operating_cash_flows=noi[0])
+
+
+class MonteCarloSimulationTest(TestCase):
+    def test_reproducible_from_seed_across_workers(self):
+        inline = simulate_returns(BASE_CASE_INPUTS, draws=5000, seed=7, chunk_size=1000, workers=1)
+        pooled = simulate_returns(BASE_CASE_INPUTS, draws=5000, seed=7, chunk_size=1000, workers=2)
+        self.assertEqual(inline.irr.shape, (5000,))
+        np.testing.assert_array_equal(inline.irr, pooled.irr)
+        np.testing.assert_array_equal(inline.equity_multiple, pooled.equity_multiple)
+
+    def test_fixed_distributions_reproduce_base_case(self):
+        result = simulate_returns(BASE_CASE_INPUTS, draws=10, distributions={'interest_rate': 5.5}, seed=1, workers=1)
+        base_case = calculate_levered_returns(**BASE_CASE_INPUTS)
+        np.testing.assert_allclose(result.irr, base_case.irr)
+        self.assertAlmostEqual(result.summary()['irr']['p50'], float(base_case.irr))
+
+    def test_simulates_property_acquisition(self):
+        property_acquisition = PropertyAcquisition.objects.create(
+            property_name="Franklin's Tower",
+            units=150,
+            gross_square_feet=150000,
+            net_rentable_square_feet=120000,
+            occupancy_rate=95,
+            purchase_price_per_unit=315000
+        )
+        with self.assertRaises(ValueError):
+            acquisition_inputs(property_acquisition)
+        SaleDetails.objects.create(property_acquisition=property_acquisition, going_out_cap_rate=5.5, fees=200000)
+        result = simulate_acquisition(
+            property_acquisition, draws=1000, seed=3, workers=1,
+            in_place_rent=3.0, operating_expenses=1500000, rent_growth_rate=3, vacancy_rate=5
+        )
+        self.assertEqual(result.irr.size, 1000)
+        self.assertTrue(np.isfinite(result.irr).all())
+
+class SensitivityAnalysisTest(SimpleTestCase):
+    def test_grid_cells_match_individual_scenarios(self):
+        grid = sensitivity_grid(BASE_CASE_INPUTS, 'going_out_cap_rate', [5.0, 5.5, 6.0], 'rent_growth_rate', [2, 3])
+        self.assertEqual(grid.irr.shape, (3, 2))
+        self.assertEqual(grid.row_input, 'going_out_cap_rate')
+        np.testing.assert_array_equal(grid.column_values, [2, 3])
+        cell = calculate_levered_returns(**dict(BASE_CASE_INPUTS, going_out_cap_rate=6.0, rent_growth_rate=2))
+        self.assertAlmostEqual(grid.irr[2, 0], float(cell.irr), places=8)
+
+    def test_grid_rejects_unknown_inputs(self):
+        with self.assertRaises(ValueError):
+            sensitivity_grid(BASE_CASE_INPUTS, 'loan_amount', [60], 'interest_rate', [5])
+        with self.assertRaises(ValueError):
+            sensitivity_grid(BASE_CASE_INPUTS, 'max_loan_to_value_ratio', [60], 'loan_to_value_ratio', [50])
+
+    def test_accepts_model_field_names(self):
+        grid = sensitivity_grid(BASE_CASE_INPUTS, 'interest_rate', [5, 6], 'max_loan_to_value_ratio', [50, 70])
+        self.assertEqual(grid.column_input, 'max_loan_to_value_ratio')
+        np.testing.assert_allclose(grid.irr, sensitivity_grid(BASE_CASE_INPUTS, 'interest_rate', [5, 6], 'loan_to_value_ratio', [50, 70]).irr)
+        bars = tornado(BASE_CASE_INPUTS, ranges={'max_loan_to_value_ratio': (50, 70)})
+        self.assertEqual(bars[0].input, 'max_loan_to_value_ratio')
+        self.assertGreater(bars[0].swing, 0)
+
+    def test_tornado_is_ranked_by_swing(self):
+        bars = tornado(BASE_CASE_INPUTS)
+        swings = [bar.swing for bar in bars]
+        self.assertEqual(swings, sorted(swings, reverse=True))
+        self.assertNotIn('holding_period_years', [bar.input for bar in bars])
+        bars = tornado(BASE_CASE_INPUTS, ranges={'interest_rate': (4.5, 6.5), 'sale_fees': (100000, 300000)})
+        self.assertEqual(bars[0].input, 'interest_rate')
+        self.assertGreater(bars[0].low_irr, bars[0].high_irr)
+
+class AmortizationScheduleTest(SimpleTestCase):
+    def test_schedule_splits_payments_for_many_loans(self):
+        schedule = amortization_schedule([1000000, 500000], [3.5, 0], 30, [7, 5])
+        self.assertEqual(schedule.payment.shape, (2, 84))
+        self.assertAlmostEqual(schedule.payment[0, 0], calculate_debt_payments(1000000, 3.5, 30, 7)[0])
+        self.assertAlmostEqual(schedule.interest[0, 0], 1000000 * 0.035 / 12)
+        np.testing.assert_allclose(schedule.interest + schedule.principal, schedule.payment)
+        # The balance falls by exactly the principal repaid each month
+        np.testing.assert_allclose(1000000 - schedule.principal[0].cumsum(), schedule.balance[0])
+        # Months past the shorter term are zero, with the remainder due as a balloon
+        np.testing.assert_array_equal(schedule.payment[1, 60:], 0)
+        self.assertAlmostEqual(schedule.balloon_balance[1], 500000 - 60 * 500000 / 360)
+        self.assertAlmostEqual(schedule.balloon_balance[0], schedule.balance[0, -1])
+        self.assertAlmostEqual(float(balloon_balance(1000000, 3.5, 30, 7)), schedule.balloon_balance[0])
+
+    def test_step_down_prepayment_penalty(self):
+        np.testing.assert_array_equal(prepayment_penalty_percentage([0, 11, 12, 47, 48], 4), [4, 4, 3, 1, 0])
+        np.testing.assert_array_equal(prepayment_penalty_percentage([6, 60], 4, flat_percentage=2), [2, 0])
+        balance = amortization_schedule(1000000, 3.5, 30, 7).balance[0]
+        self.assertAlmostEqual(float(payoff_amount(1000000, 3.5, 30, 24, 4)), balance[23] * 1.02)
+        self.assertAlmostEqual(float(payoff_amount(1000000, 3.5, 30, 84, 4)), balance[83])
+
+class PropertyRollupTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.escalation_method = LeaseEscalationMethod.objects.create(CPI_method='lease_year', review_option='sales_review')
+        cls.properties = [
+            RealEstateProperty.objects.create(
+                name=f'Property {index}',
+                operating_expenses=1000,
+                management_fee_percentage=5,
+                real_estate_taxes=200,
+                utilities=100
+            )
+            for index in range(3)
+        ]
+        for index, real_estate_property in enumerate(cls.properties[:2]):
+            for lease_number in range(5):
+                financial_details = LeaseFinancialDetail.objects.create(
+                    initial_rent_method='per_sqft' if lease_number % 2 else 'fixed',
+                    initial_rent_fixed_amount=1000 * (lease_number + 1),
+                    initial_rent_per_sqft=2.5,
+                    annual_rent_escalation_method='cpi' if lease_number < 3 else 'fixed',
+                    annual_rent_escalation=3
+                )
+                Lease.objects.create(
+                    real_estate_property=real_estate_property,
+                    tenant_name=f'Tenant {index}-{lease_number}',
+                    leased_area=800,
+                    financial_details=financial_details,
+                    escalation_method=cls.escalation_method if lease_number < 2 else None
+                )
+
+    def test_matches_per_lease_calculation(self):
+        rollup = rollup_net_operating_income(RealEstateProperty.objects.all(), month=18).as_dict()
+        for real_estate_property in self.properties:
+            gross_income = sum(lease.calculate_monthly_cashflow(18) for lease in real_estate_property.leases.all())
+            expected = gross_income - (1000 + 0.05 * gross_income) - 200 - 100
+            self.assertAlmostEqual(rollup[real_estate_property.pk], expected)
+            self.assertAlmostEqual(real_estate_property.calculate_net_operating_income(18), expected)
+        # A property without leases only carries its expenses
+        self.assertAlmostEqual(rollup[self.properties[2].pk], -1300)
+
+    def test_query_count_is_constant(self):
+        with self.assertNumQueries(ROLLUP_QUERY_COUNT):
+            rollup_net_operating_income(RealEstateProperty.objects.all())
+        with self.assertNumQueries(1):
+            self.properties[0].calculate_net_operating_income()
+
+class LeaseCashFlowTimeSeriesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+        cls.lease = Lease.objects.create(
+            real_estate_property=real_estate_property,
+            tenant_name='Tenant',
+            lease_start_date=date(2024, 1, 31),
+            lease_end_date=date(2026, 1, 30),
+            financial_details=LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=1000),
+            escalation_method=LeaseEscalationMethod.objects.create(CPI_method='lease_year'),
+            analysis_begin_date=date(2023, 12, 15),
+            length_of_analysis_years=100,
+            length_of_analysis_months=0
+        )
+
+    def test_month_grid_stays_on_calendar_months(self):
+        months = month_grid(date(2024, 1, 31), date(2024, 12, 1))
+        self.assertEqual(months.size, 12)
+        self.assertEqual(str(months[1]), '2024-02')
+        self.assertEqual(str(months[-1]), '2024-12')
+
+    def test_series_follows_lease_term(self):
+        series = self.lease.generate_cashflow_time_series(date(2023, 12, 1), date(2026, 3, 1))
+        self.assertEqual(series.months.size, 28)
+        self.assertEqual(series.cashflows[0], 0)
+        self.assertAlmostEqual(series.cashflows[1], self.lease.calculate_monthly_cashflow(0))
+        self.assertAlmostEqual(series.cashflows[13], self.lease.calculate_monthly_cashflow(12))
+        np.testing.assert_array_equal(series.cashflows[26:], 0)
+
+    def test_streamed_chunks_match_full_series(self):
+        full = self.lease.generate_cashflow_time_series()
+        self.assertEqual(full.months.size, 1200)
+        chunks = list(self.lease.iter_cashflow_time_series(chunk_months=500))
+        self.assertEqual([chunk.months.size for chunk in chunks], [500, 500, 200])
+        np.testing.assert_array_equal(np.concatenate([chunk.months for chunk in chunks]), full.months)
+        np.testing.assert_array_equal(np.concatenate([chunk.cashflows for chunk in chunks]), full.cashflows)
+
+class EscalationCurveTest(SimpleTestCase):
+    def test_fixed_percentage_steps_on_anniversaries(self):
+        curve = escalation_curve('fixed', 3.0, months=36)
+        np.testing.assert_allclose(curve.multiplier[[0, 11, 12, 24]], [1, 1, 1.03, 1.03 ** 2])
+        self.assertFalse(curve.multiplier.flags.writeable)
+
+    def test_step_and_cpi_timing(self):
+        np.testing.assert_array_equal(escalation_curve('step', step_amount=50, months=25).increment[[0, 12, 24]], [0, 50, 100])
+        # A lease starting in October first resets in January under calendar-year CPI
+        calendar = escalation_curve('cpi', 2.0, cpi_method='calendar_year', start_month_of_year=10, months=24)
+        self.assertEqual(calendar.multiplier[2], 1)
+        self.assertAlmostEqual(calendar.multiplier[3], 1.02)
+        mid_lease = escalation_curve('cpi', 2.0, cpi_method='mid_lease', term_months=60, months=60)
+        self.assertEqual(mid_lease.multiplier[29], 1)
+        self.assertAlmostEqual(mid_lease.multiplier[30], 1.02 ** 2.5)
+
+    def test_ratchets(self):
+        higher = escalation_curve('fixed', -2.0, review_option='partial_ratchet_higher', months=36)
+        np.testing.assert_array_equal(higher.multiplier, 1)
+        lower = escalation_curve('fixed', 2.0, review_option='partial_ratchet_lower', months=36)
+        np.testing.assert_array_equal(lower.multiplier, 1)
+
+    def test_leases_sharing_terms_share_a_curve(self):
+        escalation_curve.cache_clear()
+        terms = escalation_terms(
+            ['fixed', 'fixed', 'step'], [3.0, 3.0, 0], [0, 0, 25], None, None,
+            ['2024-01-01', '2023-06-01', '2024-01-01'], ['2029-01-01', '2030-01-01', '2029-01-01']
+        )
+        rents = escalated_rents([1000, 2000, 1000], terms, np.arange(24)[None, :].repeat(3, axis=0))
+        self.assertEqual(escalation_curve.cache_info().currsize, 2)
+        self.assertAlmostEqual(rents[1, 12], 2060)
+        self.assertAlmostEqual(rents[2, 23], 1025)
+
+class ProjectionCacheTest(TestCase):
+    def setUp(self):
+        reset_projection_cache_stats()
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+        self.other_property = RealEstateProperty.objects.create(name='Other')
+        self.escalation_method = LeaseEscalationMethod.objects.create(CPI_method='lease_year')
+        self.market_leasing_profile = MarketLeasingProfile.objects.create(market_rent=30)
+        self.lease = Lease.objects.create(
+            real_estate_property=self.real_estate_property,
+            tenant_name='Tenant',
+            lease_start_date=date(2024, 1, 1),
+            lease_end_date=date(2026, 12, 31),
+            financial_details=LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=1000, annual_rent_escalation=3),
+            escalation_method=self.escalation_method,
+            market_leasing_profile=self.market_leasing_profile,
+            analysis_begin_date=date(2024, 1, 1),
+            length_of_analysis_years=3,
+            length_of_analysis_months=0
+        )
+        OperatingExpense.objects.create(real_estate_property=self.real_estate_property, expense_type='tax', amount=250, date=date(2024, 3, 15))
+
+    def test_hits_check_inputs_without_recomputing(self):
+        projection = get_property_projection(self.real_estate_property)
+        series = projection.as_series()
+        self.assertEqual(series.months.size, 36)
+        self.assertAlmostEqual(series.cashflows[2], 750)
+        self.assertAlmostEqual(series.cashflows[12], 1030)
+        # The leases, the expenses and the projection
+        with self.assertNumQueries(3):
+            cached = get_property_projection(self.real_estate_property)
+        self.assertEqual(cached.fingerprint, projection.fingerprint)
+        self.assertEqual(projection_cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_lease_projection_matches_time_series(self):
+        series = get_lease_projection(self.lease).as_series()
+        np.testing.assert_array_equal(series.cashflows, self.lease.generate_cashflow_time_series().cashflows)
+
+    def test_input_changes_invalidate_projections(self):
+        # Each change and whether the lease's own projection survives it
+        changes = [
+            (lambda: self.lease.financial_details.save(), False),
+            (lambda: self.escalation_method.save(), False),
+            (lambda: self.market_leasing_profile.save(), False),
+            (lambda: self.lease.save(), False),
+            (lambda: OperatingExpense.objects.create(real_estate_property=self.real_estate_property, expense_type='tax', amount=1, date=date(2024, 1, 1)), True),
+        ]
+        for change, lease_projection_kept in changes:
+            get_lease_projection(self.lease)
+            get_property_projection(self.real_estate_property)
+            self.assertEqual(CashFlowProjection.objects.count(), 2)
+            change()
+            self.assertFalse(CashFlowProjection.objects.filter(real_estate_property=self.real_estate_property).exists())
+            self.assertEqual(CashFlowProjection.objects.filter(lease=self.lease).exists(), lease_projection_kept)
+
+    def test_unrelated_changes_keep_projections(self):
+        get_property_projection(self.real_estate_property)
+        OperatingExpense.objects.create(real_estate_property=self.other_property, expense_type='tax', amount=1, date=date(2024, 1, 1))
+        self.assertEqual(CashFlowProjection.objects.count(), 1)
+
+    def test_moving_a_lease_invalidates_both_properties(self):
+        get_property_projection(self.real_estate_property)
+        get_property_projection(self.other_property)
+        self.lease.real_estate_property = self.other_property
+        self.lease.save()
+        self.assertEqual(CashFlowProjection.objects.count(), 0)
+
+    def test_bulk_writes_invalidate_projections(self):
+        # Each write that sends no signals, the properties it changes and whether the lease's projection survives it
+        presidio, other = self.real_estate_property, self.other_property
+        writes = [
+            (lambda: LeaseFinancialDetail.objects.filter(pk=self.lease.financial_details_id).update(initial_rent_fixed_amount=2000), [presidio], False),
+            (lambda: MarketLeasingProfile.objects.bulk_update([self.market_leasing_profile], ['market_rent']), [presidio], False),
+            (lambda: Lease.objects.filter(pk=self.lease.pk).update(real_estate_property=other), [presidio, other], False),
+            (lambda: OperatingExpense.objects.filter(real_estate_property=presidio).update(amount=300), [presidio], True),
+            (lambda: Lease.objects.bulk_create([Lease(real_estate_property=presidio, tenant_name='New')]), [presidio], True),
+        ]
+        leases = Lease.objects.select_related(*LEASE_INPUT_RELATIONS)
+        for write, changed_properties, lease_projection_kept in writes:
+            get_lease_projection(leases.get(pk=self.lease.pk))
+            for real_estate_property in (presidio, other):
+                get_property_projection(real_estate_property)
+            write()
+            for real_estate_property in (presidio, other):
+                kept = CashFlowProjection.objects.filter(real_estate_property=real_estate_property).exists()
+                self.assertEqual(kept, real_estate_property not in changed_properties)
+            self.assertEqual(CashFlowProjection.objects.filter(lease=self.lease).exists(), lease_projection_kept)
+        self.assertAlmostEqual(get_lease_projection(leases.get(pk=self.lease.pk)).as_series().cashflows[0], 2000)
+
+    def test_stale_inputs_are_recomputed_on_read(self):
+        lease_projection = get_lease_projection(self.lease)
+        property_projection = get_property_projection(self.real_estate_property)
+        # The base manager sends no signals and skips the queryset's invalidation
+        LeaseFinancialDetail._base_manager.filter(pk=self.lease.financial_details_id).update(initial_rent_fixed_amount=2000)
+        self.assertEqual(CashFlowProjection.objects.count(), 2)
+        self.assertNotEqual(get_lease_projection(self.lease).fingerprint, lease_projection.fingerprint)
+        self.assertAlmostEqual(get_property_projection(self.real_estate_property).as_series().cashflows[0], 2000)
+        self.assertNotEqual(CashFlowProjection.objects.get(real_estate_property=self.real_estate_property).inputs_digest, property_projection.inputs_digest)
+        self.assertEqual(projection_cache_stats()['misses'], 4)
+
+    def test_loading_leases_runs_no_handlers(self):
+        self.assertFalse(post_init.has_listeners(Lease))
+
+
+class RentRollImportTest(TestCase):
+    def setUp(self):
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+
+    def rows(self, count, rent):
+        return [
+            {
+                'external_id': f'L{index}',
+                'property_id': str(self.real_estate_property.pk),
+                'tenant_name': f'Tenant {index}',
+                'lease_start_date': '2024-01-01',
+                'lease_end_date': '2028-12-31',
+                'leased_area': '1000',
+                'initial_rent_method': 'fixed',
+                'initial_rent_fixed_amount': str(rent),
+                'detail_date': '2024-01-01',
+                'rent': str(rent),
+            }
+            for index in range(count)
+        ]
+
+    def test_command_streams_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as handle:
+            rows = self.rows(25, 1000) + [{'external_id': ''}]
+            writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        self.addCleanup(os.remove, handle.name)
+        output = StringIO()
+        call_command('import_rent_roll', handle.name, chunk_size=10, stdout=output)
+        self.assertIn('25 created, 0 updated, 1 skipped', output.getvalue())
+        self.assertEqual(Lease.objects.count(), 25)
+        self.assertEqual(LeaseDetail.objects.count(), 25)
+        lease = Lease.objects.get(external_id='L3')
+        self.assertEqual(lease.lease_end_date, date(2028, 12, 31))
+        self.assertEqual(lease.financial_details.initial_rent_fixed_amount, 1000)
+
+    def test_reimport_updates_in_place(self):
+        import_rent_roll(self.rows(20, 1000), chunk_size=8)
+        get_property_projection(self.real_estate_property)
+        stats = import_rent_roll(self.rows(20, 1200), chunk_size=8)
+        self.assertEqual((stats.created, stats.updated), (0, 20))
+        self.assertEqual(Lease.objects.count(), 20)
+        self.assertEqual(LeaseFinancialDetail.objects.count(), 20)
+        self.assertEqual(set(LeaseDetail.objects.values_list('rent', flat=True)), {1200})
+        self.assertEqual(set(LeaseFinancialDetail.objects.values_list('initial_rent_fixed_amount', flat=True)), {1200})
+        # Bulk writes skip signals, so the importer drops stale projections itself
+        self.assertFalse(CashFlowProjection.objects.exists())
+
+    def test_partial_rows_keep_other_fields(self):
+        import_rent_roll(self.rows(1, 1000))
+        import_rent_roll([{'external_id': 'L0', 'tenant_name': 'Renamed'}])
+        lease = Lease.objects.get(external_id='L0')
+        self.assertEqual(lease.tenant_name, 'Renamed')
+        self.assertEqual(lease.leased_area, 1000)
+        self.assertEqual(lease.real_estate_property_id, self.real_estate_property.pk)
+
+    def test_empty_cells_keep_stored_values(self):
+        import_rent_roll(self.rows(1, 1000))
+        row = dict(self.rows(1, 1200)[0], lease_start_date='', leased_area='', initial_rent_fixed_amount='', property_id='', rent='')
+        import_rent_roll([row])
+        lease = Lease.objects.select_related('financial_details').get(external_id='L0')
+        self.assertEqual((lease.lease_start_date, lease.leased_area), (date(2024, 1, 1), 1000))
+        self.assertEqual(lease.financial_details.initial_rent_fixed_amount, 1000)
+        self.assertEqual(lease.real_estate_property_id, self.real_estate_property.pk)
+        self.assertEqual(LeaseDetail.objects.get().rent, 1000)
+
+    def test_unknown_property_names_the_row(self):
+        rows = self.rows(3, 1000)
+        rows[2]['property_id'] = '999999'
+        with self.assertRaisesMessage(ValueError, 'Row 4: no property with property_id 999999'):
+            import_rent_roll(rows)
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', newline='', delete=False) as handle:
+            writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        self.addCleanup(os.remove, handle.name)
+        with self.assertRaisesMessage(CommandError, 'Row 4'):
+            call_command('import_rent_roll', handle.name, stdout=StringIO())
+        self.assertFalse(Lease.objects.exists())
+
+
+class TimeSeriesQueryTest(TestCase):
+    def setUp(self):
+        real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+        self.leases = [Lease.objects.create(real_estate_property=real_estate_property, tenant_name=f'Tenant {index}') for index in range(3)]
+        LeaseDetail.objects.bulk_create([
+            LeaseDetail(lease=lease, date=date(2024, month, 1), rent=100 * index + month)
+            for index, lease in enumerate(self.leases) for month in range(1, 13)
+        ])
+
+    def test_window_as_arrays(self):
+        lease_ids = [self.leases[2].pk, self.leases[0].pk]
+        with self.assertNumQueries(1):
+            rows = LeaseDetail.objects.between(date(2024, 3, 1), date(2024, 5, 31), keys=lease_ids).as_arrays('rent')
+        self.assertEqual(rows.dtype.names, ('lease_id', 'date', 'rent'))
+        np.testing.assert_array_equal(rows['lease_id'], np.repeat(sorted(lease_ids), 3))
+        np.testing.assert_array_equal(rows['date'][:3], np.array(['2024-03-01', '2024-04-01', '2024-05-01'], dtype='datetime64[D]'))
+        np.testing.assert_array_equal(rows['rent'], [3, 4, 5, 203, 204, 205])
+
+    def test_window_uses_composite_index(self):
+        plan = LeaseDetail.objects.between(date(2024, 3, 1), date(2024, 5, 31), keys=[self.leases[0].pk]).explain()
+        self.assertIn('leasedetail_lease_date', plan)
+
+
+class LeaseAdminTest(TestCase):
+    def setUp(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+
+    def create_leases(self, count, end_date=date(2030, 6, 30)):
+        for index in range(count):
+            Lease.objects.create(
+                real_estate_property=self.real_estate_property,
+                tenant_name=f'Tenant {index}',
+                leased_area=1000,
+                lease_end_date=end_date,
+                financial_details=LeaseFinancialDetail.objects.create(initial_rent_method='per_sqft', initial_rent_per_sqft=2),
+                market_leasing_profile=MarketLeasingProfile.objects.create(market_rent=30),
+            )
+
+    def changelist_queries(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/leases/lease/' + query)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.create_leases(2)
+        _, few = self.changelist_queries()
+        self.create_leases(20)
+        response, many = self.changelist_queries()
+        self.assertEqual(few, many)
+        self.assertContains(response, '24000.0')
+        self.assertContains(self.client.get('/admin/leases/realestateproperty/'), '<td class="field-lease_count">22</td>', html=True)
+
+    def test_expiration_year_filter(self):
+        self.create_leases(2)
+        self.create_leases(3, end_date=date(2032, 1, 31))
+        response, _ = self.changelist_queries('?expiration_year=2032')
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_property_id_filter(self):
+        self.create_leases(2)
+        other = RealEstateProperty.objects.create(name='Other')
+        Lease.objects.create(real_estate_property=other, tenant_name='Elsewhere')
+        response, _ = self.changelist_queries(f'?property_id={other.pk}&property_type__exact=residential')
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, f'<input type="number" name="property_id" value="{other.pk}" min="1" placeholder="Property id">', html=True)
+        self.assertContains(response, '<input type="hidden" name="property_type__exact" value="residential">', html=True)
+        # The sidebar lists the selected property only, not every property
+        self.assertContains(response, '>Other</a>')
+        self.assertNotContains(response, '>Presidio</a>')
+        self.assertEqual(self.client.get('/admin/leases/lease/?property_id=north').status_code, 302)
+
+    def test_change_view_renders_related_rows(self):
+        self.create_leases(1)
+        lease = Lease.objects.get()
+        response = self.client.get(f'/admin/leases/lease/{lease.pk}/change/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Initial Rent: 2.0 per sq ft')
+        self.assertContains(self.client.get(f'/admin/leases/leasefinancialdetail/{lease.financial_details_id}/change/'), 'Initial Rent')
+
+
+class ProjectionApiTest(TestCase):
+    def setUp(self):
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+        self.other_property = RealEstateProperty.objects.create(name='Other')
+        self.lease = Lease.objects.create(
+            real_estate_property=self.real_estate_property,
+            tenant_name='Tenant',
+            lease_start_date=date(2024, 1, 1),
+            lease_end_date=date(2025, 12, 31),
+            financial_details=LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=1000, annual_rent_escalation=3),
+            analysis_begin_date=date(2024, 1, 1),
+            length_of_analysis_years=2,
+            length_of_analysis_months=0
+        )
+        self.user = get_user_model().objects.create_user('analyst', password='password')
+        self.user.user_permissions.set(Permission.objects.filter(codename__in=['view_lease', 'view_realestateproperty']))
+        self.client.force_login(self.user)
+
+    def test_requires_login_and_permission(self):
+        urls = [
+            f'/api/leases/{self.lease.pk}/projection/',
+            f'/api/properties/{self.real_estate_property.pk}/projection/',
+            '/api/properties/projections/',
+        ]
+        self.client.logout()
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(get_user_model().objects.create_user('guest', password='password'))
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_non_finite_values_are_null(self):
+        OperatingExpense.objects.create(real_estate_property=self.real_estate_property, date=date(2024, 3, 1), amount=float('inf'))
+        response = self.client.get(f'/api/properties/{self.real_estate_property.pk}/projection/')
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertIsNone(payload['cashflows'][2])
+        self.assertEqual(payload['cashflows'][0], 1000)
+
+    def test_lease_ndjson(self):
+        response = self.client.get(f'/api/leases/{self.lease.pk}/projection/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        payload = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(payload['lease_id'], self.lease.pk)
+        self.assertEqual(payload['months'][:2], ['2024-01', '2024-02'])
+        self.assertEqual(payload['cashflows'][12], 1030)
+
+    def test_property_csv(self):
+        response = self.client.get(f'/api/properties/{self.real_estate_property.pk}/projection/', HTTP_ACCEPT='text/csv')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0], ['real_estate_property_id', 'month', 'cashflow'])
+        self.assertEqual(rows[1], [str(self.real_estate_property.pk), '2024-01', '1000.0'])
+        self.assertEqual(len(rows), 25)
+
+    def test_unchanged_projection_is_not_modified(self):
+        url = f'/api/properties/{self.real_estate_property.pk}/projection/'
+        etag = self.client.get(url)['ETag']
+        # The session, the user and their permissions, the property, then its leases, expenses and projection
+        with self.assertNumQueries(8):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.lease.financial_details.annual_rent_escalation = 4
+        self.lease.financial_details.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_property_set_etag_once_cached(self):
+        url = f'/api/properties/projections/?id={self.real_estate_property.pk}&id={self.other_property.pk}'
+        cold = self.client.get(url)
+        self.assertNotIn('ETag', cold)
+        lines = b''.join(cold.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['real_estate_property_id'] for line in lines], [self.real_estate_property.pk, self.other_property.pk])
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_projection_stats(self):
+        reset_projection_cache_stats()
+        url = f'/api/properties/{self.real_estate_property.pk}/projection/'
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.client.get('/api/projections/stats/').status_code, 403)
+        self.user.user_permissions.add(Permission.objects.get(codename='view_cashflowprojection'))
+        stats = self.client.get('/api/projections/stats/').json()
+        self.assertEqual(stats, {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+
+class ValuationJobApiTest(TestCase):
+    OVERRIDES = {'in_place_rent': 3.0, 'operating_expenses': 1500000, 'rent_growth_rate': 3, 'vacancy_rate': 5}
+
+    def setUp(self):
+        self.property_acquisition = PropertyAcquisition.objects.create(
+            property_name="Franklin's Tower",
+            units=150,
+            gross_square_feet=150000,
+            net_rentable_square_feet=120000,
+            occupancy_rate=95,
+            purchase_price_per_unit=315000
+        )
+        SaleDetails.objects.create(property_acquisition=self.property_acquisition, going_out_cap_rate=5.5, fees=200000)
+        self.user = get_user_model().objects.create_user('analyst', password='password')
+        self.user.user_permissions.set(Permission.objects.filter(codename__in=['add_valuationjob', 'view_valuationjob', 'change_valuationjob']))
+        self.async_client.force_login(self.user)
+
+    async def submit(self, **body):
+        body.setdefault('property_acquisition', self.property_acquisition.pk)
+        return await self.async_client.post('/api/valuations/', json.dumps(body), content_type='application/json')
+
+    async def wait(self, job_id):
+        task = job_task(job_id)
+        if task is not None:
+            await task
+
+    async def test_levered_returns_job_persists_result(self):
+        response = await self.submit(parameters={'overrides': self.OVERRIDES})
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['id']
+        await self.wait(job_id)
+        status = (await self.async_client.get(f'/api/valuations/{job_id}/')).json()
+        self.assertEqual(status['status'], 'succeeded')
+        inputs = await sync_to_async(acquisition_inputs)(self.property_acquisition, **self.OVERRIDES)
+        self.assertAlmostEqual(status['result']['irr'], float(calculate_levered_returns(**inputs).irr))
+
+    async def test_simulation_job_streams_progress(self):
+        response = await self.submit(kind='simulation', parameters={'overrides': self.OVERRIDES, 'draws': 2000, 'chunk_size': 500, 'seed': 3})
+        job_id = response.json()['id']
+        await self.wait(job_id)
+        events = await self.async_client.get(f'/api/valuations/{job_id}/events/')
+        lines = [line async for line in events.streaming_content]
+        state = json.loads(lines[-1].decode()[len('data: '):])
+        self.assertEqual((state['status'], state['progress']), ('succeeded', 1.0))
+        self.assertIn('p50', state['result']['irr'])
+
+    async def test_cancel_job(self):
+        response = await self.submit(kind='simulation', parameters={'overrides': self.OVERRIDES, 'draws': 10_000_000, 'chunk_size': 1000})
+        job_id = response.json()['id']
+        task = job_task(job_id)
+        cancelled = await self.async_client.post(f'/api/valuations/{job_id}/cancel/')
+        self.assertEqual(cancelled.json()['status'], 'cancelled')
+        with self.assertRaises(asyncio.CancelledError):
+            await task
+        self.assertEqual((await self.async_client.post(f'/api/valuations/{job_id}/cancel/')).status_code, 409)
+
+    async def test_requires_login_and_permission(self):
+        job = await ValuationJob.objects.acreate(property_acquisition=self.property_acquisition, status=ValuationJob.SUCCEEDED)
+        requests = [
+            ('post', '/api/valuations/'),
+            ('get', f'/api/valuations/{job.pk}/'),
+            ('get', f'/api/valuations/{job.pk}/events/'),
+            ('post', f'/api/valuations/{job.pk}/cancel/'),
+        ]
+        await sync_to_async(self.async_client.logout)()
+        for method, url in requests:
+            self.assertEqual((await getattr(self.async_client, method)(url)).status_code, 302)
+        guest = await sync_to_async(get_user_model().objects.create_user)('guest', password='password')
+        await sync_to_async(self.async_client.force_login)(guest)
+        for method, url in requests:
+            self.assertEqual((await getattr(self.async_client, method)(url)).status_code, 403)
+        self.assertFalse(await ValuationJob.objects.exclude(pk=job.pk).aexists())
+
+    async def test_reaps_abandoned_jobs(self):
+        abandoned = await ValuationJob.objects.acreate(
+            property_acquisition=self.property_acquisition, status=ValuationJob.RUNNING, heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        live = await ValuationJob.objects.acreate(property_acquisition=self.property_acquisition)
+        with mock.patch('leases.jobs.MAX_PENDING_JOBS', 2):
+            response = await self.submit(parameters={'overrides': self.OVERRIDES})
+            self.assertEqual(response.status_code, 202)
+            await self.wait(response.json()['id'])
+        await abandoned.arefresh_from_db()
+        await live.arefresh_from_db()
+        self.assertEqual((abandoned.status, abandoned.error), (ValuationJob.FAILED, ABANDONED_ERROR))
+        self.assertEqual(live.status, ValuationJob.QUEUED)
+
+    async def test_rejects_invalid_simulation_parameters(self):
+        for parameters in (
+            {'draws': 0},
+            {'draws': 10 ** 12},
+            {'draws': '1000'},
+            {'chunk_size': -1},
+            {'distributions': {'interest_rate': ['bit_generator']}},
+            {'distributions': {'interest_rate': ['normal', 5]}},
+            {'distributions': {'interest_rate': ['triangular', 4, 5, 'high']}},
+            {'distributions': {'admin': 5}},
+        ):
+            with self.subTest(parameters=parameters):
+                response = await self.submit(kind='simulation', parameters={'overrides': self.OVERRIDES, **parameters})
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(await ValuationJob.objects.aexists())
+
+    async def test_rejects_incomplete_acquisition(self):
+        response = await self.submit()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(await ValuationJob.objects.aexists())
+
+
+class PortfolioRevaluationTest(TestCase):
+    def setUp(self):
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio', purchase_price=1000000)
+        self.other_property = RealEstateProperty.objects.create(name='Other', purchase_price=500000)
+        self.lease = Lease.objects.create(
+            real_estate_property=self.real_estate_property,
+            tenant_name='Tenant',
+            lease_start_date=date(2020, 1, 1),
+            lease_end_date=date(2040, 12, 31),
+            financial_details=LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=10000, annual_rent_escalation=0)
+        )
+
+    def test_revalues_noi_debt_and_irr(self):
+        self.other_property.debt_financing = DebtFinancing.objects.create(interest_rate=6, max_loan_to_value=60)
+        self.other_property.save()
+        timings = revalue_properties([self.real_estate_property.pk, self.other_property.pk], as_of=date(2024, 1, 1))
+        self.assertEqual(timings.properties, 2)
+
+        self.real_estate_property.refresh_from_db()
+        self.assertAlmostEqual(self.real_estate_property.net_operating_income, 120000)
+        self.assertEqual(self.real_estate_property.annual_debt_service, 0)
+        expected = solve_irr([-1000000] + [120000] * 6 + [120000 + 120000 / 0.055 - 200000]).irr[0] * 100
+        self.assertAlmostEqual(self.real_estate_property.levered_irr, expected)
+
+        self.other_property.refresh_from_db()
+        self.assertAlmostEqual(self.other_property.annual_debt_service, 12 * calculate_monthly_debt_payment(300000, 6, 30))
+        self.assertIsNotNone(self.other_property.revalued_at)
+
+    def test_command_resumes_from_stale_properties(self):
+        output = StringIO()
+        call_command('revalue_portfolio', workers=1, chunk_size=1, stdout=output)
+        self.assertIn('Revalued 2 properties', output.getvalue())
+        self.assertFalse(stale_properties().exists())
+
+        # Only the property whose lease changed is revalued again
+        self.lease.leased_area = 100
+        self.lease.save()
+        self.assertEqual(list(stale_properties().values_list('pk', flat=True)), [self.real_estate_property.pk])
+        call_command('revalue_portfolio', workers=1, stdout=output)
+        self.assertIn('Revalued 1 properties', output.getvalue())
+
+    def test_input_saves_and_deletes_mark_properties_stale(self):
+        self.real_estate_property.debt_financing = DebtFinancing.objects.create(interest_rate=6, max_loan_to_value=60)
+        self.real_estate_property.property_sale = PropertySale.objects.create(going_out_cap_rate=6, sale_date=date(2035, 1, 1))
+        self.real_estate_property.save()
+
+        def revalued_then(change):
+            revalue_properties([self.real_estate_property.pk, self.other_property.pk])
+            change()
+            return list(stale_properties().values_list('pk', flat=True))
+
+        # Saves limited to results leave the property fresh
+        self.assertEqual(revalued_then(lambda: self.real_estate_property.save(update_fields=['levered_irr'])), [])
+
+        def save_price():
+            self.real_estate_property.purchase_price = 1200000
+            self.real_estate_property.save(update_fields=['purchase_price'])
+        self.assertEqual(revalued_then(save_price), [self.real_estate_property.pk])
+        self.assertEqual(revalued_then(lambda: DebtFinancing.objects.get().delete()), [self.real_estate_property.pk])
+        self.assertEqual(revalued_then(lambda: PropertySale.objects.get().delete()), [self.real_estate_property.pk])
+
+    def test_since_skips_older_changes(self):
+        output = StringIO()
+        call_command('revalue_portfolio', workers=1, since='2999-01-01', stdout=output)
+        self.assertIn('Revaluing 0 properties', output.getvalue())
+        self.assertEqual(stale_properties().count(), 2)
+
+
+class PortfolioAggregationTest(TestCase):
+    def setUp(self):
+        self.properties = []
+        for name, city, property_type, start in (
+            ('North', 'Boston', 'commercial', date(2024, 1, 1)),
+            ('South', 'Boston', 'retail', date(2024, 6, 1)),
+            ('West', 'Denver', 'commercial', date(2025, 1, 1)),
+        ):
+            location = LocationDetail.objects.create(address='1 Main St', city=city, state='XX', zip_code='00000', country='US')
+            real_estate_property = RealEstateProperty.objects.create(name=name, location_details=location)
+            Lease.objects.create(
+                real_estate_property=real_estate_property,
+                tenant_name=name,
+                property_type=property_type,
+                lease_start_date=start,
+                lease_end_date=date(2026, 12, 31),
+                financial_details=LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=1000 * (len(self.properties) + 1)),
+                analysis_begin_date=start,
+                length_of_analysis_years=2,
+                length_of_analysis_months=0
+            )
+            self.properties.append(real_estate_property)
+        OperatingExpense.objects.create(real_estate_property=self.properties[0], expense_type='tax', amount=300, date=date(2024, 2, 1))
+
+    def property_series(self, real_estate_property, months):
+        series = get_property_projection(real_estate_property).as_series()
+        aligned = np.zeros(months.size)
+        aligned[months_since(months[0], series.months)] = series.cashflows
+        return aligned
+
+    def test_groups_by_city(self):
+        portfolio = portfolio_cashflows(RealEstateProperty.objects.all(), group_by='city')
+        self.assertEqual(portfolio.groups.tolist(), ['Boston', 'Denver'])
+        self.assertEqual(portfolio.months[0], np.datetime64('2024-01'))
+        boston = self.property_series(self.properties[0], portfolio.months) + self.property_series(self.properties[1], portfolio.months)
+        np.testing.assert_allclose(portfolio.as_dict()['Boston'], boston)
+        self.assertEqual(portfolio.as_dict()['Boston'][1], 700)
+
+    def test_cached_total_costs_two_queries(self):
+        portfolio_cashflows(RealEstateProperty.objects.all())
+        with self.assertNumQueries(2):
+            portfolio = portfolio_cashflows(RealEstateProperty.objects.all())
+        expected = sum(self.property_series(real_estate_property, portfolio.months) for real_estate_property in self.properties)
+        self.assertEqual(portfolio.groups.tolist(), ['total'])
+        np.testing.assert_allclose(portfolio.cashflows[0], expected)
+
+    def test_groups_leases_by_property_type(self):
+        portfolio = portfolio_cashflows(self.properties, group_by='property_type')
+        self.assertEqual(sorted(portfolio.groups.tolist()), ['commercial', 'retail'])
+        month = np.searchsorted(portfolio.months, np.datetime64('2025-03'))
+        self.assertEqual(portfolio.as_dict()['commercial'][month], 4000)
+
+
+class AccountClosureTest(TestCase):
+    def setUp(self):
+        self.chart = ChartOfAccounts.objects.create(name='Operating')
+        self.expenses = self.account('5000', None)
+        self.utilities = self.account('5100', self.expenses)
+        self.electricity = self.account('5110', self.utilities)
+        self.repairs = self.account('5200', self.expenses)
+        self.real_estate_property = RealEstateProperty.objects.create(name='Tower')
+        for account, amount, month in ((self.expenses, 10, 1), (self.utilities, 20, 1), (self.electricity, 40, 2), (self.repairs, 80, 3)):
+            OperatingExpense.objects.create(
+                real_estate_property=self.real_estate_property, expense_type=account.account_number,
+                amount=amount, date=date(2024, month, 1), account=account
+            )
+
+    def account(self, number, parent, **fields):
+        return Account.objects.create(
+            chart=self.chart, account_type='child' if parent else 'parent', parent_account=parent, account_number=number,
+            description=number, account_class='expense', line_item_type='detail', cost_code_type='operating', **fields
+        )
+
+    def test_subtree_totals(self):
+        self.assertEqual(subtree_total(self.expenses), 150)
+        self.assertEqual(subtree_total(self.utilities), 60)
+        self.assertEqual(subtree_total(self.utilities, start_date=date(2024, 2, 1)), 40)
+        self.assertEqual(subtree_total(self.expenses, real_estate_property_id=self.real_estate_property.pk + 1), 0)
+        totals = subtree_totals(Account.objects.filter(chart=self.chart))
+        self.assertEqual(totals, {self.expenses.pk: 150, self.utilities.pk: 60, self.electricity.pk: 40, self.repairs.pk: 80})
+
+    def test_subtree_total_is_one_query(self):
+        with self.assertNumQueries(1):
+            subtree_total(self.expenses, date(2024, 1, 1), date(2024, 12, 31))
+
+    def test_move_relinks_subtree(self):
+        self.utilities.parent_account = self.repairs
+        self.utilities.save()
+        self.assertEqual(subtree_total(self.repairs), 140)
+        self.assertEqual(AccountClosure.objects.get(ancestor=self.expenses, descendant=self.electricity).depth, 3)
+        self.utilities.parent_account = None
+        self.utilities.save()
+        self.assertEqual(subtree_total(self.expenses), 90)
+        self.assertEqual(subtree_total(self.utilities), 60)
+
+    def test_move_under_descendant_is_rejected(self):
+        self.expenses.parent_account = self.electricity
+        with self.assertRaises(ValidationError):
+            self.expenses.clean()
+        with self.assertRaises(ValueError):
+            self.expenses.save()
+
+    def test_delete_detaches_children(self):
+        self.utilities.delete()
+        self.electricity.refresh_from_db()
+        self.assertIsNone(self.electricity.parent_account_id)
+        self.assertEqual(subtree_total(self.expenses), 90)
+        self.assertEqual(subtree_total(self.electricity), 40)
+
+    def test_rebuild_after_bulk_import(self):
+        maintained = set(AccountClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth'))
+        leaf = Account.objects.bulk_create([Account(
+            chart=self.chart, account_type='child', parent_account=self.electricity, account_number='5111',
+            description='Meters', account_class='expense', line_item_type='detail', cost_code_type='operating'
+        )])[0]
+        AccountClosure.objects.all().delete()
+        call_command('rebuild_account_closure', chart=[self.chart.pk], stdout=StringIO())
+        leaf_links = {(self.expenses.pk, leaf.pk, 3), (self.utilities.pk, leaf.pk, 2), (self.electricity.pk, leaf.pk, 1), (leaf.pk, leaf.pk, 0)}
+        self.assertEqual(set(AccountClosure.objects.values_list('ancestor_id', 'descendant_id', 'depth')), maintained | leaf_links)
+        self.assertEqual(rebuild_closure(Account.objects.filter(chart=self.chart)), len(maintained) + 4)
+
+
+class LeaseRolloverTest(TestCase):
+    def setUp(self):
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+        self.months = np.arange('2024-01', '2026-03', dtype='datetime64[M]')
+
+    def lease(self, expiration_option='market', renewal_rate_option='prior', renewal_probability=0.5, **fields):
+        fields = {
+            'real_estate_property': self.real_estate_property,
+            'tenant_name': 'Tenant',
+            'lease_start_date': date(2024, 1, 1),
+            'lease_end_date': date(2024, 12, 31),
+            'leased_area': 600,
+            'rent_free_period': 1,
+            'financial_details': LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=1000, annual_rent_escalation=0),
+            'market_leasing_profile': MarketLeasingProfile.objects.create(market_rent=2),
+            **fields
+        }
+        return Lease.objects.create(
+            expiration_option=expiration_option, renewal_rate_option=renewal_rate_option, renewal_probability=renewal_probability, **fields
+        )
+
+    def test_renewal_rents(self):
+        np.testing.assert_allclose(
+            renewal_rents(['market', 'prior', 'lesser_of', 'greater_of'], [1000, 1000, 1000, 1000], [1200, 1200, 1200, 1200]),
+            [1200, 1000, 1000, 1200]
+        )
+
+    def test_market_blends_renewal_downtime_and_free_rent(self):
+        rollover = rollover_matrix([self.lease()], self.months, downtime_months=2)
+        np.testing.assert_allclose(rollover.cashflows[0, :12], 1000)
+        # Renewing half pays the prior rent; the new tenant arrives after two months and pays from the fourth
+        np.testing.assert_allclose(rollover.cashflows[0, 12:16], [500, 500, 500, 1100])
+        np.testing.assert_allclose(rollover.occupancy[0, 12:16], [0.5, 0.5, 1, 1])
+        # The second generation renews from the blended rent the first one ended on
+        np.testing.assert_allclose(rollover.cashflows[0, 24:26], [550, 550])
+
+    def test_every_expiration_option(self):
+        leases = [self.lease(option, 'greater_of') for option in ('renew', 'option', 'reabsorb', 'vacate')]
+        rollover = rollover_matrix(leases, self.months, downtime_months=0)
+        renew, option, reabsorb, vacate = rollover.cashflows
+        np.testing.assert_allclose(renew[12:], 1200)
+        np.testing.assert_allclose(option[12:24], 1200)
+        # After its option term the space rolls like 'market', half of it to a new tenant in a free month
+        np.testing.assert_allclose(option[24:], [600, 1200])
+        np.testing.assert_allclose(reabsorb[12:14], [0, 1200])
+        np.testing.assert_allclose(vacate[12:], 0)
+        np.testing.assert_allclose(rollover.occupancy[3, 12:], 0)
+
+    def test_matches_contract_cashflows_before_expiration(self):
+        lease = self.lease(lease_end_date=date(2030, 12, 31))
+        rollover = rollover_matrix([lease], self.months)
+        np.testing.assert_allclose(rollover.cashflows[0], lease_cashflow_matrix([lease], self.months)[0])
+        np.testing.assert_allclose(rollover.occupancy[0], 1)
+
+    def test_lease_expiration_methods(self):
+        lease = self.lease(renewal_rate_option='lesser_of')
+        self.assertEqual(lease.calculate_renewal_rate(11), 1000)
+        self.assertEqual(lease.handle_expiration(), 0.5 * 1000 + 0.5 * 1200)
+        self.assertEqual(self.lease('vacate').handle_expiration(), 0)
+
+
+class AbsorptionTest(TestCase):
+    def setUp(self):
+        self.property_acquisitions = []
+        for occupancy_rate, lease_up_rate_per_month in ((60, 10), (90, 1)):
+            property_acquisition = PropertyAcquisition.objects.create(
+                property_name='Tower',
+                units=100,
+                gross_square_feet=150000,
+                net_rentable_square_feet=120000,
+                occupancy_rate=occupancy_rate,
+                purchase_price_per_unit=315000
+            )
+            LeasingStrategy.objects.create(
+                property_acquisition=property_acquisition,
+                lease_up_rate_per_month=lease_up_rate_per_month,
+                stabilization_vacancy_rate=5
+            )
+            SaleDetails.objects.create(property_acquisition=property_acquisition, going_out_cap_rate=5.5, fees=200000)
+            self.property_acquisitions.append(property_acquisition)
+        self.overrides = {'in_place_rent': 2.5, 'operating_expenses': 1200000, 'rent_growth_rate': 3}
+
+    def test_leases_up_to_stabilized_occupancy(self):
+        curve = absorption_curve(100, [60, 98, 60], [10, 10, 0], 5, 8)
+        np.testing.assert_allclose(curve.occupancy[0], [60, 70, 80, 90, 95, 95, 95, 95])
+        np.testing.assert_allclose(curve.occupancy[1], 95)
+        np.testing.assert_allclose(curve.occupancy[2], 60)
+        np.testing.assert_array_equal(curve.stabilization_month, [4, 0, np.inf])
+
+    def test_flat_curve_matches_flat_occupancy(self):
+        flat = calculate_operating_cash_flow_matrix(2.5, 150000, 60, 1200000, 3, 5, 7)
+        curve = calculate_operating_cash_flow_matrix(2.5, 150000, 0, 1200000, 3, 0, 7, occupancy_curve=np.full(84, 55.0))
+        np.testing.assert_allclose(curve, flat)
+
+    def test_compares_acquisitions_and_speeds_in_one_call(self):
+        scenarios = compare_absorption(self.property_acquisitions, [1, 5, 20], **self.overrides)
+        self.assertEqual(scenarios.returns.irr.shape, (2, 3))
+        self.assertEqual(scenarios.curve.occupancy.shape, (2, 3, 84))
+        np.testing.assert_array_equal(scenarios.curve.stabilization_month[0], [35, 7, 2])
+        self.assertTrue(np.all(np.diff(scenarios.returns.irr, axis=1) >= 0))
+        # Leasing up from 90% earns less than the flat model starting at stabilized occupancy
+        stabilized = calculate_levered_returns(**acquisition_inputs(self.property_acquisitions[1], **self.overrides, occupancy_rate=100))
+        self.assertLess(scenarios.returns.irr[1, 0], float(stabilized.irr))
+
+    def test_uses_each_leasing_strategy_by_default(self):
+        scenarios = compare_absorption(self.property_acquisitions, **self.overrides)
+        np.testing.assert_array_equal(scenarios.lease_up_rates[:, 0], [10, 1])
+        np.testing.assert_array_equal(scenarios.curve.stabilization_month[:, 0], [4, 5])
+        self.property_acquisitions[0].leasing_strategy.delete()
+        with self.assertRaises(ValueError):
+            compare_absorption([PropertyAcquisition.objects.get(pk=self.property_acquisitions[0].pk)], **self.overrides)
+
+
+class PriceIndexTest(TestCase):
+    def setUp(self):
+        clear_index_cache()
+        self.index = PriceIndex.objects.create(name='CPI-U')
+        # 2024 at 100, a gap in February 2025, then 110 from March 2025
+        store_index_values(self.index, [(date(2024, month, 1), 100.0) for month in range(1, 13)])
+        store_index_values(self.index, [(date(2025, 1, 1), 105.0), (date(2025, 3, 1), 110.0)])
+        self.real_estate_property = RealEstateProperty.objects.create(name='Presidio')
+
+    def lease(self, cpi_method='lease_year', lease_start_date=date(2024, 1, 1), **fields):
+        return Lease.objects.create(
+            real_estate_property=self.real_estate_property,
+            tenant_name='Tenant',
+            lease_start_date=lease_start_date,
+            lease_end_date=date(2029, 12, 31),
+            financial_details=LeaseFinancialDetail.objects.create(
+                initial_rent_fixed_amount=1000, annual_rent_escalation_method='cpi', annual_rent_escalation=12
+            ),
+            escalation_method=LeaseEscalationMethod.objects.create(CPI_method=cpi_method, price_index=self.index, **fields)
+        )
+
+    def test_series_is_contiguous_and_cached(self):
+        series = load_indexes([self.index.pk])[self.index.pk]
+        self.assertEqual(series.first_month, np.datetime64('2024-01'))
+        np.testing.assert_allclose(series.values[12:], [105, 105, 110])
+        with self.assertNumQueries(1):
+            self.assertIs(load_indexes([self.index.pk])[self.index.pk], series)
+
+    def test_lease_year_resets_follow_the_index(self):
+        lease = self.lease()
+        rents = lease.calculate_monthly_rents(np.array([0, 11, 12, 24, 36]))
+        # Past the last value the index grows at the lease's assumed 12% a year
+        np.testing.assert_allclose(rents, [1000, 1000, 1050, 1100 * 1.12 ** (10 / 12), 1100 * 1.12 ** (22 / 12)])
+
+    def test_calendar_year_and_ratchet(self):
+        PriceIndexValue.objects.filter(date=date(2025, 3, 1)).update(value=90)
+        store_index_values(self.index, [(date(2026, 1, 1), 95.0)])
+        lease = self.lease('calendar_year', date(2024, 7, 1), review_option='partial_ratchet_higher')
+        rents = lease.calculate_monthly_rents(np.array([5, 6, 18]))
+        np.testing.assert_allclose(rents, [1000, 1050, 1050])
+
+    def test_matrix_rollup_and_invalidation(self):
+        lease = self.lease()
+        months = np.arange('2024-01', '2026-01', dtype='datetime64[M]')
+        matrix = lease_cashflow_matrix([Lease.objects.select_related('financial_details', 'escalation_method', 'market_leasing_profile').get()], months)
+        np.testing.assert_allclose(matrix[0], lease.calculate_monthly_rents(np.arange(24)))
+        self.assertEqual(rollup_net_operating_income(RealEstateProperty.objects.all(), month=12).as_dict()[self.real_estate_property.pk], 1050)
+
+        get_lease_projection(lease)
+        PriceIndexValue.objects.create(index=self.index, date=date(2025, 2, 1), value=107)
+        self.assertFalse(CashFlowProjection.objects.filter(lease=lease).exists())
+        self.assertEqual(load_indexes([self.index.pk])[self.index.pk].values[13], 107)
+
+    def test_rollup_query_count_with_index(self):
+        self.lease()
+        with self.assertNumQueries(ROLLUP_INDEXED_QUERY_COUNT):
+            rollup_net_operating_income(RealEstateProperty.objects.all(), month=12)
+        # Once the index is cached only its version check remains
+        with self.assertNumQueries(ROLLUP_QUERY_COUNT + 1):
+            rollup_net_operating_income(RealEstateProperty.objects.all(), month=12)
+
+
+class GoalSeekTest(TestCase):
+    def test_max_price_meets_each_target(self):
+        targets = np.array([8.0, 12.0, 16.0])
+        result = goal_seek(BASE_CASE_INPUTS, 'purchase_price_per_unit', targets)
+        self.assertEqual(result.iterations, 0)
+        np.testing.assert_allclose(result.irr, targets, atol=1e-6)
+        self.assertTrue(np.all(np.diff(result.values) < 0))
+        check = calculate_levered_returns(**dict(BASE_CASE_INPUTS, purchase_price_per_unit=result.values[1] * 1.01))
+        self.assertLess(float(check.irr), 12.0)
+
+    def test_exit_cap_rate_across_scenarios(self):
+        inputs = dict(BASE_CASE_INPUTS, purchase_price_per_unit=np.array([250000, 300000]))
+        result = goal_seek(inputs, 'going_out_cap_rate', 10.0)
+        np.testing.assert_allclose(result.irr, 10.0, atol=1e-6)
+        self.assertGreater(result.values[0], result.values[1])
+        # No cap rate values a property whose final NOI is negative
+        losing = dict(BASE_CASE_INPUTS, in_place_rent=0.1)
+        self.assertTrue(np.isnan(float(goal_seek(losing, 'going_out_cap_rate', 10.0).values)))
+
+    def test_bisects_other_inputs(self):
+        result = goal_seek(BASE_CASE_INPUTS, 'in_place_rent', [10.0, 15.0])
+        self.assertGreater(result.iterations, 0)
+        np.testing.assert_allclose(result.irr, [10.0, 15.0], atol=1e-5)
+        self.assertTrue(np.isnan(float(goal_seek(BASE_CASE_INPUTS, 'in_place_rent', 10.0, bounds=(0, 0.1)).values)))
+        with self.assertRaises(ValueError):
+            goal_seek(BASE_CASE_INPUTS, 'units', 10.0)
+
+    def test_operating_cash_flows_computed_once_for_financing_inputs(self):
+        with mock.patch('leases.underwriting.calculate_operating_cash_flow_matrix') as modelled:
+            result = goal_seek(dict(BASE_CASE_INPUTS, interest_rate=[5.0, 6.0]), 'loan_to_value_ratio', 20.0)
+        modelled.assert_not_called()
+        self.assertGreater(result.iterations, 0)
+        np.testing.assert_allclose(result.irr, 20.0, atol=1e-5)
+
+    def test_max_bid_prices_use_investment_strategy(self):
+        acquisitions = [
+            PropertyAcquisition.objects.create(
+                property_name=name, units=150, gross_square_feet=150000, net_rentable_square_feet=120000,
+                occupancy_rate=occupancy_rate, purchase_price_per_unit=315000
+            )
+            for name, occupancy_rate in (('Presidio', 95), ('Tower', 80))
+        ]
+        strategy = InvestmentStrategy.objects.create(target_irr=12, holding_period_years=5)
+        overrides = {name: BASE_CASE_INPUTS[name] for name in ('in_place_rent', 'operating_expenses', 'rent_growth_rate', 'vacancy_rate', 'going_out_cap_rate')}
+        result = max_bid_prices(acquisitions, strategy, **overrides)
+        self.assertEqual(result.values.shape, (2,))
+        self.assertGreater(result.values[0], result.values[1])
+        inputs = acquisition_inputs(acquisitions[1], purchase_price_per_unit=result.values[1], holding_period_years=5, **overrides)
+        self.assertAlmostEqual(float(calculate_levered_returns(**inputs).irr), 12, places=6)
+
+
+class DebtSizingTest(TestCase):
+    def test_lesser_constraint_binds(self):
+        # One property value against a grid of NOIs and lender rates
+        noi = np.array([[500000.0], [700000.0]])
+        rates = np.array([5.0, 8.0])
+        sizing = size_loans(10000000, noi, rates, 30, 65, 1.25, closing_fees_percentage=1)
+        self.assertEqual(sizing.loan_amount.shape, (2, 2))
+        np.testing.assert_allclose(sizing.ltv_loan_amount, 6500000)
+        np.testing.assert_allclose(sizing.loan_amount, np.minimum(sizing.ltv_loan_amount, sizing.dscr_loan_amount))
+        self.assertEqual(sizing.binding_constraint.tolist(), [[DEBT_SERVICE_COVERAGE] * 2, [LOAN_TO_VALUE, DEBT_SERVICE_COVERAGE]])
+        # A DSCR-sized loan's debt service is covered at exactly the minimum ratio
+        dscr_sized = sizing.binding_constraint == DEBT_SERVICE_COVERAGE
+        np.testing.assert_allclose((noi / sizing.annual_debt_service)[dscr_sized], 1.25)
+        expected_service = 12 * calculate_monthly_debt_payment(sizing.loan_amount, rates, 30)
+        np.testing.assert_allclose(sizing.annual_debt_service, expected_service)
+        np.testing.assert_allclose(sizing.net_proceeds, sizing.loan_amount * 0.99)
+
+    def test_edge_cases(self):
+        # No coverage requirement leaves loan-to-value binding; no NOI supports no loan
+        sizing = size_loans(1000000, [100000, 0], 6, 30, [70, 70], [0, 1.2])
+        np.testing.assert_allclose(sizing.loan_amount, [700000, 0])
+        self.assertEqual(sizing.binding_constraint.tolist(), [LOAN_TO_VALUE, DEBT_SERVICE_COVERAGE])
+        np.testing.assert_allclose(sizing.annual_debt_service[1], 0)
+
+    def test_refinancing_cash_flow_applies_coverage(self):
+        self.assertAlmostEqual(calculate_refinancing_cash_flow(100000, 5, 75, 1), 1500000 * 0.99)
+        limited = calculate_refinancing_cash_flow(100000, 5, 75, 1, min_debt_service_coverage_ratio=1.25, interest_rate=7)
+        expected = size_loans(2000000, 100000, 7, 30, 75, 1.25, 1).net_proceeds
+        self.assertAlmostEqual(limited, float(expected))
+        self.assertLess(limited, 1500000 * 0.99)
+
+    def test_portfolio_sizes_in_one_query(self):
+        financing = DebtFinancing.objects.create(interest_rate=6, term_years=10, max_loan_to_value=60, min_debt_service_coverage_ratio=1.3)
+        RealEstateProperty.objects.create(name='Presidio', purchase_price=5000000, net_operating_income=400000, debt_financing=financing)
+        RealEstateProperty.objects.create(name='Tower', purchase_price=2000000, net_operating_income=50000)
+        with self.assertNumQueries(1):
+            own_rates = size_portfolio_loans(RealEstateProperty.objects.all())
+        self.assertEqual(own_rates.sizing.loan_amount.shape, (2, 1))
+        np.testing.assert_allclose(own_rates.interest_rates[:, 0], [6, 0])
+        self.assertEqual(own_rates.sizing.binding_constraint[:, 0].tolist(), [LOAN_TO_VALUE, DEBT_SERVICE_COVERAGE])
+
+        grid = size_portfolio_loans(RealEstateProperty.objects.all(), interest_rates=[4, 6, 8])
+        self.assertEqual(grid.sizing.loan_amount.shape, (2, 3))
+        np.testing.assert_allclose(grid.sizing.loan_amount[0, 1], own_rates.sizing.loan_amount[0, 0])
+        self.assertTrue(np.all(np.diff(grid.sizing.dscr_loan_amount, axis=1) < 0))
+
+    def test_unrevalued_property_sizes_no_loan(self):
+        real_estate_property = RealEstateProperty.objects.create(name='Presidio', purchase_price=1000000)
+        sizing = size_portfolio_loans([real_estate_property]).sizing
+        self.assertTrue(np.isnan(sizing.loan_amount[0, 0]))
+        self.assertTrue(np.isnan(sizing.annual_debt_service[0, 0]))
+        self.assertEqual(sizing.binding_constraint[0, 0], MISSING_NET_OPERATING_INCOME)
+        np.testing.assert_allclose(sizing.ltv_loan_amount[0, 0], 700000)
+        # Without a coverage requirement the NOI is not needed
+        unconstrained = size_loans(1000000, np.nan, 6, 30, 70, 0)
+        np.testing.assert_allclose(unconstrained.loan_amount, 700000)
+        self.assertEqual(unconstrained.binding_constraint, LOAN_TO_VALUE)
+
+
+class ProjectionExportTest(TestCase):
+    def setUp(self):
+        self.properties = []
+        for name, start, rent in (('North', date(2024, 1, 1), 1000), ('South', date(2024, 6, 1), 2000)):
+            real_estate_property = RealEstateProperty.objects.create(name=name)
+            Lease.objects.create(
+                real_estate_property=real_estate_property,
+                tenant_name=name,
+                lease_start_date=start,
+                lease_end_date=date(2025, 12, 31),
+                financial_details=LeaseFinancialDetail.objects.create(initial_rent_fixed_amount=rent),
+                analysis_begin_date=start,
+                length_of_analysis_years=2,
+                length_of_analysis_months=0
+            )
+            self.properties.append(real_estate_property)
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, True)
+
+    def test_partitions_memory_map_without_database(self):
+        stats = export_projections(RealEstateProperty.objects.all(), self.root, formats=['npy'])
+        # Two years of each property plus two portfolio years
+        self.assertEqual((stats.partitions, stats.written, stats.unchanged), (6, 6, 0))
+        north = f'{self.root}/property_id={self.properties[0].pk}/year=2024'
+        months = np.load(f'{north}/months.npy', mmap_mode='r')
+        leases = np.load(f'{north}/leases.npy', mmap_mode='r')
+        self.assertIsInstance(leases, np.memmap)
+        self.assertEqual(months[0], np.datetime64('2024-01'))
+        self.assertEqual(leases.shape, (1, 12))
+        series = get_property_projection(self.properties[0]).as_series()
+        np.testing.assert_allclose(np.load(f'{north}/property.npy'), series.cashflows[:12])
+
+        total = np.load(f'{self.root}/portfolio/year=2025/total.npy', mmap_mode='r')
+        properties = np.load(f'{self.root}/portfolio/year=2025/properties.npy')
+        np.testing.assert_allclose(total, properties.sum(axis=0))
+        self.assertEqual(total[0], 3000)
+
+    def test_reexport_rewrites_changed_partitions(self):
+        export_projections(RealEstateProperty.objects.all(), self.root, formats=['npy'])
+        self.assertEqual(export_projections(self.properties, self.root, formats=['npy']).written, 0)
+
+        lease = Lease.objects.get(real_estate_property=self.properties[1])
+        lease.financial_details.initial_rent_fixed_amount = 2500
+        lease.financial_details.save()
+        stats = export_projections(RealEstateProperty.objects.all(), self.root, formats=['npy'])
+        # South's two years and both portfolio years change; North is left in place
+        self.assertEqual((stats.written, stats.unchanged), (4, 2))
+        with open(f'{self.root}/{MANIFEST_NAME}') as handle:
+            self.assertEqual(len(json.load(handle)), 6)
+
+        # North's lease now ends in 2024, so its 2025 partition is removed
+        lease = Lease.objects.get(real_estate_property=self.properties[0])
+        lease.lease_end_date = date(2024, 12, 31)
+        lease.save()
+        stats = export_projections(RealEstateProperty.objects.all(), self.root, formats=['npy'])
+        self.assertEqual(stats.removed, 1)
+        self.assertFalse(os.path.exists(f'{self.root}/property_id={self.properties[0].pk}/year=2025'))
+        with self.assertRaises(ValueError):
+            export_projections(RealEstateProperty.objects.all(), self.root, formats=['csv'])
+
+    def test_partial_export_keeps_portfolio_partitions(self):
+        export_projections(RealEstateProperty.objects.all(), self.root)
+        lease = Lease.objects.get(real_estate_property=self.properties[1])
+        lease.financial_details.initial_rent_fixed_amount = 2500
+        lease.financial_details.save()
+        stats = export_projections([self.properties[1]], self.root)
+        self.assertEqual((stats.partitions, stats.written, stats.removed), (2, 2, 0))
+        # The portfolio partitions still hold the last full export's totals
+        self.assertEqual(np.load(f'{self.root}/portfolio/year=2025/total.npy')[0], 3000)
+        with open(f'{self.root}/{MANIFEST_NAME}') as handle:
+            self.assertEqual(len(json.load(handle)), 6)
+
+    def test_prunes_deleted_properties(self):
+        export_projections(RealEstateProperty.objects.all(), self.root)
+        north = self.properties[0].pk
+        self.properties[0].delete()
+        stats = export_projections([self.properties[1]], self.root)
+        self.assertEqual(stats.removed, 2)
+        self.assertFalse(os.path.exists(f'{self.root}/property_id={north}'))
+        with open(f'{self.root}/{MANIFEST_NAME}') as handle:
+            self.assertFalse([path for path in json.load(handle) if path.startswith(f'property_id={north}/')])
+
+    def test_command_writes_npy_by_default(self):
+        call_command('export_projections', self.root, stdout=StringIO())
+        self.assertTrue(os.path.exists(f'{self.root}/portfolio/year=2024/total.npy'))
+        self.assertFalse(os.path.exists(f'{self.root}/portfolio/year=2024/cashflows.parquet'))
+
+    @unittest.skipUnless(find_spec('pyarrow'), 'Writing Parquet requires pyarrow')
+    def test_parquet_long_table(self):
+        import pyarrow.parquet as pq
+
+        export_projections(RealEstateProperty.objects.all(), self.root, formats=['parquet'])
+        north = pq.read_table(f'{self.root}/property_id={self.properties[0].pk}/year=2024/cashflows.parquet').to_pydict()
+        # A lease row and a property row per month
+        self.assertEqual(north['level'].count('lease'), 12)
+        self.assertEqual(north['level'].count('property'), 12)
+        self.assertEqual(north['cashflow'][0], 1000)
+        portfolio = pq.read_table(f'{self.root}/portfolio/year=2025/cashflows.parquet').to_pydict()
+        totals = [cashflow for level, cashflow in zip(portfolio['level'], portfolio['cashflow']) if level == 'total']
+        self.assertEqual(totals[0], 3000)
+
+
+class SeedPortfolioTest(TestCase):
+    def test_creates_wired_rows(self):
+        stats = create_synthetic_portfolio(3, leases_per_property=4, months=6, chunk_size=5)
+        self.assertEqual(len(stats.property_ids), 3)
+        self.assertEqual((stats.leases, stats.lease_details, stats.operating_expenses), (12, 72, 3 * len(EXPENSE_TYPES) * 6))
+        self.assertEqual(stats.rows, 3 + 24 + 72 + 90)
+        self.assertEqual(Lease.objects.filter(real_estate_property_id=stats.property_ids[2]).count(), 4)
+        self.assertEqual(LeaseDetail.objects.count(), 72)
+        self.assertEqual(OperatingExpense.objects.filter(real_estate_property_id=stats.property_ids[0]).count(), 30)
+        # Fields the seed does not draw are written with their defaults
+        self.assertFalse(OperatingExpense.objects.filter(account__isnull=False).exists())
+
+        # Detail rents follow each lease's own escalated rent within its term and are zero outside it
+        for lease in Lease.objects.select_related('financial_details')[:4]:
+            for detail in lease.details.order_by('date'):
+                month = int(months_since(lease.lease_start_date, np.datetime64(detail.date, 'M')))
+                in_term = month >= 0 and detail.date <= lease.lease_end_date
+                self.assertAlmostEqual(detail.rent, round(lease.calculate_monthly_rent(month), 2) if in_term else 0.0, places=2)
+
+    def test_seeded_and_command(self):
+        create_synthetic_portfolio(1, leases_per_property=3, months=2, seed=7)
+        first = list(LeaseDetail.objects.order_by('pk').values_list('rent', flat=True))
+        LeaseDetail.objects.all().delete()
+        create_synthetic_portfolio(1, leases_per_property=3, months=2, seed=7)
+        self.assertEqual(list(LeaseDetail.objects.order_by('pk').values_list('rent', flat=True)), first)
+
+        out = StringIO()
+        call_command('seed_portfolio', properties=2, leases_per_property=2, months=3, stdout=out)
+        self.assertIn('2 properties, 4 leases, 12 lease details', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed_portfolio', properties=1, start_date='soon', stdout=StringIO())
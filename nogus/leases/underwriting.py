@@ -0,0 +1,283 @@
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+from django.core.exceptions import ObjectDoesNotExist
+from numpy.typing import ArrayLike
+
+from .amortization import payoff_amount
+from .financial_calculations import (
+    calculate_monthly_debt_payment,
+    calculate_operating_cash_flow_matrix,
+    calculate_sale_cash_flow,
+)
+from .irr import solve_irr
+
+# Inputs of the levered acquisition model, in the order calculate_levered_returns accepts them
+ACQUISITION_INPUTS = (
+    'purchase_price_per_unit',
+    'units',
+    'closing_costs',
+    'in_place_rent',
+    'gross_square_feet',
+    'occupancy_rate',
+    'operating_expenses',
+    'rent_growth_rate',
+    'vacancy_rate',
+    'holding_period_years',
+    'loan_to_value_ratio',
+    'interest_rate',
+    'amortization_period_years',
+    'loan_closing_fees_percentage',
+    'going_out_cap_rate',
+    'sale_fees',
+    'prepayment_penalty_period_years',
+)
+
+# Acquisition inputs stored under another name on the PropertyAcquisition detail models
+MODEL_FIELD_INPUTS = {
+    'max_loan_to_value_ratio': 'loan_to_value_ratio',
+    'closing_fees_percentage': 'loan_closing_fees_percentage',
+    'stabilization_vacancy_rate': 'vacancy_rate',
+}
+
+
+class LeveredReturns(NamedTuple):
+    """The equity returns of one or many acquisition scenarios.
+
+    Attributes:
+        irr (np.ndarray): The levered IRR as a percentage, shaped like the broadcast inputs.
+        equity_multiple (np.ndarray): Total distributions divided by the equity invested.
+        equity_cash_flows (np.ndarray): The annual cash flows to equity, with years on the last axis.
+    """
+    irr: np.ndarray
+    equity_multiple: np.ndarray
+    equity_cash_flows: np.ndarray
+
+
+def acquisition_inputs(property_acquisition, **overrides) -> Dict[str, float]:
+    """Collects the base-case model inputs of a PropertyAcquisition and its related details.
+
+    Inputs that are not stored on the models, such as the in-place rent and the operating
+    expenses, must be passed as keyword overrides.
+
+    Args:
+        property_acquisition (PropertyAcquisition): The acquisition to underwrite.
+        **overrides: Values that replace or complete the stored inputs.
+
+    Returns:
+        Dict[str, float]: Every input of calculate_levered_returns keyed by name.
+
+    Raises:
+        ValueError: If an input is neither stored nor given as an override.
+    """
+    inputs = {
+        'purchase_price_per_unit': property_acquisition.purchase_price_per_unit,
+        'units': property_acquisition.units,
+        'closing_costs': 0.0,
+        'gross_square_feet': property_acquisition.gross_square_feet,
+        'occupancy_rate': property_acquisition.occupancy_rate,
+        'holding_period_years': 7,
+        'loan_to_value_ratio': 0.0,
+        'interest_rate': 0.0,
+        'amortization_period_years': 30,
+        'loan_closing_fees_percentage': 0.0,
+        'sale_fees': 0.0,
+        'prepayment_penalty_period_years': 0,
+    }
+
+    # Reverse one-to-one accessors raise when the related row does not exist
+    try:
+        inputs['vacancy_rate'] = property_acquisition.leasing_strategy.stabilization_vacancy_rate
+    except ObjectDoesNotExist:
+        pass
+    try:
+        refinancing_details = property_acquisition.refinancing_details
+        inputs['loan_to_value_ratio'] = refinancing_details.max_loan_to_value_ratio
+        inputs['interest_rate'] = refinancing_details.interest_rate
+        inputs['amortization_period_years'] = refinancing_details.amortization_period_years
+        inputs['loan_closing_fees_percentage'] = refinancing_details.closing_fees_percentage
+        inputs['prepayment_penalty_period_years'] = refinancing_details.prepayment_penalty_period_years
+    except ObjectDoesNotExist:
+        pass
+    try:
+        sale_details = property_acquisition.sale_details
+        inputs['going_out_cap_rate'] = sale_details.going_out_cap_rate
+        inputs['sale_fees'] = sale_details.fees
+    except ObjectDoesNotExist:
+        pass
+
+    inputs.update(overrides)
+    missing = [name for name in ACQUISITION_INPUTS if name not in inputs]
+    if missing:
+        raise ValueError(f'Missing acquisition inputs: {", ".join(missing)}')
+    return inputs
+
+
+def calculate_equity_cash_flows(
+    purchase_price_per_unit: ArrayLike,
+    units: ArrayLike,
+    closing_costs: ArrayLike,
+    in_place_rent: ArrayLike,
+    gross_square_feet: ArrayLike,
+    occupancy_rate: ArrayLike,
+    operating_expenses: ArrayLike,
+    rent_growth_rate: ArrayLike,
+    vacancy_rate: ArrayLike,
+    holding_period_years: ArrayLike,
+    loan_to_value_ratio: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    loan_closing_fees_percentage: ArrayLike,
+    going_out_cap_rate: ArrayLike,
+    sale_fees: ArrayLike,
+    prepayment_penalty_period_years: ArrayLike = 0,
+    occupancy_curve: Optional[ArrayLike] = None,
+    operating_cash_flows: Optional[ArrayLike] = None
+) -> np.ndarray:
+    """Calculates the annual cash flows to equity for every combination of broadcast acquisition inputs.
+
+    The loan is sized on the purchase price and held to the sale, when the outstanding
+    balance and any prepayment penalty are repaid from the sale proceeds. Each input may
+    be a scalar or an array; all of them are broadcast together and evaluated in one pass.
+
+    Args:
+        purchase_price_per_unit (ArrayLike): The purchase price per unit.
+        units (ArrayLike): The total number of units in the property.
+        closing_costs (ArrayLike): The additional acquisition closing costs.
+        in_place_rent (ArrayLike): The in-place rent per square foot per month.
+        gross_square_feet (ArrayLike): The total gross square feet in the property.
+        occupancy_rate (ArrayLike): The initial occupancy rate as a percentage.
+        operating_expenses (ArrayLike): The total operating expenses for the first year.
+        rent_growth_rate (ArrayLike): The annual rent growth rate as a percentage.
+        vacancy_rate (ArrayLike): The vacancy rate upon stabilization as a percentage.
+        holding_period_years (ArrayLike): The holding period in years.
+        loan_to_value_ratio (ArrayLike): The loan amount as a percentage of the purchase price.
+        interest_rate (ArrayLike): The annual loan interest rate as a percentage.
+        amortization_period_years (ArrayLike): The loan amortization period in years.
+        loan_closing_fees_percentage (ArrayLike): The loan closing fees as a percentage of the loan amount.
+        going_out_cap_rate (ArrayLike): The going-out capitalization rate used for sale valuation.
+        sale_fees (ArrayLike): The fees associated with the sale.
+        prepayment_penalty_period_years (ArrayLike): The loan's step-down prepayment penalty period in years.
+        occupancy_curve (Optional[ArrayLike]): Monthly occupancy percentages with months on the
+            last axis, broadcast against the other inputs, in place of the flat occupancy less vacancy.
+        operating_cash_flows (Optional[ArrayLike]): Annual operating cash flows with years on the
+            last axis, broadcast against the other inputs, in place of the modelled ones, such as
+            a property's NOI from its leases. The rent, occupancy, expense and growth inputs are then unused.
+
+    Returns:
+        np.ndarray: The equity cash flows with years on the last axis, year 0 being the acquisition.
+
+    Raises:
+        ValueError: If a holding period is shorter than one year, or longer than the operating cash flows given.
+    """
+    arrays = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in (
+        purchase_price_per_unit, units, closing_costs, in_place_rent, gross_square_feet,
+        occupancy_rate, operating_expenses, rent_growth_rate, vacancy_rate, holding_period_years,
+        loan_to_value_ratio, interest_rate, amortization_period_years, loan_closing_fees_percentage,
+        going_out_cap_rate, sale_fees, prepayment_penalty_period_years
+    )))
+    if occupancy_curve is not None:
+        # Scenario axes of the curve, such as lease-up speeds, broadcast like any other input
+        occupancy_curve = np.asarray(occupancy_curve, dtype=float)
+        arrays = np.broadcast_arrays(*arrays, np.empty(occupancy_curve.shape[:-1]))[:-1]
+    if operating_cash_flows is not None:
+        operating_cash_flows = np.asarray(operating_cash_flows, dtype=float)
+        arrays = np.broadcast_arrays(*arrays, np.empty(operating_cash_flows.shape[:-1]))[:-1]
+    shape = arrays[0].shape
+    (purchase_price_per_unit, units, closing_costs, in_place_rent, gross_square_feet,
+     occupancy_rate, operating_expenses, rent_growth_rate, vacancy_rate, holding_period_years,
+     loan_to_value_ratio, interest_rate, amortization_period_years, loan_closing_fees_percentage,
+     going_out_cap_rate, sale_fees, prepayment_penalty_period_years) = (array.ravel() for array in arrays)
+    holding_period_years = holding_period_years.astype(int)
+    if (holding_period_years < 1).any():
+        # The sale falls in the final held year, which a shorter hold does not have
+        raise ValueError('Holding periods must be at least one year')
+    rows = np.arange(holding_period_years.size)
+
+    if occupancy_curve is not None:
+        occupancy_curve = np.broadcast_to(occupancy_curve, shape + occupancy_curve.shape[-1:]).reshape(rows.size, -1)
+
+    # Operating cash flows for every scenario and year
+    if operating_cash_flows is not None:
+        if holding_period_years.max() > operating_cash_flows.shape[-1]:
+            raise ValueError('Holding periods cannot be longer than the operating cash flows given')
+        noi = np.broadcast_to(operating_cash_flows, shape + operating_cash_flows.shape[-1:]).reshape(rows.size, -1)
+    else:
+        noi = calculate_operating_cash_flow_matrix(
+            in_place_rent, gross_square_feet, occupancy_rate, operating_expenses,
+            rent_growth_rate, vacancy_rate, holding_period_years, occupancy_curve=occupancy_curve
+        )
+    held = np.arange(1, noi.shape[1] + 1) <= holding_period_years[:, None]
+
+    # Acquisition net of the loan proceeds
+    purchase_price = purchase_price_per_unit * units
+    loan_amount = purchase_price * loan_to_value_ratio / 100
+    acquisition_cash_flow = -(purchase_price + closing_costs) + loan_amount * (1 - loan_closing_fees_percentage / 100)
+
+    # Annual debt service while the property is held
+    annual_debt_service = 12 * calculate_monthly_debt_payment(loan_amount, interest_rate, amortization_period_years)
+    annual_debt_service = np.where(loan_amount > 0, annual_debt_service, 0.0)
+
+    # Sale proceeds net of the penalty-adjusted loan payoff in the final year
+    final_noi = noi[rows, holding_period_years - 1]
+    loan_payoff = payoff_amount(
+        loan_amount, interest_rate, amortization_period_years, holding_period_years * 12, prepayment_penalty_period_years
+    )
+    net_sale_proceeds = calculate_sale_cash_flow(final_noi, going_out_cap_rate, sale_fees) - np.where(loan_amount > 0, loan_payoff, 0.0)
+
+    equity_cash_flows = np.empty((rows.size, noi.shape[1] + 1))
+    equity_cash_flows[:, 0] = acquisition_cash_flow
+    equity_cash_flows[:, 1:] = np.where(held, noi - annual_debt_service[:, None], 0.0)
+    equity_cash_flows[rows, holding_period_years] += net_sale_proceeds
+
+    return equity_cash_flows.reshape(shape + (noi.shape[1] + 1,))
+
+
+def calculate_levered_returns(
+    purchase_price_per_unit: ArrayLike,
+    units: ArrayLike,
+    closing_costs: ArrayLike,
+    in_place_rent: ArrayLike,
+    gross_square_feet: ArrayLike,
+    occupancy_rate: ArrayLike,
+    operating_expenses: ArrayLike,
+    rent_growth_rate: ArrayLike,
+    vacancy_rate: ArrayLike,
+    holding_period_years: ArrayLike,
+    loan_to_value_ratio: ArrayLike,
+    interest_rate: ArrayLike,
+    amortization_period_years: ArrayLike,
+    loan_closing_fees_percentage: ArrayLike,
+    going_out_cap_rate: ArrayLike,
+    sale_fees: ArrayLike,
+    prepayment_penalty_period_years: ArrayLike = 0,
+    irr_guess: ArrayLike = None,
+    occupancy_curve: Optional[ArrayLike] = None,
+    operating_cash_flows: Optional[ArrayLike] = None
+) -> LeveredReturns:
+    """Calculates levered returns for every combination of broadcast acquisition inputs.
+
+    The equity cash flows come from calculate_equity_cash_flows, whose arguments are
+    documented there, and every scenario's IRR is solved in one batched call.
+
+    Args:
+        irr_guess (ArrayLike): Optional starting rates for the IRR solver as decimals.
+
+    Returns:
+        LeveredReturns: The levered IRR, equity multiple and equity cash flows of every scenario.
+    """
+    equity_cash_flows = calculate_equity_cash_flows(
+        purchase_price_per_unit, units, closing_costs, in_place_rent, gross_square_feet,
+        occupancy_rate, operating_expenses, rent_growth_rate, vacancy_rate, holding_period_years,
+        loan_to_value_ratio, interest_rate, amortization_period_years, loan_closing_fees_percentage,
+        going_out_cap_rate, sale_fees, prepayment_penalty_period_years, occupancy_curve=occupancy_curve,
+        operating_cash_flows=operating_cash_flows
+    )
+    shape = equity_cash_flows.shape[:-1]
+    rows = equity_cash_flows.reshape(-1, equity_cash_flows.shape[-1])
+
+    # Solving every scenario's IRR in one batched call
+    guess = None if irr_guess is None else np.broadcast_to(np.asarray(irr_guess, dtype=float), shape).ravel()
+    irr = solve_irr(rows, guess=guess).irr * 100
+    equity_multiple = rows[:, 1:].sum(axis=1) / -rows[:, 0]
+    return LeveredReturns(irr.reshape(shape), equity_multiple.reshape(shape), equity_cash_flows)
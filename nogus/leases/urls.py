@@ -0,0 +1,16 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'leases'
+
+urlpatterns = [
+    path('leases/<int:pk>/projection/', views.lease_projection, name='lease-projection'),
+    path('properties/<int:pk>/projection/', views.property_projection, name='property-projection'),
+    path('properties/projections/', views.property_projections, name='property-projections'),
+    path('projections/stats/', views.projection_stats, name='projection-stats'),
+    path('valuations/', views.submit_valuation, name='valuation-submit'),
+    path('valuations/<int:pk>/', views.valuation_status, name='valuation-status'),
+    path('valuations/<int:pk>/events/', views.valuation_events, name='valuation-events'),
+    path('valuations/<int:pk>/cancel/', views.cancel_valuation, name='valuation-cancel'),
+]
@@ -1,3 +1,261 @@
-from django.shortcuts import render
+import asyncio
+import csv
+import functools
+import hashlib
+import json
+from typing import Iterable, Iterator, Optional
 
-# Create your views here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required, permission_required
+from django.contrib.auth.views import redirect_to_login
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpResponseNotAllowed, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_GET
+
+from .jobs import JobQueueFull, cancel_job, submit_job
+from .models import CashFlowProjection, Lease, PropertyAcquisition, RealEstateProperty, ValuationJob
+from .projections import get_lease_projection, get_property_projection, projection_cache_stats
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+# Properties whose projections are fetched per query while streaming a set
+STREAM_CHUNK_SIZE = 500
+# Seconds between status reads while streaming a valuation job's progress
+JOB_POLL_INTERVAL = 0.5
+# Query parameters accepted by the property set endpoint and the lookups they filter on
+PROPERTY_FILTERS = {
+    'id': 'pk__in',
+    'city': 'location_details__city__in',
+    'state': 'location_details__state__in',
+    'country': 'location_details__country__in',
+}
+
+
+class _Echo:
+    """A file-like object whose writes return the line for csv.writer to hand to the stream."""
+
+    def write(self, value):
+        return value
+
+
+def _output_format(request) -> str:
+    output_format = request.GET.get('format')
+    if output_format in CONTENT_TYPES:
+        return output_format
+    return 'csv' if 'text/csv' in request.headers.get('Accept', '') else 'ndjson'
+
+
+def _not_modified(request, etag: str) -> bool:
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match))
+
+
+def _cashflow_values(cashflows: np.ndarray) -> list:
+    """Lists cash flows with NaN and infinite values as None, which JSON has no number for."""
+    cashflows = np.asarray(cashflows, dtype=float)
+    return np.where(np.isfinite(cashflows), cashflows, None).tolist()
+
+
+def _ndjson_lines(key: str, series: Iterable) -> Iterator[str]:
+    for pk, cashflow_series in series:
+        yield json.dumps({
+            key: pk,
+            'months': np.datetime_as_string(cashflow_series.months).tolist(),
+            'cashflows': _cashflow_values(cashflow_series.cashflows),
+        }, allow_nan=False) + '\n'
+
+
+def _csv_lines(key: str, series: Iterable) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow([key, 'month', 'cashflow'])
+    for pk, cashflow_series in series:
+        for month, cashflow in zip(np.datetime_as_string(cashflow_series.months).tolist(), _cashflow_values(cashflow_series.cashflows)):
+            yield writer.writerow([pk, month, '' if cashflow is None else repr(cashflow)])
+
+
+def _stream(request, key: str, series: Iterable, etag: Optional[str] = None) -> StreamingHttpResponse:
+    """Streams (pk, CashFlowSeries) pairs as NDJSON or CSV, one series or row at a time."""
+    output_format = _output_format(request)
+    lines = _csv_lines(key, series) if output_format == 'csv' else _ndjson_lines(key, series)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[output_format])
+    if etag is not None:
+        response['ETag'] = etag
+    response['Vary'] = 'Accept'
+    return response
+
+
+def _single_projection(request, key: str, pk: int, get_projection, instance_loader):
+    """Serves one projection, answering a matching If-None-Match without streaming the series."""
+    projection = get_projection(instance_loader())
+    etag = quote_etag(projection.fingerprint)
+    if _not_modified(request, etag):
+        return HttpResponseNotModified(headers={'ETag': etag})
+    return _stream(request, key, [(pk, projection.as_series())], etag)
+
+
+@require_GET
+@login_required
+@permission_required('leases.view_lease', raise_exception=True)
+def lease_projection(request, pk: int):
+    """Returns the monthly cash flows of one lease."""
+    return _single_projection(
+        request, 'lease_id', pk, get_lease_projection,
+        lambda: get_object_or_404(Lease, pk=pk)
+    )
+
+
+@require_GET
+@login_required
+@permission_required('leases.view_realestateproperty', raise_exception=True)
+def property_projection(request, pk: int):
+    """Returns the monthly cash flows of one property."""
+    return _single_projection(request, 'real_estate_property_id', pk, get_property_projection, lambda: get_object_or_404(RealEstateProperty, pk=pk))
+
+
+def _property_series(properties) -> Iterator:
+    """Yields each property's projection, fetching stored ones a chunk at a time and computing misses."""
+    chunk = []
+    for real_estate_property in properties.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        chunk.append(real_estate_property)
+        if len(chunk) == STREAM_CHUNK_SIZE:
+            yield from _chunk_series(chunk)
+            chunk = []
+    yield from _chunk_series(chunk)
+
+
+def _chunk_series(chunk) -> Iterator:
+    stored = {
+        projection.real_estate_property_id: projection
+        for projection in CashFlowProjection.objects.filter(real_estate_property_id__in=[item.pk for item in chunk])
+    }
+    for real_estate_property in chunk:
+        projection = stored.get(real_estate_property.pk) or get_property_projection(real_estate_property)
+        yield real_estate_property.pk, projection.as_series()
+
+
+@require_GET
+@login_required
+@permission_required('leases.view_realestateproperty', raise_exception=True)
+def property_projections(request):
+    """Returns the monthly cash flows of every property matching the query's id, city, state and country filters.
+
+    The response carries an ETag only when every projection is already stored, so a cold
+    request starts streaming without first computing the whole set.
+    """
+    properties = RealEstateProperty.objects.order_by('pk')
+    for parameter, lookup in PROPERTY_FILTERS.items():
+        values = request.GET.getlist(parameter)
+        if values:
+            properties = properties.filter(**{lookup: values})
+
+    # The fingerprints of the whole set in one query, with the properties as a subquery
+    fingerprints = dict(
+        CashFlowProjection.objects.filter(real_estate_property_id__in=properties.values('pk')).values_list('real_estate_property_id', 'fingerprint')
+    )
+    etag = None
+    if len(fingerprints) == properties.count():
+        etag = quote_etag(hashlib.sha256(repr(sorted(fingerprints.items())).encode()).hexdigest())
+        if _not_modified(request, etag):
+            return HttpResponseNotModified(headers={'ETag': etag})
+    return _stream(request, 'real_estate_property_id', _property_series(properties), etag)
+
+
+@require_GET
+@login_required
+@permission_required('leases.view_cashflowprojection', raise_exception=True)
+def projection_stats(request):
+    """Returns the projection cache hit and miss counters of the process serving the request."""
+    return JsonResponse(projection_cache_stats())
+
+
+def _async_permission_required(permission: str):
+    """login_required and permission_required(raise_exception=True) for coroutine views.
+
+    Django 4.2's decorators wrap views in plain functions, which would stop async views being
+    awaited, and request.user can only be loaded outside the event loop.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            user = request.user
+            authenticated, allowed = await sync_to_async(lambda: (user.is_authenticated, user.has_perm(permission)))()
+            if not authenticated:
+                return redirect_to_login(request.get_full_path())
+            if not allowed:
+                raise PermissionDenied
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def _get_job(pk: int) -> ValuationJob:
+    try:
+        return await ValuationJob.objects.aget(pk=pk)
+    except ValuationJob.DoesNotExist:
+        raise Http404('No valuation job matches the given query.')
+
+
+@_async_permission_required('leases.add_valuationjob')
+async def submit_valuation(request):
+    """Queues a valuation from a JSON body with 'property_acquisition', 'kind' and 'parameters', answering 202 with the job."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        body = json.loads(request.body or b'{}')
+        property_acquisition = await PropertyAcquisition.objects.aget(pk=body['property_acquisition'])
+        job = await submit_job(property_acquisition, body.get('kind', 'levered_returns'), body.get('parameters'))
+    except (ValueError, KeyError, TypeError, PropertyAcquisition.DoesNotExist) as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    except JobQueueFull as error:
+        return JsonResponse({'error': str(error)}, status=429)
+    return JsonResponse(job.as_dict(), status=202)
+
+
+@_async_permission_required('leases.view_valuationjob')
+async def valuation_status(request, pk: int):
+    """Returns a valuation job's status, progress and, once finished, its result."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    return JsonResponse((await _get_job(pk)).as_dict())
+
+
+@_async_permission_required('leases.view_valuationjob')
+async def valuation_events(request, pk: int):
+    """Streams a valuation job's status as server-sent events until the job finishes."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    job = await _get_job(pk)
+
+    async def events():
+        nonlocal job
+        last = None
+        while True:
+            state = job.as_dict()
+            if state != last:
+                yield f'data: {json.dumps(state)}\n\n'
+                last = state
+            if job.status in ValuationJob.FINISHED_STATUSES:
+                return
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+            job = await _get_job(pk)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+@_async_permission_required('leases.change_valuationjob')
+async def cancel_valuation(request, pk: int):
+    """Cancels an unfinished valuation job, answering 409 when it has already finished."""
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    await _get_job(pk)
+    cancelled = await cancel_job(pk)
+    return JsonResponse((await _get_job(pk)).as_dict(), status=200 if cancelled else 409)
+
+
+# The job API is called by other systems, not by browser forms; csrf_exempt itself does not wrap coroutines before Django 5.0
+submit_valuation.csrf_exempt = True
+cancel_valuation.csrf_exempt = True
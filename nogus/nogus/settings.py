@@ -122,3 +122,6 @@ STATIC_URL = 'static/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 INSTALLED_APPS += ['leases']
+
+# The API's login-required views send anonymous users to the admin login, the site's only one
+LOGIN_URL = 'admin:login'